@@ -0,0 +1,64 @@
+"""
+    Benchmark de inicialização a frio do cadastro
+    Compara, com 1k/10k/100k lâmpadas, o tempo de leitura do devices.json:
+      - json  : interpretação do JSON formatado (sem cache)
+      - cache : leitura do cache binário devices.json.cache (marshal)
+    Cada medida roda em um processo novo, como na abertura do programa.
+"""
+
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SIZES = (1_000, 10_000, 100_000)
+
+# Lê o cadastro e mede só o carregamento (import da biblioteca fora da medida)
+LOADER = """
+import sys, time
+sys.path.insert(0, {lib!r})
+from tuya_lib.storage import JsonStorage
+storage = JsonStorage({path!r}, use_cache={use_cache})
+start = time.perf_counter()
+devices = storage.load()
+print(time.perf_counter() - start, len(devices))
+"""
+
+with open('devices.json', 'r', encoding='utf-8') as f:
+    templates = json.load(f)
+
+lib = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_fleet(size):
+    fleet = []
+    for i in range(size):
+        device = copy.copy(templates[i % len(templates)])
+        device['id'] = f"bench{i:016d}"
+        device['name'] = f"Lâmpada {i}"
+        device['ip'] = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+        fleet.append(device)
+    return fleet
+
+
+def cold_load(path, use_cache):
+    code = LOADER.format(lib=lib, path=path, use_cache=use_cache)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, check=True).stdout.split()
+    return float(output[0])
+
+
+print(f"{'dispositivos':>12} | {'json':>9} | {'cache':>9} | {'ganho':>6}")
+print("-" * 46)
+with tempfile.TemporaryDirectory() as tmp:
+    for size in SIZES:
+        path = os.path.join(tmp, f'devices_{size}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(make_fleet(size), f, indent=4, ensure_ascii=False)
+
+        json_time = cold_load(path, False)
+        cold_load(path, True)               # Primeira execução grava o cache
+        cache_time = cold_load(path, True)
+        print(f"{size:>12} | {json_time:8.3f}s | {cache_time:8.3f}s | {json_time / cache_time:5.1f}x")
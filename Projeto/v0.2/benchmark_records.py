@@ -0,0 +1,80 @@
+"""
+    Benchmark de memória do cadastro de dispositivos
+    Compara bytes por dispositivo com 1k/10k/100k lâmpadas:
+      - dict      : lista lida direto do JSON (um mapping por dispositivo)
+      - dict+esq. : dicionários com o mapping compartilhado por produto
+      - record    : DeviceRecord (__slots__, textos internados, DPs resolvidos)
+"""
+
+import copy
+import gc
+import json
+import time
+import tracemalloc
+
+from tuya_lib.registry import SchemaRegistry
+from tuya_lib.device_record import DeviceRecord
+
+SIZES = (1_000, 10_000, 100_000)
+
+# Usa os dispositivos reais como modelo
+with open('devices.json', 'r', encoding='utf-8') as f:
+    templates = json.load(f)
+
+
+def make_fleet_json(size):
+    """Texto JSON de uma frota sintética baseada nos dispositivos reais"""
+    fleet = []
+    for i in range(size):
+        device = copy.copy(templates[i % len(templates)])
+        device['id'] = f"bench{i:016d}"
+        device['name'] = f"Lâmpada {i}"
+        device['key'] = f"k{i:015d}"
+        device['mac'] = f"aa:bb:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}:00"
+        device['uuid'] = f"u{i:015d}"
+        device['ip'] = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+        fleet.append(device)
+    return json.dumps(fleet)
+
+
+def measure(build, text):
+    """Bytes alocados pela estrutura criada por build(text) e tempo gasto"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build(text)
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return size, elapsed
+
+
+def build_dicts(text):
+    return json.loads(text)
+
+
+def build_shared(text):
+    devices = json.loads(text)
+    SchemaRegistry().intern_devices(devices)
+    return devices
+
+
+def build_records(text):
+    schemas = SchemaRegistry()
+    devices = json.loads(text)
+    # Converte no lugar para não manter dicionários e registros ao mesmo tempo
+    for i, device in enumerate(devices):
+        devices[i] = DeviceRecord(device, schemas)
+    return devices
+
+
+print(f"{'dispositivos':>12} | {'dict':>14} | {'dict+esq.':>14} | {'record':>14}")
+print("-" * 64)
+for size in SIZES:
+    text = make_fleet_json(size)
+    row = []
+    for build in (build_dicts, build_shared, build_records):
+        total, elapsed = measure(build, text)
+        row.append(f"{total / size:7.0f} B {elapsed:4.1f}s")
+    print(f"{size:>12} | " + " | ".join(f"{cell:>14}" for cell in row))
@@ -16,6 +16,8 @@ from tuya_lib import (
     load_device_config, find_device_by_name,
     clear_screen, format_status_readable, is_lamp_online
 )
+from tuya_lib.scene import preset_scenes
+from tuya_lib.schedule import wakeup_node, sleep_node
 
 """
 BEGIN print_menu:
@@ -36,6 +38,12 @@ def print_menu(current_lamp_name: str = ""):
 ║  5. Ver status                          ║
 ║  6. Debug                               ║
 ║  7. Trocar Lâmpada                      ║
+║  8. Efeitos                             ║
+║  9. Cenas (na lâmpada)                  ║
+║ 10. Agendamentos (na lâmpada)           ║
+║ 11. Modo música (arquivo WAV)           ║
+║ 12. Cor de uma imagem (paleta)          ║
+║ 13. Luz ambiente (vídeo)                ║
 ║  0. Sair                                ║
 ╚═════════════════════════════════════════╝
 """)
@@ -176,6 +184,199 @@ def set_color(lamp: SmartLamp):
 END set_color
 """
 
+"""
+BEGIN run_effect
+  @param lamp: SmartLamp - Instância da lâmpada que executa o efeito
+  @retparms: None - Solicita efeito e duração e executa o efeito na lâmpada
+"""
+def run_effect(lamp: SmartLamp):
+    """Opção 8: Executa um efeito (arco-íris, respiração, estroboscópio, vela)"""
+    try:
+        from tuya_lib.effects import EffectEngine, make_effect
+    except ImportError:
+        print("✗ Efeitos exigem o NumPy (pip install numpy)")
+        return
+
+    effects = {"1": "rainbow", "2": "breathe", "3": "strobe", "4": "candle"}
+    print("\n1. Arco-íris  2. Respiração  3. Estroboscópio  4. Vela")
+    choice = input("Escolha o efeito: ").strip()
+    if choice not in effects:
+        print("✗ Opção inválida!")
+        return
+
+    try:
+        duration = float(input("Duração em segundos (padrão 30): ").strip() or 30)
+    except ValueError:
+        print("✗ Valor inválido!")
+        return
+
+    print(f"\n✨ Executando {effects[choice]} por {duration:g}s (Ctrl+C para parar)...")
+    stats = EffectEngine([lamp], make_effect(effects[choice])).run(duration)
+    print(f"✓ {stats['ticks']} quadros, {stats['sends']} envios, "
+          f"{stats['dropped']} descartados")
+"""
+END run_effect
+"""
+
+"""
+BEGIN set_scene
+  @param lamp: SmartLamp - Instância da lâmpada que recebe a cena
+  @retparms: None - Lista as cenas prontas e envia a escolhida em um único comando
+"""
+def set_scene(lamp: SmartLamp):
+    """Opção 9: Envia uma cena que a própria lâmpada executa"""
+    scenes = preset_scenes()
+    names = list(scenes)
+    for i, name in enumerate(names, 1):
+        print(f"{i}. {name} ({len(scenes[name].units)} passo(s))")
+
+    choice = input("Escolha a cena: ").strip()
+    if not choice.isdigit() or not 1 <= int(choice) <= len(names):
+        print("✗ Opção inválida!")
+        return
+
+    name = names[int(choice) - 1]
+    print(f"\n🎬 Enviando cena {name}...")
+    if lamp.set_scene(scenes[name]):
+        print("✓ Cena enviada! A lâmpada executa sozinha.")
+    else:
+        print("✗ Erro ao enviar cena")
+"""
+END set_scene
+"""
+
+"""
+BEGIN schedule_menu
+  @param lamp: SmartLamp - Instância da lâmpada que recebe os agendamentos
+  @retparms: None - Programa temporizador, despertar ou dormir na própria lâmpada
+"""
+def schedule_menu(lamp: SmartLamp):
+    """Opção 10: Agendamentos executados pela lâmpada (o computador pode desligar)"""
+    print("\n1. Temporizador (countdown)  2. Despertar  3. Dormir  4. Apagar agendamentos")
+    choice = input("Escolha: ").strip()
+
+    try:
+        if choice == "1":
+            minutes = int(input("Inverter o estado daqui a quantos minutos (0 cancela)? "))
+            ok = lamp.set_countdown(minutes * 60)
+        elif choice in ("2", "3"):
+            hour, minute = (int(p) for p in input("Horário (HH:MM): ").strip().split(':'))
+            fade = int(input("Minutos de rampa: ").strip() or (15 if choice == "2" else 30))
+            days = input("Dias (ex: seg,ter,qua; vazio = todos): ").strip()
+            days = [d.strip() for d in days.split(',')] if days else None
+            if choice == "2":
+                ok = lamp.set_schedule('wakeup_mode', [wakeup_node(hour, minute, fade, days)])
+            else:
+                ok = lamp.set_schedule('sleep_mode', [sleep_node(hour, minute, fade, days)])
+        elif choice == "4":
+            ok = all([lamp.set_schedule('wakeup_mode', []), lamp.set_schedule('sleep_mode', []),
+                      lamp.set_countdown(0)])
+        else:
+            print("✗ Opção inválida!")
+            return
+    except ValueError as e:
+        print(f"✗ Valor inválido! {e}")
+        return
+
+    print("✓ Agendamento gravado na lâmpada!" if ok else "✗ Erro ao gravar agendamento")
+"""
+END schedule_menu
+"""
+
+"""
+BEGIN run_music
+  @param lamp: SmartLamp - Instância da lâmpada que acompanha a música
+  @retparms: None - Toca um WAV (ou PCM da entrada padrão) na lâmpada em modo música
+"""
+def run_music(lamp: SmartLamp):
+    """Opção 11: Modo música a partir de um arquivo de áudio local"""
+    try:
+        from tuya_lib.music import play_music
+    except ImportError:
+        print("✗ Modo música exige o NumPy (pip install numpy)")
+        return
+
+    path = input("Arquivo WAV ('-' = PCM s16le 44,1 kHz mono na entrada padrão): ").strip()
+    if not path:
+        print("✗ Nenhum arquivo informado!")
+        return
+
+    print("\n🎵 Tocando no modo música (Ctrl+C para parar)...")
+    try:
+        stats = play_music([lamp], path)
+    except (OSError, ValueError) as e:
+        print(f"✗ Erro ao abrir áudio: {e}")
+        return
+    print(f"✓ {stats['ticks']} quadros, {stats['sends']} envios, "
+          f"{stats['dropped'] + stats['late_ticks']} descartados, {stats['beats']} batidas")
+"""
+END run_music
+"""
+
+"""
+BEGIN image_palette
+  @param lamp: SmartLamp - Instância da lâmpada que recebe a cor
+  @retparms: None - Extrai a paleta de uma imagem e aplica a cor dominante na lâmpada
+"""
+def image_palette(lamp: SmartLamp):
+    """Opção 12: Cor dominante de uma imagem (paleta por k-means, em cache)"""
+    try:
+        from tuya_lib.palette import PaletteExtractor
+    except ImportError:
+        print("✗ Paleta de imagem exige o NumPy (pip install numpy)")
+        return
+
+    path = input("Arquivo de imagem: ").strip()
+    if not path:
+        print("✗ Nenhum arquivo informado!")
+        return
+
+    extractor = PaletteExtractor()
+    try:
+        colours, weights = extractor.extract(path)
+    except (OSError, ValueError) as e:
+        print(f"✗ Erro ao ler imagem: {e}")
+        return
+
+    for (r, g, b), weight in zip(colours, weights):
+        print(f"  #{r:02X}{g:02X}{b:02X}  {weight * 100:5.1f}%")
+    if extractor.hits:
+        print("  (paleta do cache)")
+    print("✓ Cor aplicada!" if lamp.set_color_rgb(*colours[0]) else "✗ Erro ao aplicar cor")
+"""
+END image_palette
+"""
+
+"""
+BEGIN run_ambient
+  @param lamp: SmartLamp - Instância da lâmpada que acompanha o vídeo
+  @retparms: None - Acende a lâmpada com a cor média de um vídeo, quadro a quadro
+"""
+def run_ambient(lamp: SmartLamp):
+    """Opção 13: Luz ambiente a partir de um vídeo local (ffmpeg) ou quadros na entrada padrão"""
+    try:
+        from tuya_lib.ambient import play_ambient
+    except ImportError:
+        print("✗ Luz ambiente exige o NumPy (pip install numpy)")
+        return
+
+    path = input("Arquivo de vídeo ('-' = quadros RGB24 64x36 na entrada padrão): ").strip()
+    if not path:
+        print("✗ Nenhum arquivo informado!")
+        return
+
+    print("\n🎬 Luz ambiente em execução (Ctrl+C para parar)...")
+    try:
+        stats = play_ambient([lamp], path)
+    except OSError as e:
+        print(f"✗ Erro ao abrir vídeo: {e}")
+        return
+    print(f"✓ {stats['ticks']} quadros, {stats['sends']} envios, "
+          f"{stats['dropped'] + stats['late_ticks']} descartados")
+"""
+END run_ambient
+"""
+
 """
 BEGIN print_debug_menu
   @retparms: None - Apenas exibe o menu de debug na tela
@@ -317,8 +518,9 @@ def set_color_by_preset(lamp: SmartLamp):
 # BEGIN select_lamp_menu
 # ============================================================================
 # @param devices: list - Lista de dispositivos disponíveis
+# @param manager: DeviceManager - Gerenciador usado na busca por nome (opcional)
 # @retparms: dict or None - Retorna dispositivo selecionado ou None se cancelado
-def select_lamp_menu(devices: list) -> dict:
+def select_lamp_menu(devices: list, manager: DeviceManager = None) -> dict:
     """Menu para seleção de lâmpada"""
     while True:
         clear_screen()
@@ -336,12 +538,13 @@ def select_lamp_menu(devices: list) -> dict:
             input("\nPressione ENTER para continuar...")
             return None
 
-        # Lista dispositivos com status online/offline
+        # Lista dispositivos com status online/offline (último estado conhecido
+        # do gerenciador, refinado em segundo plano; sem gerenciador, testa cada um)
         for i, device in enumerate(devices, 1):
             name = device['name']
             ip = device.get('ip', 'N/A')
-            online = is_lamp_online(device)
-            status = "✓ Online" if online else "✗ Offline"
+            online = manager.state.online(device['id']) if manager else is_lamp_online(device)
+            status = "? N/D" if online is None else "✓ Online" if online else "✗ Offline"
             print(f"║  {i}. {name:<15} IP: {ip:<15} {status:<9} ║")
 
         print("""║                                         ║
@@ -349,10 +552,14 @@ def select_lamp_menu(devices: list) -> dict:
 ╚═════════════════════════════════════════╝
 """)
 
-        choice = input("Escolha uma lâmpada: ").strip()
+        choice = input("Escolha uma lâmpada (número ou nome): ").strip()
 
         if choice == "0":
             return None
+        elif manager and not choice.isdigit() and manager.find_by_name(choice):
+            selected_device = manager.find_by_name(choice)
+            print(f"\n🔌 Selecionada: {selected_device['name']}")
+            return selected_device
         elif choice.isdigit():
             index = int(choice) - 1
             if 0 <= index < len(devices):
@@ -411,6 +618,18 @@ def interactive_menu(lamp: SmartLamp, devices: list = None):
                     print("✗ Erro ao conectar à nova lâmpada")
             else:
                 print("Nenhuma lâmpada selecionada")
+        elif choice == "8":
+            run_effect(lamp)
+        elif choice == "9":
+            set_scene(lamp)
+        elif choice == "10":
+            schedule_menu(lamp)
+        elif choice == "11":
+            run_music(lamp)
+        elif choice == "12":
+            image_palette(lamp)
+        elif choice == "13":
+            run_ambient(lamp)
         elif choice == "0":
             break
         else:
@@ -504,6 +723,9 @@ def print_admin_menu():
 ║  5. Remover dispositivo                ║
 ║  6. Exportar dispositivos              ║
 ║  7. Importar dispositivos              ║
+║  8. Varredura rápida da rede           ║
+║  9. Descoberta incremental (snapshot)  ║
+║ 10. Backups (listar/restaurar)         ║
 ║  0. Voltar                             ║
 ╚═════════════════════════════════════════╝
 """)
@@ -552,20 +774,33 @@ def admin_menu(manager: DeviceManager) -> None:
             else:
                 print("\n✗ Erro ao remover dispositivo")
         elif choice == "6":
-            # Exportar
-            if manager.export_devices():
+            # Exportar (.ndjson/.jsonl[.gz] = em fluxo, uma linha por dispositivo)
+            filename = input("Arquivo de destino (Enter = JSON com data): ").strip()
+            if manager.export_devices(filename or None):
                 print("\n✓ Dispositivos exportados com sucesso!")
             else:
                 print("\n✗ Erro ao exportar dispositivos")
         elif choice == "7":
             # Importar
-            filename = input("Nome do arquivo a importar: ").strip()
+            filename = input("Nome do arquivo a importar (.json, .ndjson, .ndjson.gz): ").strip()
             if not filename:
                 print("✗ Nome do arquivo é obrigatório!")
             elif manager.import_devices(filename):
                 print("\n✓ Dispositivos importados com sucesso!")
             else:
                 print("\n✗ Erro ao importar dispositivos")
+        elif choice == "8":
+            # Varredura asyncio (broadcast + TCP 6668)
+            manager.scan_network()
+        elif choice == "9":
+            # Verifica os conhecidos e sonda só o que é novo/mudou
+            manager.discover_incremental()
+        elif choice == "10":
+            # Snapshots de backup deduplicados
+            if manager.list_backups():
+                snapshot_id = input("ID do backup a restaurar (vazio para voltar): ").strip()
+                if snapshot_id and manager.restore_backup(snapshot_id):
+                    print("\n✓ Backup restaurado com sucesso!")
         elif choice == "0":
             break
         else:
@@ -612,12 +847,12 @@ def control_lamp(manager: DeviceManager) -> None:
         return
 
     # Seleciona lâmpada
-    device = select_lamp_menu(devices)
+    device = select_lamp_menu(devices, manager)
     if not device:
         return
 
-    # Cria instância da lâmpada
-    lamp = SmartLamp(device)
+    # Cria instância da lâmpada (acompanha edições externas do devices.json)
+    lamp = manager.open_lamp(device)
 
     # Conecta à lâmpada
     print(f"\n🔌 Conectando à lâmpada '{device['name']}'...")
@@ -647,6 +882,8 @@ CONTROLE DE LÂMPADA INTELIGENTE TUYA - v0.2
 
     # Inicializa gerenciador de dispositivos
     manager = DeviceManager('devices.json', 'tinytuya.json', 'tuya-raw.json')
+    manager.start_watching()
+    manager.probe_states()  # Refina o estado conhecido em segundo plano
 
     while True:
         clear_screen()
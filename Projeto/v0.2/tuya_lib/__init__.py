@@ -8,10 +8,19 @@ incluindo lâmpadas inteligentes e gerenciamento de dispositivos.
 from .smart_lamp import SmartLamp, load_device_config, find_device_by_name, get_dp_from_mapping
 from .device_manager import DeviceManager
 from .utils import clear_screen, format_status_readable, is_lamp_online
+from .scanner import NetworkScanner, scan_network
+from .device_record import DeviceRecord
+from .dp_schema import DpSchema, compile_schema
+from .color import hex_to_rgb, rgb_to_colour, colour_to_rgb
+from .scene import Scene, SceneUnit
 
 __version__ = "0.2.0"
 __all__ = [
     "SmartLamp", "DeviceManager",
     "load_device_config", "find_device_by_name", "get_dp_from_mapping",
-    "clear_screen", "format_status_readable", "is_lamp_online"
+    "clear_screen", "format_status_readable", "is_lamp_online",
+    "NetworkScanner", "scan_network", "DeviceRecord",
+    "DpSchema", "compile_schema",
+    "hex_to_rgb", "rgb_to_colour", "colour_to_rgb",
+    "Scene", "SceneUnit"
 ]
\ No newline at end of file
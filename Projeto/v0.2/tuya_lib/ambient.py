@@ -0,0 +1,273 @@
+"""
+Módulo de luz ambiente a partir de vídeo
+
+Este módulo lê quadros de vídeo (arquivo local decodificado pelo ffmpeg ou
+quadros RGB24 crus pela entrada padrão), calcula a cor média de cada zona
+da imagem de uma vez com NumPy, suaviza as cores no tempo e acende cada
+lâmpada com a cor da sua zona (da esquerda para a direita, de cima para
+baixo).
+
+O ffmpeg já entrega os quadros reduzidos (ex: 64x36) e na taxa de saída,
+então quase nada é decodificado à toa. Os quadros seguem o relógio de
+reprodução: um quadro que chega atrasado é descartado em vez de entrar em
+fila, e o envio usa as caixas de correio do motor de efeitos (cada lâmpada
+recebe só o quadro mais recente, na velocidade que ela aguenta).
+"""
+
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .color import encode_hsv_batch, rgb_to_hsv_batch
+from .effects import EffectEngine, V_MIN
+
+
+# Resolução dos quadros analisados (o ffmpeg reduz antes de entregar)
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+
+# Quadros por segundo processados e enviados
+AMBIENT_FPS = 10
+
+# Peso do quadro novo na suavização (1 = sem suavização)
+SMOOTHING = 0.5
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN FrameSource
+ - @param stream : Arquivo binário com quadros RGB24 consecutivos
+ - @param width, height : Tamanho dos quadros
+ - @param fps : Quadros por segundo do fluxo
+ - @param live : True para fluxos ao vivo (stdin), que não são ritmados pelo relógio
+ - @param process : Processo do ffmpeg (encerrado em close), opcional
+ - @var/obj width, height, fps, live : Formato do fluxo
+ - @method open : Abre um vídeo pelo ffmpeg, ou a entrada padrão ('-') como RGB24 cru
+ - @method frames : Gera quadros (altura, largura, 3) uint8
+ - @method close : Fecha o fluxo (e encerra o ffmpeg)
+ - @retparms : Instância da classe FrameSource
+"""
+class FrameSource:
+    """Fluxo de quadros RGB24 de tamanho fixo"""
+
+    def __init__(self, stream, width: int, height: int, fps: float, live: bool = False,
+                 process=None):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.live = live
+        self.process = process
+
+    @classmethod
+    def open(cls, path: str, width: int = FRAME_WIDTH, height: int = FRAME_HEIGHT,
+             fps: float = AMBIENT_FPS):
+        """
+        Abre a fonte de quadros
+
+        Args:
+            path: Arquivo de vídeo (decodificado pelo ffmpeg), ou '-' para
+                  quadros RGB24 crus de width x height na entrada padrão
+            width, height: Tamanho dos quadros analisados
+            fps: Taxa do vídeo reduzido (ffmpeg) ou do fluxo cru
+
+        Raises:
+            OSError: ffmpeg não instalado ou vídeo inexistente
+        """
+        if path == '-':
+            return cls(sys.stdin.buffer, width, height, fps, live=True)
+
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise OSError("ffmpeg não encontrado (instale o ffmpeg ou envie quadros "
+                          "RGB24 pela entrada padrão com '-')")
+        with open(path, 'rb'):
+            pass  # Erro claro para arquivo inexistente antes de iniciar o ffmpeg
+        command = [ffmpeg, '-loglevel', 'error', '-nostdin', '-i', path, '-an',
+                   '-vf', f"fps={fps},scale={width}:{height}",
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+        process = subprocess.Popen(command, stdout=subprocess.PIPE)
+        return cls(process.stdout, width, height, fps, process=process)
+
+    def frames(self):
+        """Gera quadros (altura, largura, 3) uint8 até o fim do fluxo"""
+        size = self.width * self.height * 3
+        while True:
+            data = self._read(size)
+            if len(data) < size:
+                return
+            yield np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def close(self) -> None:
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+        elif self.stream is not sys.stdin.buffer:
+            self.stream.close()
+
+    def _read(self, size: int) -> bytes:
+        # Pipes entregam leituras parciais: completa o quadro até o fim do fluxo
+        data = b''
+        while len(data) < size:
+            part = self.stream.read(size - len(data))
+            if not part:
+                break
+            data += part
+        return data
+
+"""
+END FrameSource
+"""
+
+"""
+BEGIN AmbientStream
+ - @param lamps : Lista de SmartLamp conectadas, na ordem das zonas
+ - @param source : FrameSource
+ - @param grid : (linhas, colunas) de zonas (padrão: uma linha com uma zona por lâmpada)
+ - @param smoothing : Peso do quadro novo na média exponencial (padrão: SMOOTHING)
+ - @param realtime : Ritmar pelo relógio de reprodução (padrão: True, exceto stdin)
+ - @var/obj source : Fonte de quadros
+ - @var/obj grid : Zonas da imagem
+ - @var/obj colours : Cores RGB suavizadas de cada zona (float)
+ - @method feed : Processa um quadro e entrega as cores às lâmpadas
+ - @retparms : Instância da classe AmbientStream (start/stop/run/stats de EffectEngine)
+"""
+class AmbientStream(EffectEngine):
+    """Luz ambiente: cor média de cada zona do vídeo em uma lâmpada"""
+
+    def __init__(self, lamps: list, source: FrameSource, grid: tuple = None,
+                 smoothing: float = SMOOTHING, realtime: bool = None):
+        super().__init__(lamps, None, source.fps)
+        self.source = source
+        self.grid = grid or (1, max(1, len(self.lamps)))
+        self.smoothing = smoothing
+        self.realtime = not source.live if realtime is None else realtime
+        self.colours = None
+
+    def feed(self, frame) -> None:
+        """Médias das zonas, suavização e um quadro colour_data por lâmpada"""
+        zones = zone_colours(frame, self.grid)[:len(self.channels)]
+        if self.colours is None or len(self.colours) != len(zones):
+            self.colours = zones
+        else:
+            self.colours += self.smoothing * (zones - self.colours)
+
+        hsv = rgb_to_hsv_batch(np.rint(self.colours).astype(np.uint8))
+        colours = encode_hsv_batch(np.maximum(hsv, [0, 0, V_MIN]))
+        for channel, colour in zip(self.channels, colours.tolist()):
+            lamp = channel.lamp
+            channel.post({lamp.dp_work_mode: 'colour', lamp.dp_colour: colour})
+        self.ticks += 1
+
+    def _clock(self) -> None:
+        interval = 1.0 / self.fps
+        start = time.monotonic()
+        last = None
+        try:
+            for index, frame in enumerate(self.source.frames()):
+                if self._stop.is_set():
+                    return
+                now = time.monotonic()
+                if self.realtime:
+                    # Quadro que já devia ter aparecido: descarta sem processar
+                    if now - start > (index + 1) * interval:
+                        self.late_ticks += 1
+                        continue
+                elif last is not None and now - last < interval:
+                    # Fluxo ao vivo mais rápido que a taxa de saída
+                    self.late_ticks += 1
+                    continue
+                last = now
+                self.feed(frame)
+                if self.realtime:
+                    self._stop.wait(max(0.0, start + (index + 1) * interval - time.monotonic()))
+        except Exception as e:
+            print(f"Erro na luz ambiente: {e}")
+        finally:
+            # Fim do vídeo: libera run()
+            self._stop.set()
+
+"""
+END AmbientStream
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN zone_colours
+ - @param frame : Quadro (altura, largura, 3)
+ - @param grid : (linhas, colunas) de zonas
+ - @retparms colours : Array float64 (linhas * colunas, 3) com a média RGB de cada zona
+"""
+def zone_colours(frame, grid: tuple):
+    """
+    Cor média de cada zona, todas de uma vez (as bordas que não dividem
+    exatamente pela grade são ignoradas)
+
+    Raises:
+        ValueError: Grade maior que o quadro
+    """
+    rows, cols = grid
+    height, width = frame.shape[:2]
+    if rows > height or cols > width:
+        raise ValueError(f"Grade {rows}x{cols} maior que o quadro {width}x{height}")
+    zone_h, zone_w = height // rows, width // cols
+    blocks = frame[:rows * zone_h, :cols * zone_w].reshape(rows, zone_h, cols, zone_w, 3)
+    return blocks.mean(axis=(1, 3), dtype=np.float64).reshape(rows * cols, 3)
+
+"""
+END zone_colours
+"""
+
+"""
+BEGIN play_ambient
+ - @param lamps : Lista de SmartLamp conectadas, na ordem das zonas
+ - @param path : Arquivo de vídeo ou '-' (quadros RGB24 crus na entrada padrão)
+ - @param duration : Segundos máximos (padrão: None = até o fim do vídeo)
+ - @param grid : (linhas, colunas) de zonas (padrão: uma por lâmpada, lado a lado)
+ - @param options : width, height, fps da fonte
+ - @retparms stats : Estatísticas (quadros, envios, descartados, atrasados)
+"""
+def play_ambient(lamps: list, path: str, duration: float = None, grid: tuple = None,
+                 **options) -> dict:
+    """
+    Luz ambiente de um vídeo nas lâmpadas (bloqueante, Ctrl+C para)
+
+    Raises:
+        OSError: ffmpeg ausente ou vídeo inexistente
+    """
+    source = FrameSource.open(path, **options)
+    try:
+        return AmbientStream(lamps, source, grid).run(duration)
+    finally:
+        source.close()
+
+"""
+END play_ambient
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,315 @@
+"""
+Módulo de backups endereçados por conteúdo
+
+Este módulo contém o BackupStore, que guarda cada versão de arquivo uma
+única vez como blob comprimido nomeado pelo seu SHA-256, mais um pequeno
+manifesto JSON por snapshot. Arquivos que não mudaram entre backups não
+ocupam espaço novo; a política de retenção remove snapshots antigos e os
+blobs que ficaram sem referência.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import zlib
+from datetime import datetime
+
+from .utils import atomic_write_json
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN BackupStore
+ - @param root : Diretório do repositório de backups (padrão: 'backups')
+ - @var/obj root : Diretório raiz
+ - @var/obj objects_dir : Diretório dos blobs (objects/ab/abcdef....z)
+ - @var/obj snapshots_dir : Diretório dos manifestos (snapshots/<id>.json)
+ - @var/obj imported_path : Registro das pastas antigas já importadas (imported.json)
+ - @method create : Cria um snapshot dos arquivos informados
+ - @method list : Lista os manifestos, do mais antigo para o mais novo
+ - @method get : Retorna o manifesto de um snapshot
+ - @method restore : Restaura os arquivos de um snapshot
+ - @method prune : Aplica a política de retenção e remove blobs órfãos
+ - @method import_directory : Importa uma pasta backup_YYYYMMDD_HHMMSS antiga
+ - @method import_legacy : Importa uma única vez as pastas antigas de um diretório
+ - @method _put_blob : Grava um blob se ainda não existir
+ - @method _blob_path : Caminho do blob de um hash
+ - @retparms : Instância da classe BackupStore
+"""
+class BackupStore:
+    """Repositório de backups deduplicado por conteúdo"""
+
+    def __init__(self, root: str = 'backups'):
+        """
+        Inicializa o repositório (os diretórios são criados sob demanda)
+
+        Args:
+            root: Diretório raiz dos backups
+        """
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.snapshots_dir = os.path.join(root, 'snapshots')
+        self.imported_path = os.path.join(root, 'imported.json')
+
+    def create(self, files: list, created: datetime = None, skip_unchanged: bool = True) -> str:
+        """
+        Cria um snapshot dos arquivos (arquivos inexistentes são ignorados)
+
+        Args:
+            files: Caminhos dos arquivos a guardar
+            created: Data do snapshot (padrão: agora)
+            skip_unchanged: Se True e nada mudou desde o último snapshot, reaproveita-o
+
+        Returns:
+            ID do snapshot (YYYYMMDD_HHMMSS, com sufixo se já existir)
+        """
+        created = created or datetime.now()
+        entries = {}
+        for path in files:
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                content = f.read()
+            digest = self._put_blob(content)
+            entries[path] = {
+                'hash': digest,
+                'size': len(content),
+                'mtime': os.path.getmtime(path),
+            }
+
+        if skip_unchanged:
+            snapshots = self.list()
+            if snapshots and _same_content(snapshots[-1]['files'], entries):
+                return snapshots[-1]['id']
+
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        snapshot_id = created.strftime("%Y%m%d_%H%M%S")
+        suffix = 1
+        while os.path.exists(self._manifest_path(snapshot_id)):
+            suffix += 1
+            snapshot_id = f"{created.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+
+        atomic_write_json(self._manifest_path(snapshot_id), {
+            'id': snapshot_id,
+            'created': created.isoformat(timespec='seconds'),
+            'files': entries,
+        })
+        return snapshot_id
+
+    def list(self) -> list:
+        """Manifestos de todos os snapshots, do mais antigo para o mais novo"""
+        manifests = []
+        for path in glob.glob(os.path.join(self.snapshots_dir, '*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        manifests.sort(key=lambda m: (m['created'], m['id']))
+        return manifests
+
+    def get(self, snapshot_id: str) -> dict:
+        """Manifesto do snapshot ou None"""
+        try:
+            with open(self._manifest_path(snapshot_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def restore(self, snapshot_id: str, dest_dir: str = None, files: list = None) -> list:
+        """
+        Restaura os arquivos de um snapshot
+
+        Args:
+            snapshot_id: ID do snapshot
+            dest_dir: Diretório de destino (padrão: caminhos originais)
+            files: Restringe a restauração a estes caminhos
+
+        Returns:
+            Lista com os caminhos gravados
+
+        Raises:
+            KeyError: Se o snapshot não existir
+        """
+        manifest = self.get(snapshot_id)
+        if manifest is None:
+            raise KeyError(f"Snapshot não encontrado: {snapshot_id}")
+
+        written = []
+        for path, entry in manifest['files'].items():
+            if files and path not in files:
+                continue
+            with open(self._blob_path(entry['hash']), 'rb') as f:
+                content = zlib.decompress(f.read())
+            if hashlib.sha256(content).hexdigest() != entry['hash']:
+                raise ValueError(f"Blob corrompido para {path}")
+
+            target = os.path.join(dest_dir, os.path.basename(path)) if dest_dir else path
+            if os.path.dirname(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            _atomic_write_bytes(target, content)
+            written.append(target)
+        return written
+
+    def prune(self, keep_last: int = 10, keep_daily: int = 7, keep_weekly: int = 4) -> list:
+        """
+        Política de retenção: últimos N, o mais novo de cada um dos últimos dias
+        e o mais novo de cada uma das últimas semanas; o resto é apagado
+
+        Returns:
+            IDs dos snapshots removidos
+        """
+        snapshots = list(reversed(self.list()))  # Mais novo primeiro
+        keep = {m['id'] for m in snapshots[:keep_last]}
+
+        for period, limit in (('%Y-%m-%d', keep_daily), ('%G-W%V', keep_weekly)):
+            seen = []
+            for manifest in snapshots:
+                bucket = datetime.fromisoformat(manifest['created']).strftime(period)
+                if bucket not in seen:
+                    if len(seen) >= limit:
+                        break
+                    seen.append(bucket)
+                    keep.add(manifest['id'])
+
+        removed = []
+        for manifest in snapshots:
+            if manifest['id'] not in keep:
+                os.remove(self._manifest_path(manifest['id']))
+                removed.append(manifest['id'])
+
+        if removed:
+            referenced = {e['hash'] for m in snapshots if m['id'] in keep
+                          for e in m['files'].values()}
+            for blob in glob.glob(os.path.join(self.objects_dir, '*', '*.z')):
+                digest = os.path.basename(os.path.dirname(blob)) + os.path.basename(blob)[:-2]
+                if digest not in referenced:
+                    os.remove(blob)
+        return removed
+
+    def import_directory(self, directory: str) -> str:
+        """
+        Importa uma pasta de backup antiga (backup_YYYYMMDD_HHMMSS)
+
+        Returns:
+            ID do snapshot criado
+        """
+        created = None
+        match = re.search(r'(\d{8}_\d{6})', os.path.basename(os.path.normpath(directory)))
+        if match:
+            created = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+        files = sorted(glob.glob(os.path.join(directory, '*')))
+        snapshot_id = self.create(files, created=created, skip_unchanged=False)
+
+        # Guarda os nomes originais (sem a pasta antiga) no manifesto
+        manifest = self.get(snapshot_id)
+        manifest['files'] = {os.path.basename(p): e for p, e in manifest['files'].items()}
+        atomic_write_json(self._manifest_path(snapshot_id), manifest)
+        return snapshot_id
+
+    def import_legacy(self, parent: str = '.') -> list:
+        """
+        Importa as pastas backup_YYYYMMDD_HHMMSS de parent que ainda não foram importadas
+
+        As pastas importadas ficam registradas em imported.json: não voltam
+        a ser importadas mesmo depois que a retenção apagar seus snapshots.
+        As pastas antigas não são removidas.
+
+        Returns:
+            IDs dos snapshots criados (vazio se não havia nada novo)
+        """
+        pattern = os.path.join(parent, 'backup_' + '[0-9]' * 8 + '_' + '[0-9]' * 6)
+        folders = sorted(p for p in glob.glob(pattern) if os.path.isdir(p))
+        if not folders:
+            return []
+
+        try:
+            with open(self.imported_path, 'r', encoding='utf-8') as f:
+                imported = set(json.load(f))
+        except (OSError, ValueError):
+            imported = set()
+
+        created = []
+        for folder in folders:
+            name = os.path.basename(folder)
+            if name in imported:
+                continue
+            created.append(self.import_directory(folder))
+            imported.add(name)
+            # Registro gravado a cada pasta: uma falha no meio não reimporta as anteriores
+            atomic_write_json(self.imported_path, sorted(imported))
+        return created
+
+    def _put_blob(self, content: bytes) -> str:
+        """Grava o conteúdo comprimido se o hash ainda não existir; retorna o hash"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write_bytes(path, zlib.compress(content, 9))
+        return digest
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:] + '.z')
+
+    def _manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.snapshots_dir, snapshot_id + '.json')
+
+"""
+END BackupStore
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN _same_content
+ - @retparms same : True se os dois manifestos apontam para os mesmos arquivos e hashes
+"""
+def _same_content(old: dict, new: dict) -> bool:
+    return old.keys() == new.keys() and all(old[p]['hash'] == new[p]['hash'] for p in new)
+
+"""
+END _same_content
+"""
+
+"""
+BEGIN _atomic_write_bytes
+ - @param path : Caminho de destino
+ - @param content : Conteúdo binário
+ - @retparms : None (grava em temporário, faz fsync e renomeia)
+"""
+def _atomic_write_bytes(path: str, content: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+"""
+END _atomic_write_bytes
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
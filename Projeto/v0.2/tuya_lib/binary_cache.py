@@ -0,0 +1,210 @@
+"""
+Módulo de cache binário dos arquivos JSON
+
+Este módulo grava, ao lado de cada JSON (devices.json, snapshot.json,
+tuya-raw.json), uma cópia binária '<arquivo>.cache' no formato do módulo
+marshal, com um cabeçalho versionado que guarda mtime, tamanho e SHA-256
+do JSON de origem. Na inicialização o cache é lido primeiro; o JSON só é
+reinterpretado quando mudou. Objetos compartilhados (como os mappings de
+produto) continuam compartilhados depois da leitura do cache.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+import tempfile
+
+
+# Identificação e versão do formato do cache
+CACHE_MAGIC = b'TLC1'
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.cache'
+
+# Cabeçalho: magic, versão do formato, versão do marshal, Python (maior, menor),
+# mtime_ns do JSON, tamanho do JSON, SHA-256 do JSON
+_HEADER = struct.Struct('<4sHHBBqQ32s')
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN BinaryCache
+ - @param source : Caminho do arquivo JSON de origem
+ - @param cache_path : Caminho do cache (padrão: source + '.cache')
+ - @var/obj source : Caminho do JSON
+ - @var/obj cache_path : Caminho do arquivo de cache
+ - @var/obj last_hit : True se a última leitura veio do cache
+ - @method load : Dados do cache se ele ainda corresponde ao JSON, senão None
+ - @method save : Grava o cache para o conteúdo atual do JSON
+ - @method load_json : Lê pelo cache ou, se desatualizado, pelo JSON (e regrava o cache)
+ - @method invalidate : Apaga o arquivo de cache
+ - @retparms : Instância da classe BinaryCache
+"""
+class BinaryCache:
+    """Cópia binária (marshal) de um arquivo JSON, validada por mtime e hash"""
+
+    def __init__(self, source: str, cache_path: str = None):
+        """
+        Inicializa o cache (nada é lido aqui)
+
+        Args:
+            source: Caminho do arquivo JSON
+            cache_path: Caminho do cache (padrão: source + '.cache')
+        """
+        self.source = source
+        self.cache_path = cache_path or source + CACHE_SUFFIX
+        self.last_hit = False
+
+    def load(self):
+        """
+        Lê o cache se ele ainda corresponde ao JSON
+
+        mtime e tamanho iguais bastam; se só o mtime mudou (arquivo
+        regravado com o mesmo conteúdo), o SHA-256 do JSON decide.
+
+        Returns:
+            Dados do cache ou None (ausente, corrompido ou desatualizado)
+        """
+        self.last_hit = False
+        try:
+            stat = os.stat(self.source)
+            with open(self.cache_path, 'rb') as f:
+                header = f.read(_HEADER.size)
+                if len(header) != _HEADER.size:
+                    return None
+                magic, version, marshal_version, major, minor, mtime_ns, size, digest = \
+                    _HEADER.unpack(header)
+                if (magic != CACHE_MAGIC or version != CACHE_VERSION
+                        or marshal_version != marshal.version
+                        or (major, minor) != sys.version_info[:2]
+                        or size != stat.st_size):
+                    return None
+                if mtime_ns != stat.st_mtime_ns and _file_digest(self.source) != digest:
+                    return None
+                data = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError, struct.error):
+            return None
+
+        if mtime_ns != stat.st_mtime_ns:
+            # Mesmo conteúdo com outro mtime: atualiza o cabeçalho para o caminho rápido
+            self._write(data, stat, digest)
+        self.last_hit = True
+        return data
+
+    def save(self, data) -> bool:
+        """
+        Grava o cache de data para o conteúdo atual do JSON
+
+        Returns:
+            True se o cache foi gravado
+        """
+        try:
+            stat = os.stat(self.source)
+            digest = _file_digest(self.source)
+            if os.stat(self.source).st_mtime_ns != stat.st_mtime_ns:
+                return False  # JSON mudou durante o hash
+            self._write(data, stat, digest)
+            return True
+        except (OSError, ValueError):
+            # ValueError: tipo não suportado pelo marshal; o JSON continua valendo
+            self.invalidate()
+            return False
+
+    def load_json(self):
+        """
+        Lê os dados pelo cache ou, se ele estiver desatualizado, pelo JSON
+
+        Returns:
+            Dados do arquivo (o cache é regravado após ler o JSON)
+        """
+        data = self.load()
+        if self.last_hit:
+            return data
+        with open(self.source, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.save(data)
+        return data
+
+    def invalidate(self) -> None:
+        """Apaga o cache (a próxima leitura usa o JSON)"""
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
+
+    def _write(self, data, stat, digest: bytes) -> None:
+        header = _HEADER.pack(CACHE_MAGIC, CACHE_VERSION, marshal.version,
+                              sys.version_info[0], sys.version_info[1],
+                              stat.st_mtime_ns, stat.st_size, digest)
+        payload = marshal.dumps(data)
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(self.cache_path) + '.',
+                                        suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(payload)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+"""
+END BinaryCache
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN load_json_cached
+ - @param path : Caminho do arquivo JSON
+ - @retparms data : Conteúdo do arquivo (pelo cache binário quando válido)
+"""
+def load_json_cached(path: str):
+    """Atalho para BinaryCache(path).load_json()"""
+    return BinaryCache(path).load_json()
+
+"""
+END load_json_cached
+"""
+
+"""
+BEGIN _file_digest
+ - @param path : Caminho do arquivo
+ - @retparms digest : SHA-256 do conteúdo (32 bytes)
+"""
+def _file_digest(path: str) -> bytes:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.digest()
+
+"""
+END _file_digest
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
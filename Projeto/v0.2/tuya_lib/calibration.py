@@ -0,0 +1,244 @@
+"""
+Módulo de calibração de cor e brilho por produto
+
+Lâmpadas de produtos diferentes mostram o mesmo RGB de formas diferentes, e
+uma rampa linear de 0-100% sobre 10-1000 no bright_value parece "pular"
+nos valores baixos. Este módulo descreve, por product_id (ou por ID de
+dispositivo), um perfil de calibração com:
+  - gamma por canal;
+  - ganho de balanço de branco por canal;
+  - curva de brilho 'linear' ou 'perceptual' (CIE L*: 50% parece metade).
+
+Tudo vira tabelas (LUTs) calculadas uma vez por perfil: corrigir uma cor
+são três consultas a tupla, e o brilho é uma consulta à tabela de 101
+posições da faixa do DP. Os perfis vêm do calibration.json, ex:
+
+    {"xtsnfp5zitrmrvcm": {"gamma": [2.0, 2.2, 2.4],
+                          "white_balance": [1.0, 0.85, 0.7],
+                          "brightness": "perceptual"}}
+"""
+
+import json
+import os
+from bisect import bisect_left
+
+
+# Arquivo padrão de perfis (product_id ou ID do dispositivo -> perfil)
+CALIBRATION_FILE = 'calibration.json'
+
+# Curvas de brilho aceitas
+BRIGHTNESS_CURVES = ('linear', 'perceptual')
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN Calibration
+ - @param gamma : Gamma único ou (r, g, b) (padrão: 1.0 = sem correção)
+ - @param white_balance : Ganho (r, g, b) de 0 a 1 (padrão: (1, 1, 1))
+ - @param brightness : 'linear' ou 'perceptual' (padrão: 'linear')
+ - @param name : Nome do perfil (produto), para mensagens
+ - @var/obj red, green, blue : LUTs de 256 posições por canal
+ - @var/obj identity : True se o perfil não altera nada
+ - @method rgb : Cor corrigida (três consultas às LUTs)
+ - @method brightness : Valor bruto do bright_value para uma porcentagem
+ - @method brightness_percent : Porcentagem correspondente a um valor bruto (inverso)
+ - @method from_dict : Cria o perfil a partir de uma entrada do calibration.json
+ - @retparms : Instância da classe Calibration
+"""
+class Calibration:
+    """Perfil de calibração compilado em tabelas"""
+
+    __slots__ = ('name', 'gamma', 'white_balance', 'curve', 'red', 'green', 'blue',
+                 'identity', '_bright')
+
+    def __init__(self, gamma=1.0, white_balance: tuple = (1.0, 1.0, 1.0),
+                 brightness: str = 'linear', name: str = ''):
+        """
+        Raises:
+            ValueError: Gamma não positivo, ganho fora de 0-1 ou curva desconhecida
+        """
+        gammas = tuple(gamma) if isinstance(gamma, (list, tuple)) else (gamma,) * 3
+        gains = tuple(white_balance)
+        if len(gammas) != 3 or len(gains) != 3:
+            raise ValueError(f"{name or 'calibração'}: gamma e white_balance têm 3 canais")
+        if any(g <= 0 for g in gammas):
+            raise ValueError(f"{name or 'calibração'}: gamma deve ser positivo: {gammas}")
+        if any(not 0 <= g <= 1 for g in gains):
+            raise ValueError(f"{name or 'calibração'}: white_balance fora de 0-1: {gains}")
+        if brightness not in BRIGHTNESS_CURVES:
+            raise ValueError(f"{name or 'calibração'}: curva de brilho inválida: {brightness} "
+                             f"(use {', '.join(BRIGHTNESS_CURVES)})")
+
+        self.name = name
+        self.gamma = gammas
+        self.white_balance = gains
+        self.curve = brightness
+        self.red, self.green, self.blue = (_channel_lut(g, k) for g, k in zip(gammas, gains))
+        self.identity = gammas == (1.0, 1.0, 1.0) and gains == (1.0, 1.0, 1.0) \
+            and brightness == 'linear'
+        # (min, max, step) da faixa do DP -> tabela de 101 valores brutos
+        self._bright = {}
+
+    @classmethod
+    def from_dict(cls, data: dict, name: str = ''):
+        """
+        Perfil a partir de {'gamma', 'white_balance', 'brightness'} (campos opcionais)
+
+        Raises:
+            ValueError: Valores inválidos
+        """
+        return cls(data.get('gamma', 1.0), data.get('white_balance', (1.0, 1.0, 1.0)),
+                   data.get('brightness', 'linear'), name)
+
+    def rgb(self, r: int, g: int, b: int) -> tuple:
+        """Cor corrigida pelas LUTs (entradas 0-255 já limitadas)"""
+        return self.red[r], self.green[g], self.blue[b]
+
+    def brightness(self, spec, percent) -> int:
+        """
+        Valor bruto do DP de brilho para uma porcentagem 0-100
+
+        Args:
+            spec: DpSpec do bright_value (faixa min/max/step)
+            percent: Porcentagem (arredondada para inteiro)
+        """
+        return self._table(spec)[max(0, min(100, int(round(percent))))]
+
+    def brightness_percent(self, spec, raw) -> int:
+        """Porcentagem (0-100) cujo valor na tabela é o mais próximo de raw"""
+        if not isinstance(raw, (int, float)):
+            return 0
+        table = self._table(spec)
+        i = min(100, bisect_left(table, raw))
+        return i if i == 0 or table[i] - raw <= raw - table[i - 1] else i - 1
+
+    def _table(self, spec) -> tuple:
+        key = (spec.min, spec.max, spec.step)
+        table = self._bright.get(key)
+        if table is None:
+            if self.curve == 'perceptual':
+                table = tuple(spec.from_percent(100 * _lightness_to_luminance(p))
+                              for p in range(101))
+            else:
+                table = tuple(spec.from_percent(p) for p in range(101))
+            self._bright[key] = table
+        return table
+
+    def __repr__(self) -> str:
+        return (f"Calibration({self.name!r}, gamma={self.gamma}, "
+                f"white_balance={self.white_balance}, brightness={self.curve!r})")
+
+"""
+END Calibration
+"""
+
+"""
+BEGIN CalibrationRegistry
+ - @param path : Arquivo de perfis (padrão: CALIBRATION_FILE)
+ - @var/obj path : Caminho do calibration.json
+ - @method profile : Perfil compilado de um dispositivo (ID > product_id > neutro)
+ - @method reload : Relê o arquivo (perfis são recompilados na próxima consulta)
+ - @retparms : Instância da classe CalibrationRegistry
+"""
+class CalibrationRegistry:
+    """Perfis de calibração por produto, compilados uma vez e compartilhados"""
+
+    def __init__(self, path: str = CALIBRATION_FILE):
+        self.path = path
+        self._entries = None
+        self._profiles = {}
+
+    def profile(self, device: dict) -> Calibration:
+        """
+        Perfil do dispositivo: entrada pelo ID, senão pelo product_id, senão o neutro
+
+        Um perfil inválido no arquivo é avisado e substituído pelo neutro.
+        """
+        entries = self._load()
+        for key in ((device or {}).get('id'), (device or {}).get('product_id')):
+            if key and key in entries:
+                if key not in self._profiles:
+                    try:
+                        self._profiles[key] = Calibration.from_dict(entries[key], name=key)
+                    except (ValueError, TypeError) as e:
+                        print(f"⚠️  Perfil de calibração ignorado: {e}")
+                        self._profiles[key] = NEUTRAL
+                return self._profiles[key]
+        return NEUTRAL
+
+    def reload(self) -> None:
+        """Descarta os perfis lidos; o arquivo é relido na próxima consulta"""
+        self._entries = None
+        self._profiles = {}
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if isinstance(data, dict):
+                        self._entries = {k: v for k, v in data.items() if isinstance(v, dict)}
+                except (OSError, ValueError) as e:
+                    print(f"⚠️  Erro ao ler {self.path}: {e}")
+        return self._entries
+
+"""
+END CalibrationRegistry
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN _channel_lut
+ - @param gamma : Gamma do canal
+ - @param gain : Ganho do balanço de branco (0-1)
+ - @retparms lut : Tupla de 256 valores 0-255
+"""
+def _channel_lut(gamma: float, gain: float) -> tuple:
+    return tuple(int(round(255 * gain * (v / 255) ** gamma)) for v in range(256))
+
+"""
+END _channel_lut
+"""
+
+"""
+BEGIN _lightness_to_luminance
+ - @param percent : Claridade percebida (CIE L*) 0-100
+ - @retparms luminance : Luminância relativa 0-1
+"""
+def _lightness_to_luminance(percent: float) -> float:
+    if percent > 8:
+        return ((percent + 16) / 116) ** 3
+    return percent / 903.3
+
+"""
+END _lightness_to_luminance
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
+
+
+# Perfil neutro (sem correção), usado por dispositivos sem calibração
+NEUTRAL = Calibration(name='neutro')
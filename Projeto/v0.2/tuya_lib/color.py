@@ -0,0 +1,404 @@
+"""
+Módulo de conversão de cores
+
+Este módulo concentra as conversões entre RGB (0-255), HSV no formato Tuya
+(H 0-360, S e V 0-1000) e o texto colour_data 'hhhhssssvvvv' (12 dígitos
+hexadecimais) usado pelo DP 24, nos dois sentidos. Há dois caminhos:
+  - escalar (Python puro, com cache LRU): uma cor por vez, como os presets
+    do menu e os comandos da SmartLamp;
+  - em lote (NumPy, vetorizado): milhares de cores de uma vez, como quadros
+    de efeitos, paletas de imagem e vídeo.
+Os dois caminhos usam as mesmas fórmulas e o mesmo arredondamento, então
+dão resultados idênticos. O NumPy só é exigido pelas funções em lote.
+"""
+
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # Só as conversões em lote precisam do NumPy
+    np = None
+
+
+# Faixas do HSV no formato Tuya
+HUE_MAX = 360
+SV_MAX = 1000
+
+# Tamanho do texto colour_data ('hhhhssssvvvv')
+COLOUR_DATA_LEN = 12
+
+# Tamanho do cache das conversões escalares
+CACHE_SIZE = 1024
+
+_HEX_DIGITS = b'0123456789abcdef'
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+# Não há classes neste módulo
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN hex_to_rgb
+ - @param hex_color : Cor hexadecimal 'RRGGBB' (com ou sem '#')
+ - @retparms rgb : Tupla (r, g, b) com valores 0-255
+"""
+@lru_cache(maxsize=CACHE_SIZE)
+def hex_to_rgb(hex_color: str) -> tuple:
+    """
+    Converte 'RRGGBB' em (r, g, b)
+
+    Raises:
+        ValueError: Se não forem 6 dígitos hexadecimais
+    """
+    digits = hex_color.strip().lstrip('#')
+    if len(digits) != 6 or not all(c in '0123456789ABCDEFabcdef' for c in digits):
+        raise ValueError("Formato inválido! Use 6 caracteres hexadecimais (ex: FF0000)")
+    value = int(digits, 16)
+    return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+
+"""
+END hex_to_rgb
+"""
+
+"""
+BEGIN rgb_to_hex
+ - @param r, g, b : Componentes 0-255
+ - @retparms hex_color : Texto 'RRGGBB' em maiúsculas
+"""
+def rgb_to_hex(r: int, g: int, b: int) -> str:
+    """Converte (r, g, b) em 'RRGGBB'"""
+    return f"{_clamp(r, 255):02X}{_clamp(g, 255):02X}{_clamp(b, 255):02X}"
+
+"""
+END rgb_to_hex
+"""
+
+"""
+BEGIN rgb_to_hsv
+ - @param r, g, b : Componentes 0-255
+ - @retparms hsv : Tupla (h 0-359, s 0-1000, v 0-1000)
+"""
+def rgb_to_hsv(r: int, g: int, b: int) -> tuple:
+    """Converte uma cor RGB em HSV no formato Tuya (caminho escalar)"""
+    r, g, b = _clamp(r, 255) / 255.0, _clamp(g, 255) / 255.0, _clamp(b, 255) / 255.0
+    high = max(r, g, b)
+    delta = high - min(r, g, b)
+
+    if delta == 0:
+        h = 0.0
+    elif high == r:
+        h = ((g - b) / delta) % 6
+    elif high == g:
+        h = (b - r) / delta + 2
+    else:
+        h = (r - g) / delta + 4
+    s = delta / high if high else 0.0
+    return round(h * 60) % HUE_MAX, round(s * SV_MAX), round(high * SV_MAX)
+
+"""
+END rgb_to_hsv
+"""
+
+"""
+BEGIN hsv_to_rgb
+ - @param h : Matiz 0-360
+ - @param s : Saturação 0-1000
+ - @param v : Valor (brilho) 0-1000
+ - @retparms rgb : Tupla (r, g, b) com valores 0-255
+"""
+def hsv_to_rgb(h: int, s: int, v: int) -> tuple:
+    """Converte HSV no formato Tuya em RGB (caminho escalar)"""
+    s, v = _clamp(s, SV_MAX) / SV_MAX, _clamp(v, SV_MAX) / SV_MAX
+    sector = (h % HUE_MAX) / 60.0
+    i = int(sector)
+    f = sector - i
+    p = v * (1 - s)
+    q = v * (1 - s * f)
+    t = v * (1 - s * (1 - f))
+    r, g, b = ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))[i]
+    return round(r * 255), round(g * 255), round(b * 255)
+
+"""
+END hsv_to_rgb
+"""
+
+"""
+BEGIN encode_hsv
+ - @param h : Matiz 0-360
+ - @param s : Saturação 0-1000
+ - @param v : Valor (brilho) 0-1000
+ - @retparms colour_data : Texto 'hhhhssssvvvv'
+"""
+def encode_hsv(h: int, s: int, v: int) -> str:
+    """Monta o colour_data de uma cor HSV (valores fora da faixa são limitados)"""
+    return f"{_clamp(h, HUE_MAX):04x}{_clamp(s, SV_MAX):04x}{_clamp(v, SV_MAX):04x}"
+
+"""
+END encode_hsv
+"""
+
+"""
+BEGIN decode_colour
+ - @param colour_data : Texto 'hhhhssssvvvv'
+ - @retparms hsv : Tupla (h, s, v)
+"""
+def decode_colour(colour_data: str) -> tuple:
+    """
+    Lê h, s e v de um colour_data
+
+    Raises:
+        ValueError: Se não forem 12 dígitos hexadecimais
+    """
+    if not isinstance(colour_data, str) or len(colour_data) != COLOUR_DATA_LEN:
+        raise ValueError(f"colour_data deve ter {COLOUR_DATA_LEN} dígitos hexadecimais: "
+                         f"{colour_data!r}")
+    try:
+        return int(colour_data[0:4], 16), int(colour_data[4:8], 16), int(colour_data[8:12], 16)
+    except ValueError:
+        raise ValueError(f"colour_data inválido: {colour_data!r}") from None
+
+"""
+END decode_colour
+"""
+
+"""
+BEGIN rgb_to_colour
+ - @param r, g, b : Componentes 0-255
+ - @retparms colour_data : Texto 'hhhhssssvvvv' (resultado em cache LRU)
+"""
+@lru_cache(maxsize=CACHE_SIZE)
+def rgb_to_colour(r: int, g: int, b: int) -> str:
+    """RGB -> colour_data, com cache para cores repetidas (presets, efeitos)"""
+    return encode_hsv(*rgb_to_hsv(r, g, b))
+
+"""
+END rgb_to_colour
+"""
+
+"""
+BEGIN colour_to_rgb
+ - @param colour_data : Texto 'hhhhssssvvvv'
+ - @retparms rgb : Tupla (r, g, b) (resultado em cache LRU)
+"""
+@lru_cache(maxsize=CACHE_SIZE)
+def colour_to_rgb(colour_data: str) -> tuple:
+    """colour_data -> RGB, com cache (o mesmo status é formatado muitas vezes)"""
+    return hsv_to_rgb(*decode_colour(colour_data))
+
+"""
+END colour_to_rgb
+"""
+
+"""
+BEGIN rgb_to_hsv_batch
+ - @param rgb : Array (..., 3) com componentes 0-255
+ - @retparms hsv : Array int (..., 3) com h 0-359, s 0-1000, v 0-1000
+"""
+def rgb_to_hsv_batch(rgb):
+    """RGB -> HSV Tuya em lote (NumPy), mesmo arredondamento do caminho escalar"""
+    rgb = np.clip(np.rint(_as_array(rgb, 'float64')), 0, 255) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    high = rgb.max(axis=-1)
+    delta = high - rgb.min(axis=-1)
+    safe_delta = np.where(delta == 0, 1.0, delta)
+
+    h = np.where(high == r, ((g - b) / safe_delta) % 6,
+                 np.where(high == g, (b - r) / safe_delta + 2, (r - g) / safe_delta + 4))
+    h = np.where(delta == 0, 0.0, h)
+    s = np.where(high == 0, 0.0, delta / np.where(high == 0, 1.0, high))
+
+    hsv = np.empty(rgb.shape, dtype=np.int64)
+    hsv[..., 0] = np.rint(h * 60) % HUE_MAX
+    hsv[..., 1] = np.rint(s * SV_MAX)
+    hsv[..., 2] = np.rint(high * SV_MAX)
+    return hsv
+
+"""
+END rgb_to_hsv_batch
+"""
+
+"""
+BEGIN hsv_to_rgb_batch
+ - @param hsv : Array (..., 3) com h 0-360, s 0-1000, v 0-1000
+ - @retparms rgb : Array uint8 (..., 3)
+"""
+def hsv_to_rgb_batch(hsv):
+    """HSV Tuya -> RGB em lote (NumPy)"""
+    hsv = _as_array(hsv, 'float64')
+    s = np.clip(hsv[..., 1], 0, SV_MAX) / SV_MAX
+    v = np.clip(hsv[..., 2], 0, SV_MAX) / SV_MAX
+    sector = (hsv[..., 0] % HUE_MAX) / 60.0
+    i = sector.astype(np.int64)
+    f = sector - i
+    p = v * (1 - s)
+    q = v * (1 - s * f)
+    t = v * (1 - s * (1 - f))
+
+    # Mesma tabela de setores do caminho escalar: (r, g, b) por setor 0-5
+    options = np.stack([v, q, p, p, t, v,
+                        t, v, v, q, p, p,
+                        p, p, t, v, v, q], axis=-1).reshape(hsv.shape[:-1] + (3, 6))
+    rgb = np.take_along_axis(options, i[..., None, None].repeat(3, axis=-2), axis=-1)[..., 0]
+    return np.rint(rgb * 255).astype(np.uint8)
+
+"""
+END hsv_to_rgb_batch
+"""
+
+"""
+BEGIN encode_hsv_batch
+ - @param hsv : Array (..., 3) com h, s, v
+ - @retparms colour_data : Array de textos 'hhhhssssvvvv' com formato (...)
+"""
+def encode_hsv_batch(hsv):
+    """HSV -> colour_data em lote, montando os dígitos hexadecimais com NumPy"""
+    hsv = np.rint(_as_array(hsv, 'float64')).astype(np.int64)
+    limits = np.array([HUE_MAX, SV_MAX, SV_MAX])
+    packed = np.clip(hsv, 0, limits)
+
+    # 3 campos x 4 dígitos: desloca e mascara cada nibble de uma vez
+    shifts = np.array([12, 8, 4, 0])
+    nibbles = (packed[..., :, None] >> shifts) & 0xF
+    digits = np.frombuffer(_HEX_DIGITS, dtype=np.uint8)[nibbles]
+    digits = np.ascontiguousarray(digits.reshape(hsv.shape[:-1] + (COLOUR_DATA_LEN,)))
+    return digits.view(f'S{COLOUR_DATA_LEN}')[..., 0].astype(f'U{COLOUR_DATA_LEN}')
+
+"""
+END encode_hsv_batch
+"""
+
+"""
+BEGIN decode_colour_batch
+ - @param colour_data : Sequência/array de textos 'hhhhssssvvvv'
+ - @retparms hsv : Array int (..., 3)
+"""
+def decode_colour_batch(colour_data):
+    """
+    colour_data -> HSV em lote (tabela de 256 entradas para os dígitos)
+
+    Raises:
+        ValueError: Se algum texto não tiver 12 dígitos hexadecimais
+    """
+    _as_array(None)
+    data = np.asarray(colour_data)
+    if data.dtype.kind == 'U':
+        try:
+            data = np.char.encode(data, 'ascii')
+        except UnicodeEncodeError:
+            raise ValueError("colour_data com caractere não hexadecimal") from None
+    if data.dtype.kind != 'S' or np.any(np.char.str_len(data) != COLOUR_DATA_LEN):
+        raise ValueError(f"colour_data deve ter {COLOUR_DATA_LEN} dígitos hexadecimais")
+
+    raw = np.frombuffer(data.astype(f'S{COLOUR_DATA_LEN}').tobytes(), dtype=np.uint8)
+    values = _hex_table()[raw.reshape(data.shape + (3, 4))]
+    if np.any(values < 0):
+        raise ValueError("colour_data com dígito não hexadecimal")
+    return values @ np.array([4096, 256, 16, 1])
+
+"""
+END decode_colour_batch
+"""
+
+"""
+BEGIN rgb_to_colour_batch
+ - @param rgb : Array (..., 3) com componentes 0-255
+ - @retparms colour_data : Array de textos 'hhhhssssvvvv'
+"""
+def rgb_to_colour_batch(rgb):
+    """RGB -> colour_data em lote"""
+    return encode_hsv_batch(rgb_to_hsv_batch(rgb))
+
+"""
+END rgb_to_colour_batch
+"""
+
+"""
+BEGIN colour_to_rgb_batch
+ - @param colour_data : Sequência/array de textos 'hhhhssssvvvv'
+ - @retparms rgb : Array uint8 (..., 3)
+"""
+def colour_to_rgb_batch(colour_data):
+    """colour_data -> RGB em lote"""
+    return hsv_to_rgb_batch(decode_colour_batch(colour_data))
+
+"""
+END colour_to_rgb_batch
+"""
+
+"""
+BEGIN _clamp
+ - @param value : Valor numérico
+ - @param high : Limite superior (o inferior é 0)
+ - @retparms value : Inteiro arredondado dentro de 0..high
+"""
+def _clamp(value, high: int) -> int:
+    return max(0, min(high, int(round(value))))
+
+"""
+END _clamp
+"""
+
+"""
+BEGIN _as_array
+ - @param values : Valores (..., 3) ou None (só verifica o NumPy)
+ - @param dtype : Tipo do array NumPy
+ - @retparms array : Array NumPy com o último eixo de 3 componentes
+"""
+def _as_array(values, dtype=None):
+    """
+    Raises:
+        ImportError: Se o NumPy não estiver instalado
+        ValueError: Se o último eixo não tiver 3 componentes
+    """
+    if np is None:
+        raise ImportError("As conversões em lote exigem o NumPy (pip install numpy)")
+    if values is None:
+        return None
+    array = np.asarray(values, dtype=dtype)
+    if array.ndim == 0 or array.shape[-1] != 3:
+        raise ValueError(f"Esperado um array (..., 3), recebido {array.shape}")
+    return array
+
+"""
+END _as_array
+"""
+
+"""
+BEGIN _hex_table
+ - @retparms table : Array de 256 entradas (código ASCII -> valor do dígito, -1 se inválido)
+"""
+@lru_cache(maxsize=1)
+def _hex_table():
+    table = np.full(256, -1, dtype=np.int64)
+    for value, char in enumerate(b'0123456789abcdef'):
+        table[char] = value
+    for value, char in enumerate(b'ABCDEF', 10):
+        table[char] = value
+    return table
+
+"""
+END _hex_table
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,158 @@
+"""
+Módulo de índices do cadastro de dispositivos
+
+Este módulo contém o DeviceIndex, que mantém índices secundários
+(id, name, mac, ip, product_id, category) sobre a lista de dispositivos
+para consultas O(1) pelo DeviceManager e pela interface de linha de comando.
+"""
+
+
+# Campos indexados; 'id' é único, os demais podem repetir entre dispositivos
+INDEXED_FIELDS = ('id', 'name', 'mac', 'ip', 'product_id', 'category')
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN DeviceIndex
+ - @param devices : Lista inicial de dispositivos (opcional)
+ - @var/obj by_id : Dicionário id -> dispositivo
+ - @method rebuild : Reconstrói todos os índices a partir de uma lista
+ - @method update : Indexa (ou reindexa) um dispositivo após inclusão/edição
+ - @method discard : Remove um dispositivo dos índices
+ - @method get : Primeiro dispositivo com o valor no campo indexado
+ - @method find_all : Todos os dispositivos com o valor no campo indexado
+ - @method _normalize : Normaliza o valor de um campo para a chave do índice
+ - @retparms : Instância da classe DeviceIndex
+"""
+class DeviceIndex:
+    """Índices secundários O(1) sobre a lista de dispositivos"""
+
+    def __init__(self, devices: list = None):
+        """
+        Inicializa os índices
+
+        Args:
+            devices: Lista inicial de dispositivos
+        """
+        self.by_id = {}
+        self._indexes = {field: {} for field in INDEXED_FIELDS if field != 'id'}
+        self._keys = {}
+        if devices:
+            self.rebuild(devices)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, device_id) -> bool:
+        return device_id in self.by_id
+
+    def rebuild(self, devices: list) -> None:
+        """Reconstrói todos os índices a partir da lista de dispositivos"""
+        self.by_id = {}
+        self._indexes = {field: {} for field in self._indexes}
+        self._keys = {}
+        for device in devices:
+            self.update(device)
+
+    def update(self, device: dict) -> None:
+        """
+        Indexa um dispositivo novo ou reindexa um dispositivo editado no lugar
+
+        As chaves antigas do dispositivo ficam guardadas, então basta chamar
+        update() depois de qualquer alteração de name/mac/ip/product_id/category.
+        """
+        device_id = device.get('id')
+        if not device_id:
+            return
+
+        old_keys = self._keys.get(device_id, {})
+        new_keys = {}
+        for field, index in self._indexes.items():
+            key = self._normalize(field, device.get(field))
+            old_key = old_keys.get(field)
+            if old_key is not None and old_key != key:
+                self._unlink(index, old_key, device_id)
+            if key is not None:
+                index.setdefault(key, {})[device_id] = device
+                new_keys[field] = key
+
+        self.by_id[device_id] = device
+        self._keys[device_id] = new_keys
+
+    def discard(self, device_id: str) -> None:
+        """Remove um dispositivo de todos os índices (ignora IDs desconhecidos)"""
+        self.by_id.pop(device_id, None)
+        for field, key in self._keys.pop(device_id, {}).items():
+            self._unlink(self._indexes[field], key, device_id)
+
+    def get(self, field: str, value) -> dict:
+        """Primeiro dispositivo cujo campo indexado tem o valor, ou None"""
+        if field == 'id':
+            return self.by_id.get(value)
+        bucket = self._bucket(field, value)
+        return next(iter(bucket.values()), None) if bucket else None
+
+    def find_all(self, field: str, value) -> list:
+        """Todos os dispositivos cujo campo indexado tem o valor"""
+        if field == 'id':
+            device = self.by_id.get(value)
+            return [device] if device else []
+        bucket = self._bucket(field, value)
+        return list(bucket.values()) if bucket else []
+
+    def _bucket(self, field: str, value) -> dict:
+        if field not in self._indexes:
+            raise KeyError(f"Campo não indexado: {field}")
+        return self._indexes[field].get(self._normalize(field, value))
+
+    @staticmethod
+    def _unlink(index: dict, key, device_id: str) -> None:
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(device_id, None)
+            if not bucket:
+                del index[key]
+
+    @staticmethod
+    def _normalize(field: str, value):
+        """Chave do índice: nome sem diferenciar maiúsculas, MAC em minúsculas, vazio = None"""
+        if value is None or value == '':
+            return None
+        if not isinstance(value, str):
+            return value
+        value = value.strip()
+        if field == 'name':
+            return value.casefold() or None
+        if field == 'mac':
+            return value.lower().replace('-', ':') or None
+        return value or None
+
+"""
+END DeviceIndex
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+# Não há funções fora das classes neste módulo
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -1,14 +1,33 @@
 """
 Gerenciador de Dispositivos Tuya
-Integra o wizard do tinytuya para descoberta e gerenciamento de dispositivos
+Integra o wizard do tinytuya (em processo) para descoberta e gerenciamento de dispositivos
 """
 
 import json
 import os
-import shutil
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 import tinytuya
 
+from .scanner import NetworkScanner, local_subnets, subnets_from_devices
+from .discovery import SnapshotStore, IncrementalDiscovery
+from .wizard import InProcessWizard, WizardError, clean_credentials, CREDENTIAL_FIELDS
+from .merge import merge_devices
+from .device_index import DeviceIndex
+from .storage import open_storage
+from .registry import SchemaRegistry, CloudDataCache
+from .device_record import DeviceRecord
+from .utils import atomic_write_json
+from .backup_store import BackupStore
+from .ndjson import is_ndjson, iter_ndjson, write_ndjson
+from .watcher import FileWatcher, diff_devices
+from .smart_lamp import SmartLamp
+from .state_store import StateStore
+from .calibration import CalibrationRegistry
+
 
 """
 ===================
@@ -21,23 +40,69 @@ BEGIN DeviceManager
  - @param devices_file : Caminho do arquivo JSON com dispositivos formatados (padrão: 'devices.json')
  - @param tuya_file : Caminho do arquivo JSON de configuração do tinytuya (padrão: 'tinytuya.json')
  - @param raw_file : Caminho do arquivo JSON raw do tinytuya (padrão: 'tuya-raw.json')
+ - @param snapshot_file : Caminho do snapshot da rede (padrão: 'snapshot.json')
+ - @param backend : Backend do cadastro: 'json', 'sqlite' ou None (deduz pela extensão)
+ - @param backup_dir : Diretório do repositório de backups (padrão: 'backups')
+ - @param compact : Se True, mantém os dispositivos como DeviceRecord (frotas grandes)
+ - @param calibration_file : Perfis de calibração por produto (padrão: 'calibration.json')
  - @var/obj devices_file : Caminho do arquivo de dispositivos
  - @var/obj tuya_file : Caminho do arquivo de configuração tinytuya
  - @var/obj raw_file : Caminho do arquivo raw
- - @var/obj devices : Lista de dispositivos carregados
+ - @var/obj snapshot_file : Caminho do arquivo de snapshot
+ - @var/obj storage : Backend de armazenamento (JsonStorage ou SqliteStorage)
+ - @var/obj backups : BackupStore com os snapshots de backup
+ - @var/obj devices : Lista de dispositivos carregados (dicionários ou DeviceRecord)
+ - @var/obj compact : Indica se os dispositivos ficam como DeviceRecord
+ - @var/obj last_merge : MergeReport da última sincronização/importação
+ - @var/obj index : DeviceIndex com os índices id/name/mac/ip/product_id/category
+ - @var/obj schemas : SchemaRegistry com uma cópia do mapping por product_id
+ - @var/obj cloud : CloudDataCache com o tuya-raw.json (lido sob demanda)
+ - @var/obj state : StateStore com o último estado conhecido (nuvem, snapshot, leituras ao vivo)
+ - @var/obj calibration : CalibrationRegistry com os perfis de cor/brilho por produto
+ - @var/obj sessions : SmartLamps abertas por open_lamp (id -> lâmpada, referência fraca)
+ - @var/obj watcher : FileWatcher do arquivo de dispositivos ou None
+ - @var/obj changed_ids : IDs alterados por este processo desde a última gravação completa
  - @method __init__ : Inicializa o gerenciador de dispositivos
  - @method load_devices : Carrega dispositivos do arquivo JSON
+ - @method _load_devices : Carrega os dispositivos (com a trava já adquirida)
  - @method save_devices : Salva dispositivos no arquivo JSON
+ - @method _save_device : Persiste um único dispositivo (uma linha no SQLite)
+ - @method _delete_device : Remove um único dispositivo do armazenamento
+ - @method _compact_devices : Converte em DeviceRecord os dispositivos ainda em dicionário
  - @method backup_files : Faz backup dos arquivos de configuração
+ - @method list_backups : Lista os snapshots de backup (importando antes as pastas antigas)
+ - @method restore_backup : Restaura um snapshot de backup pelo ID
  - @method run_wizard : Executa o wizard de descoberta de dispositivos
+ - @method provision : Descoberta/sincronização não interativa no próprio processo
+ - @method _load_credentials : Lê as credenciais da Cloud API do tinytuya.json
+ - @method scan_network : Varredura assíncrona rápida da rede local
+ - @method discover_incremental : Descoberta incremental a partir do snapshot.json
  - @method _clean_wizard_file : Valida e limpa dados do wizard
  - @method sync_from_wizard : Sincroniza dispositivos do wizard
+ - @method _read_wizard_file : Lê dispositivos no formato do tinytuya.json
+ - @method _print_merge : Mostra o relatório de uma mesclagem
  - @method list_devices : Lista todos os dispositivos
  - @method add_device : Adiciona dispositivo manualmente
  - @method remove_device : Remove um dispositivo
  - @method edit_device : Edita um dispositivo existente
- - @method export_devices : Exporta dispositivos para arquivo
- - @method import_devices : Importa dispositivos de arquivo
+ - @method export_devices : Exporta dispositivos para arquivo (JSON ou NDJSON/gzip)
+ - @method import_devices : Importa dispositivos de arquivo (JSON ou NDJSON/gzip)
+ - @method _print_progress : Mostra o progresso de importação/exportação em fluxo
+ - @method find_by_id : Busca O(1) por ID
+ - @method find_by_name : Busca O(1) por nome (sem diferenciar maiúsculas)
+ - @method find_by_mac : Busca O(1) por endereço MAC
+ - @method find_by_ip : Busca O(1) por endereço IP
+ - @method find_by_product : Lista os dispositivos de um product_id
+ - @method find_by_category : Lista os dispositivos de uma categoria
+ - @method cloud_data : Registro bruto da nuvem de um dispositivo (tuya-raw.json)
+ - @method open_lamp : Cria uma SmartLamp acompanhada pela recarga a quente
+ - @method probe_states : Consulta as lâmpadas em paralelo e refina o estado conhecido
+ - @method start_watching : Liga a recarga a quente do arquivo de dispositivos
+ - @method stop_watching : Desliga a recarga a quente
+ - @method reload_devices : Relê o arquivo e aplica só as diferenças por dispositivo
+ - @method _apply_incoming : Aplica uma lista lida do disco no lugar (recarga ou mesclagem)
+ - @method _locked : Trava da lista e dos índices; reconexões pendentes rodam ao soltá-la
+ - @method _acknowledge_write : Marca a gravação própria do armazenamento como conhecida pelo watcher
  - @retparms : Instância da classe DeviceManager
 """
 class DeviceManager:
@@ -45,7 +110,12 @@ class DeviceManager:
 
     def __init__(self, devices_file: str = 'devices.json',
                  tuya_file: str = 'tinytuya.json',
-                 raw_file: str = 'tuya-raw.json'):
+                 raw_file: str = 'tuya-raw.json',
+                 snapshot_file: str = 'snapshot.json',
+                 backend: str = None,
+                 backup_dir: str = 'backups',
+                 compact: bool = False,
+                 calibration_file: str = 'calibration.json'):
         """
         Inicializa o gerenciador
 
@@ -53,72 +123,215 @@ class DeviceManager:
             devices_file: Arquivo com dispositivos formatados
             tuya_file: Arquivo de configuração do tinytuya
             raw_file: Arquivo raw do tinytuya
+            snapshot_file: Snapshot da rede (ponto de partida da descoberta)
+            backend: 'json' (padrão para .json) ou 'sqlite' (padrão para .db/.sqlite)
+            backup_dir: Diretório do repositório de backups
+            compact: Mantém os dispositivos como DeviceRecord (__slots__, menos memória)
+            calibration_file: Perfis de calibração (product_id ou ID -> gamma, balanço, brilho)
         """
         self.devices_file = devices_file
         self.tuya_file = tuya_file
         self.raw_file = raw_file
+        self.snapshot_file = snapshot_file
+        self.backend = backend
+        self.compact = compact
+        self.schemas = SchemaRegistry()
+        self.cloud = CloudDataCache(raw_file)
+        self.state = StateStore(self.cloud, snapshot_file, lookup=self.find_by_id)
+        self.calibration = CalibrationRegistry(calibration_file)
+        self.storage = self._open_storage()
+        self.backups = BackupStore(backup_dir)
         self.devices = []
+        self.last_merge = None
+        self.index = DeviceIndex()
+        self.sessions = weakref.WeakValueDictionary()
+        self.watcher = None
+        self.changed_ids = set()
+        # Trava de self.devices/self.index (thread do watcher x chamadas do usuário)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._reconnects = []
         self.load_devices()
 
+    def _open_storage(self):
+        """Abre o backend; gravações concorrentes mescladas voltam para a lista em memória"""
+        storage = open_storage(self.devices_file, self.backend, self.schemas)
+        storage.on_merge = self._apply_incoming
+        storage.on_write = self._acknowledge_write
+        return storage
+
+    @contextmanager
+    def _locked(self):
+        """
+        Trava a lista e os índices (reentrante)
+
+        Lâmpadas que precisam reconectar por causa de uma recarga só
+        reconectam depois que a trava mais externa é liberada, para que o
+        timeout de conexão não bloqueie as outras threads.
+        """
+        with self._lock:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                reconnects = []
+                if self._depth == 0:
+                    reconnects, self._reconnects = self._reconnects, []
+        for lamp, fields in reconnects:
+            lamp.apply_config_change(fields)
+
+    def _acknowledge_write(self) -> None:
+        """Gravação própria (save, diário ou compactação pelo timer) não dispara recarga"""
+        if self.watcher:
+            self.watcher.acknowledge()
+
     def load_devices(self) -> bool:
-        """Carrega os dispositivos do arquivo JSON"""
+        """Carrega os dispositivos do armazenamento (JSON ou SQLite)"""
+        with self._locked():
+            return self._load_devices()
+
+    def _load_devices(self) -> bool:
         try:
-            if os.path.exists(self.devices_file):
-                with open(self.devices_file, 'r', encoding='utf-8') as f:
-                    self.devices = json.load(f)
+            if self.storage.exists():
+                self.devices = self.storage.load()
+                if self.compact:
+                    self.devices = DeviceRecord.from_dicts(self.devices, self.schemas)
+                self.index.rebuild(self.devices)
                 return True
             else:
                 self.devices = []
+                self.index.rebuild(self.devices)
                 return False
         except Exception as e:
             print(f"Erro ao carregar dispositivos: {e}")
             self.devices = []
+            self.index.rebuild(self.devices)
             return False
 
     def save_devices(self) -> bool:
-        """Salva os dispositivos no arquivo JSON"""
+        """Salva todos os dispositivos no armazenamento"""
         try:
-            with open(self.devices_file, 'w', encoding='utf-8') as f:
-                json.dump(self.devices, f, indent=4, ensure_ascii=False)
+            with self._locked():
+                # Só os IDs tocados aqui vencem se outro processo gravou nesse meio tempo
+                changed, self.changed_ids = self.changed_ids, set()
+                self.storage.save(self.devices, changed)
             return True
+        except TimeoutError as e:
+            self.changed_ids |= changed
+            print(f"✗ {e}")
+            return False
         except Exception as e:
             print(f"Erro ao salvar dispositivos: {e}")
             return False
 
-    def backup_files(self) -> bool:
-        """Faz backup dos arquivos de configuração"""
+    def _save_device(self, device: dict) -> bool:
+        """Persiste um único dispositivo (no SQLite, uma transação de uma linha)"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_dir = f"backup_{timestamp}"
+            with self._locked():
+                self.storage.save_device(device, self.devices)
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar dispositivo: {e}")
+            return False
 
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir)
+    def _compact_devices(self) -> None:
+        """Converte em DeviceRecord os dispositivos que entraram como dicionário"""
+        if not self.compact:
+            return
+        for position, device in enumerate(self.devices):
+            if not isinstance(device, DeviceRecord):
+                record = DeviceRecord(device, self.schemas)
+                self.devices[position] = record
+                self.index.update(record)
+
+    def _delete_device(self, device_id: str) -> bool:
+        """Remove um único dispositivo do armazenamento"""
+        try:
+            with self._locked():
+                self.storage.delete_device(device_id, self.devices)
+            return True
+        except Exception as e:
+            print(f"Erro ao remover dispositivo: {e}")
+            return False
 
+    def backup_files(self) -> bool:
+        """Faz backup dos arquivos de configuração (blobs deduplicados + manifesto)"""
+        try:
             files_to_backup = [
                 self.devices_file,
                 self.tuya_file,
                 self.raw_file
             ]
 
-            for file in files_to_backup:
-                if os.path.exists(file):
-                    shutil.copy2(file, os.path.join(backup_dir, file))
-                    print(f"✓ Backup: {file}")
+            self.storage.flush()
+            snapshot_id = self.backups.create(files_to_backup)
+            removed = self.backups.prune()
 
-            print(f"✓ Backup realizado em: {backup_dir}")
+            print(f"✓ Backup realizado: {snapshot_id} (em {self.backups.root})")
+            if removed:
+                print(f"  • {len(removed)} backup(s) antigo(s) removido(s) pela retenção")
             return True
         except Exception as e:
             print(f"Erro ao fazer backup: {e}")
             return False
 
+    def list_backups(self) -> list:
+        """
+        Lista os snapshots de backup (do mais antigo para o mais novo)
+
+        Na primeira chamada, as pastas backup_YYYYMMDD_HHMMSS das versões
+        anteriores (ao lado do devices.json) viram snapshots, uma única vez.
+        """
+        try:
+            imported = self.backups.import_legacy(os.path.dirname(self.devices_file) or '.')
+            if imported:
+                print(f"✓ {len(imported)} backup(s) antigo(s) importado(s) para {self.backups.root}")
+        except Exception as e:
+            print(f"⚠️  Erro ao importar backups antigos: {e}")
+
+        snapshots = self.backups.list()
+        if not snapshots:
+            print("Nenhum backup encontrado.")
+        for manifest in snapshots:
+            files = ', '.join(os.path.basename(p) for p in manifest['files'])
+            print(f"  • {manifest['id']}  ({files})")
+        return snapshots
+
+    def restore_backup(self, snapshot_id: str) -> bool:
+        """
+        Restaura os arquivos de um snapshot e recarrega os dispositivos
+
+        Args:
+            snapshot_id: ID do snapshot (ver list_backups)
+
+        Returns:
+            True se sucesso, False caso contrário
+        """
+        with self._locked():
+            try:
+                # Fecha o armazenamento para não gravar pendências por cima do restaurado
+                self.storage.close()
+                restored = self.backups.restore(snapshot_id)
+                for path in restored:
+                    print(f"✓ Restaurado: {path}")
+                return True
+            except Exception as e:
+                print(f"✗ Erro ao restaurar backup: {e}")
+                return False
+            finally:
+                self.storage = self._open_storage()
+                self.load_devices()
+
     def run_wizard(self) -> bool:
         """
-        Executa o wizard do tinytuya para descobrir dispositivos (via subprocess)
+        Executa o wizard de descoberta de dispositivos (no próprio processo)
+
+        Pede as credenciais que faltarem no tinytuya.json e delega para provision().
+
         Returns:
             True se sucesso, False caso contrário
         """
-        import subprocess
-        import sys
         print("\n" + "=" * 70)
         print("WIZARD DO TINYTUYA - DESCOBERTA DE DISPOSITIVOS")
         print("=" * 70)
@@ -139,48 +352,38 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
 """)
         try:
             input()
+            credentials = self._load_credentials()
+            prompts = {
+                'apiKey': "API Key: ",
+                'apiSecret': "API Secret: ",
+                'apiDeviceID': "Device ID (ou 'scan'): ",
+                'apiRegion': "Região (cn, us, us-e, eu, eu-w, in, sg): ",
+            }
+            if all(credentials.get(k) for k in prompts):
+                answer = input("Usar credenciais existentes? (S/n): ").strip().lower()
+                if answer.startswith('n'):
+                    credentials = {}
+            for field, prompt in prompts.items():
+                if not credentials.get(field):
+                    credentials[field] = input(prompt)
+
             # Faz backup antes de rodar o wizard
             print("\n📦 Fazendo backup dos arquivos atuais...")
             self.backup_files()
-            # Executa o wizard CLI do tinytuya
             print("\n🔍 Iniciando descoberta de dispositivos...")
-            print("Isto pode levar alguns minutos...\n")
-
-            # Obtém o diretório atual para garantir que os arquivos sejam salvos aqui
-            current_dir = os.getcwd()
-
-            # Executa o wizard especificando os arquivos de saída
-            cmd = [
-                sys.executable, "-m", "tinytuya", "wizard",
-                "-device-file", self.devices_file,
-                "-credentials-file", self.tuya_file,
-                "-raw-response-file", self.raw_file
-            ]
-
-            result = subprocess.run(cmd, check=False, cwd=current_dir)
 
-            # Valida e limpa o arquivo tinytuya.json após wizard
-            if result.returncode == 0 or os.path.exists(self.tuya_file):
-                print("\n🧹 Validando e limpando dados do wizard...")
-                if self._clean_wizard_file():
-                    print("  ✓ Dados validados e limpos")
-                else:
-                    print("  ⚠️  Aviso: Não foi possível validar completamente")
-
-            if result.returncode != 0:
-                print(f"✗ Erro ao executar wizard CLI (código {result.returncode})")
+            result = self.provision(credentials)
+            if not result:
                 return False
-            print("\n✓ Wizard concluído!")
+
+            print(f"\n✓ Wizard concluído em {result['elapsed']:.1f}s!")
+            print(f"  • {len(result['devices'])} dispositivo(s) na nuvem, "
+                  f"{result['located']} localizado(s) na rede")
             print("Os arquivos foram salvos:")
             print(f"  • {self.tuya_file}")
             print(f"  • {self.raw_file}")
-            # Sincroniza com o arquivo devices.json
-            if self.sync_from_wizard():
-                print(f"  • {self.devices_file}")
-                return True
-            else:
-                print("Erro ao sincronizar dispositivos")
-                return False
+            print(f"  • {self.devices_file}")
+            return True
         except KeyboardInterrupt:
             print("\nWizard cancelado pelo usuário")
             return False
@@ -188,6 +391,143 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
             print(f"✗ Erro ao executar wizard: {e}")
             return False
 
+    def provision(self, credentials: dict = None, scan: bool = True, save: bool = True) -> dict:
+        """
+        Descoberta/sincronização não interativa, sem subprocess
+
+        Consulta a Cloud API e a rede no próprio processo, mescla o resultado em
+        memória e só grava tinytuya.json, tuya-raw.json e devices.json no final.
+
+        Args:
+            credentials: Credenciais da Cloud API (padrão: lidas do tinytuya.json)
+            scan: Se True, localiza os IPs na rede local
+            save: Se True, grava os três arquivos ao final
+
+        Returns:
+            Resultado do InProcessWizard (credentials, devices, raw, located, elapsed)
+            ou None em caso de erro
+        """
+        if credentials is None:
+            credentials = self._load_credentials()
+
+        try:
+            result = InProcessWizard(credentials, self.devices, scan=scan).run()
+        except WizardError as e:
+            print(f"✗ Erro da Cloud API: {e}")
+            return None
+
+        if not self.sync_from_wizard(result['devices'], save=False):
+            return None
+
+        if save:
+            try:
+                atomic_write_json(self.tuya_file, result['credentials'])
+                atomic_write_json(self.raw_file, result['raw'])
+            except Exception as e:
+                print(f"✗ Erro ao salvar arquivos do wizard: {e}")
+                return None
+            if not self.save_devices():
+                return None
+        return result
+
+    def _load_credentials(self) -> dict:
+        """Lê as credenciais da Cloud API do tinytuya.json (vazio se não existir)"""
+        try:
+            with open(self.tuya_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {k: data[k] for k in CREDENTIAL_FIELDS if isinstance(data.get(k), str)}
+
+    def scan_network(self, subnets: list = None, save: bool = True) -> list:
+        """
+        Varre a rede com o scanner asyncio e atualiza IP/versão dos dispositivos conhecidos
+
+        Args:
+            subnets: Sub-redes a varrer (padrão: sub-redes dos IPs cadastrados + rede local)
+            save: Se True, salva devices.json quando algum dispositivo mudar
+
+        Returns:
+            Lista de dispositivos encontrados na rede
+        """
+        if not subnets:
+            subnets = subnets_from_devices(self.devices)
+            for subnet in local_subnets():
+                if subnet not in subnets:
+                    subnets.append(subnet)
+
+        print(f"\n🔍 Varrendo {', '.join(subnets)}...")
+        changed = False
+
+        def on_found(found):
+            nonlocal changed
+            device = self.index.get('id', found['id']) or self.index.get('ip', found['ip'])
+            label = device['name'] if device else (found['id'] or '?')
+            print(f"  ✓ {found['ip']:15} {label}")
+
+            if device and (device.get('ip') != found['ip'] or
+                           (found['version'] and device.get('version') != found['version'])):
+                with self._locked():
+                    device['ip'] = found['ip']
+                    if found['version']:
+                        device['version'] = found['version']
+                    self.index.update(device)
+                    self.changed_ids.add(device['id'])
+                changed = True
+
+        try:
+            found = NetworkScanner(subnets).scan(on_found)
+        except Exception as e:
+            print(f"✗ Erro na varredura: {e}")
+            return []
+
+        print(f"✓ {len(found)} dispositivo(s) encontrado(s)")
+        if changed and save:
+            self.save_devices()
+        return found
+
+    def discover_incremental(self, subnets: list = None, save: bool = True) -> dict:
+        """
+        Descoberta incremental: verifica os conhecidos e só sonda o que é novo/mudou
+
+        Args:
+            subnets: Sub-redes a varrer (padrão: sub-redes conhecidas + rede local)
+            save: Se True, salva devices.json quando IP/versão de algum dispositivo mudar
+
+        Returns:
+            Relatório com listas de IDs (verified, new, changed, offline, probed)
+        """
+        print("\n🔍 Descoberta incremental (snapshot como ponto de partida)...")
+        snapshot = SnapshotStore(self.snapshot_file)
+
+        try:
+            report = IncrementalDiscovery(self.devices, snapshot, subnets).run()
+        except Exception as e:
+            print(f"✗ Erro na descoberta: {e}")
+            return {}
+
+        changed = False
+        with self._locked():
+            for device_id in report['probed']:
+                device = self.index.get('id', device_id)
+                entry = snapshot.get(device_id)
+                if not device or not entry:
+                    continue
+                if device.get('ip') != entry.get('ip') or device.get('version') != entry.get('ver'):
+                    device['ip'] = entry.get('ip', '')
+                    device['version'] = entry.get('ver', '')
+                    self.index.update(device)
+                    self.changed_ids.add(device['id'])
+                    changed = True
+
+        print(f"  ✓ Verificados: {len(report['verified'])}")
+        print(f"  ✓ Novos: {len(report['new'])}  Alterados: {len(report['changed'])}")
+        print(f"  ⚠️  Offline: {len(report['offline'])}")
+
+        if changed and save:
+            self.save_devices()
+        return report
+
     def _clean_wizard_file(self) -> bool:
         """
         Valida e limpa o arquivo tinytuya.json após o wizard
@@ -203,28 +543,14 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
             with open(self.tuya_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
 
-            # Campos que devem ter espaços removidos
-            critical_fields = ['apiKey', 'apiSecret', 'apiDeviceID', 'apiRegion']
-
-            # Limpa campos críticos na raiz do JSON
-            for field in critical_fields:
-                if field in data and isinstance(data[field], str):
-                    original = data[field]
-                    data[field] = data[field].strip()
-                    if original != data[field]:
-                        print(f"  ✓ Limpeza: {field} (removidos espaços)")
-
-            # Limpa campos críticos em cada dispositivo
-            for device_id, device_info in data.items():
-                if isinstance(device_info, dict):
-                    if 'key' in device_info and isinstance(device_info['key'], str):
-                        device_info['key'] = device_info['key'].strip()
-                    if 'ip' in device_info and isinstance(device_info['ip'], str):
-                        device_info['ip'] = device_info['ip'].strip()
-
-            # Salva o arquivo limpo
-            with open(self.tuya_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            cleaned = clean_credentials(data)
+            for field in CREDENTIAL_FIELDS:
+                if field in data and data[field] != cleaned[field]:
+                    print(f"  ✓ Limpeza: {field} (removidos espaços)")
+            data = cleaned
+
+            # Salva o arquivo limpo (temporário + fsync + rename)
+            atomic_write_json(self.tuya_file, data)
 
             return True
 
@@ -233,61 +559,92 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
             return False
 
 
-    def sync_from_wizard(self) -> bool:
+    def sync_from_wizard(self, wizard_devices: list = None, save: bool = True) -> bool:
         """
-        Sincroniza o devices.json com tinytuya.json do wizard
+        Sincroniza o devices.json com o resultado do wizard
+
+        Args:
+            wizard_devices: Lista de dispositivos em memória (provision); se None,
+                lê os dispositivos do tinytuya.json
+            save: Se True, salva o devices.json ao final
 
         Returns:
             True se sucesso, False caso contrário
         """
         try:
-            if not os.path.exists(self.tuya_file):
-                print(f"⚠️  Arquivo {self.tuya_file} não encontrado")
-                return False
-
-            with open(self.tuya_file, 'r', encoding='utf-8') as f:
-                tuya_data = json.load(f)
-
-            # Extrai dispositivos do formato do tinytuya
-            new_devices = []
-            for device_id, device_info in tuya_data.items():
-                if isinstance(device_info, dict) and 'name' in device_info:
-                    device = {
-                        'id': device_id,
-                        'name': device_info.get('name', 'Desconhecido'),
-                        'key': device_info.get('key', ''),
-                        'ip': device_info.get('ip', ''),
-                        'mac': device_info.get('mac', ''),
-                        'uuid': device_info.get('uuid', ''),
-                        'model': device_info.get('model', ''),
-                    }
-                    new_devices.append(device)
+            if wizard_devices is not None:
+                new_devices = [d for d in wizard_devices if isinstance(d, dict) and d.get('id')]
+            else:
+                new_devices = self._read_wizard_file()
+                if new_devices is None:
+                    return False
 
             if not new_devices:
                 print("⚠️  Nenhum dispositivo encontrado no arquivo wizard")
                 return False
 
-            # Mescla com dispositivos existentes (evita duplicatas)
-            existing_ids = {d['id'] for d in self.devices}
-            for new_device in new_devices:
-                if new_device['id'] not in existing_ids:
-                    self.devices.append(new_device)
-                    print(f"  ✓ Novo: {new_device['name']}")
-                else:
-                    # Atualiza dispositivo existente
-                    for existing in self.devices:
-                        if existing['id'] == new_device['id']:
-                            existing.update(new_device)
-                            print(f"  ✓ Atualizado: {new_device['name']}")
-                            break
+            with self._locked():
+                # Hash join por ID: uma passada sobre o cadastro e uma sobre o wizard
+                report = merge_devices(self.devices, new_devices, index=self.index.by_id)
+                self._reindex(report)
+                self.last_merge = report
+                self._print_merge(report)
 
-            # Salva
-            return self.save_devices()
+                # Salva
+                return self.save_devices() if save else True
 
         except Exception as e:
             print(f"Erro ao sincronizar: {e}")
             return False
 
+    def _read_wizard_file(self) -> list:
+        """Extrai dispositivos do tinytuya.json (formato id -> info); None se ausente"""
+        if not os.path.exists(self.tuya_file):
+            print(f"⚠️  Arquivo {self.tuya_file} não encontrado")
+            return None
+
+        with open(self.tuya_file, 'r', encoding='utf-8') as f:
+            tuya_data = json.load(f)
+
+        new_devices = []
+        for device_id, device_info in tuya_data.items():
+            if isinstance(device_info, dict) and 'name' in device_info:
+                new_devices.append({
+                    'id': device_id,
+                    'name': device_info.get('name', 'Desconhecido'),
+                    'key': device_info.get('key', ''),
+                    'ip': device_info.get('ip', ''),
+                    'mac': device_info.get('mac', ''),
+                    'uuid': device_info.get('uuid', ''),
+                    'model': device_info.get('model', ''),
+                })
+        return new_devices
+
+    def _reindex(self, report) -> None:
+        """Atualiza os índices secundários dos dispositivos tocados por uma mesclagem"""
+        self.changed_ids.update(report.removed)
+        self.changed_ids.update(report.added)
+        self.changed_ids.update(report.updated)
+        for device_id in report.removed:
+            self.index.discard(device_id)
+        for device_id in list(report.added) + list(report.updated):
+            device = self.index.by_id[device_id]
+            if 'mapping' in device:
+                device['mapping'] = self.schemas.intern(device.get('product_id'), device['mapping'])
+            self.index.update(device)
+        if report.added:
+            self._compact_devices()
+
+    def _print_merge(self, report, limit: int = 20) -> None:
+        """Mostra o relatório da mesclagem (detalhado só para poucos dispositivos)"""
+        if len(report.added) + len(report.updated) <= limit:
+            name = lambda i: self.index.by_id[i].get('name', i)
+            for device_id in report.added:
+                print(f"  ✓ Novo: {name(device_id)}")
+            for device_id, fields in report.updated.items():
+                print(f"  ✓ Atualizado: {name(device_id)} ({', '.join(fields)})")
+        print(f"  • {report.summary()}")
+
     def list_devices(self) -> None:
         """Lista todos os dispositivos"""
         if not self.devices:
@@ -326,7 +683,7 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
                 return False
 
             # Verifica se já existe
-            if any(d['id'] == device_id for d in self.devices):
+            if device_id in self.index:
                 print("✗ Dispositivo com este ID já existe")
                 return False
 
@@ -347,9 +704,18 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
                 'model': input("Modelo (opcional): ").strip() or '',
             }
 
-            self.devices.append(new_device)
+            if self.compact:
+                new_device = DeviceRecord(new_device, self.schemas)
+            with self._locked():
+                # Uma recarga durante as perguntas pode ter trazido o mesmo ID
+                if device_id in self.index:
+                    print("✗ Dispositivo com este ID já existe")
+                    return False
+                self.devices.append(new_device)
+                self.index.update(new_device)
+                saved = self._save_device(new_device)
 
-            if self.save_devices():
+            if saved:
                 print(f"\n✓ Dispositivo '{name}' adicionado com sucesso!")
                 return True
             else:
@@ -369,6 +735,8 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
             print("Nenhum dispositivo para remover")
             return False
 
+        # A escolha vale para a lista mostrada, mesmo que uma recarga a mude enquanto isso
+        shown = list(self.devices)
         self.list_devices()
 
         try:
@@ -378,15 +746,26 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
                 return False
 
             idx = int(choice) - 1
-            if 0 <= idx < len(self.devices):
-                removed = self.devices.pop(idx)
-
-                if self.save_devices():
+            if 0 <= idx < len(shown):
+                removed = shown[idx]
+                with self._locked():
+                    if self.index.by_id.get(removed['id']) is not removed:
+                        print("✗ Dispositivo não existe mais (o cadastro foi recarregado)")
+                        return False
+                    position = self.devices.index(removed)
+                    del self.devices[position]
+                    self.index.discard(removed['id'])
+
+                    deleted = self._delete_device(removed['id'])
+                    if not deleted:
+                        # Restaura se não conseguiu salvar
+                        self.devices.insert(position, removed)
+                        self.index.update(removed)
+
+                if deleted:
                     print(f"\n✓ Dispositivo '{removed['name']}' removido com sucesso!")
                     return True
                 else:
-                    # Restaura se não conseguiu salvar
-                    self.devices.insert(idx, removed)
                     print("✗ Erro ao salvar alterações")
                     return False
             else:
@@ -403,6 +782,7 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
             print("Nenhum dispositivo para editar")
             return False
 
+        shown = list(self.devices)
         self.list_devices()
 
         try:
@@ -412,25 +792,30 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
                 return False
 
             idx = int(choice) - 1
-            if 0 <= idx < len(self.devices):
-                device = self.devices[idx]
+            if 0 <= idx < len(shown):
+                device = shown[idx]
 
                 print(f"\n📝 Editando: {device['name']}")
                 print("(deixe em branco para manter o valor atual)\n")
 
+                # Respostas primeiro; o dispositivo só muda com a trava adquirida
                 new_name = input(f"Nome [{device['name']}]: ").strip()
-                if new_name:
-                    device['name'] = new_name
-
                 new_ip = input(f"IP [{device.get('ip', '')}]: ").strip()
-                if new_ip is not None:
-                    device['ip'] = new_ip
-
                 new_key = input(f"Chave [{device['key'][:5]}...]: ").strip()
-                if new_key:
-                    device['key'] = new_key
 
-                if self.save_devices():
+                with self._locked():
+                    if self.index.by_id.get(device['id']) is not device:
+                        print("✗ Dispositivo não existe mais (o cadastro foi recarregado)")
+                        return False
+                    if new_name:
+                        device['name'] = new_name
+                    device['ip'] = new_ip
+                    if new_key:
+                        device['key'] = new_key
+                    self.index.update(device)
+                    saved = self._save_device(device)
+
+                if saved:
                     print(f"\n✓ Dispositivo '{device['name']}' atualizado com sucesso!")
                     return True
                 else:
@@ -444,44 +829,76 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
             print("✗ Entrada inválida")
             return False
 
-    def export_devices(self, filename: str = None) -> bool:
-        """Exporta dispositivos para um arquivo JSON"""
+    def export_devices(self, filename: str = None, progress=None) -> bool:
+        """
+        Exporta dispositivos para um arquivo
+
+        Arquivos .ndjson/.jsonl (opcionalmente .gz) são gravados em fluxo, um
+        dispositivo por linha; qualquer outra extensão gera o JSON de sempre.
+
+        Args:
+            filename: Arquivo de destino (padrão: devices_export_<data>.json)
+            progress: Função progress(contagem, fração) para o NDJSON (padrão: mostra na tela)
+        """
         if not filename:
             filename = f"devices_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
 
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.devices, f, indent=4, ensure_ascii=False)
-            print(f"✓ Dispositivos exportados para: {filename}")
+            if is_ndjson(filename):
+                count = write_ndjson(filename, self.devices, progress or self._print_progress)
+                print(f"✓ {count} dispositivo(s) exportado(s) para: {filename}")
+            else:
+                atomic_write_json(filename, self.devices)
+                print(f"✓ Dispositivos exportados para: {filename}")
             return True
         except Exception as e:
             print(f"✗ Erro ao exportar: {e}")
             return False
 
-    def import_devices(self, filename: str) -> bool:
-        """Importa dispositivos de um arquivo JSON"""
+    def import_devices(self, filename: str, progress=None) -> bool:
+        """
+        Importa dispositivos de um arquivo (só insere IDs novos)
+
+        Arquivos .ndjson/.jsonl (opcionalmente .gz) são lidos em fluxo e
+        mesclados linha a linha, sem carregar o arquivo inteiro na memória.
+        A mesclagem é feita sobre uma cópia do cadastro: uma linha inválida
+        no meio do arquivo descarta a importação inteira.
+
+        Args:
+            filename: Arquivo a importar
+            progress: Função progress(contagem, fração) para o NDJSON (padrão: mostra na tela)
+        """
         try:
             if not os.path.exists(filename):
                 print(f"✗ Arquivo não encontrado: {filename}")
                 return False
 
-            with open(filename, 'r', encoding='utf-8') as f:
-                imported = json.load(f)
-
-            if not isinstance(imported, list):
-                print("✗ Formato inválido (deve ser uma lista de dispositivos)")
-                return False
-
-            # Mescla com existentes
-            existing_ids = {d['id'] for d in self.devices}
-            added = 0
+            if is_ndjson(filename):
+                imported = iter_ndjson(filename, progress or self._print_progress)
+            else:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    imported = json.load(f)
 
-            for device in imported:
-                if device.get('id') not in existing_ids:
-                    self.devices.append(device)
-                    added += 1
+                if not isinstance(imported, list):
+                    print("✗ Formato inválido (deve ser uma lista de dispositivos)")
+                    return False
 
-            if self.save_devices():
+            with self._locked():
+                # Mescla com existentes (só insere IDs novos) em uma cópia da lista e do índice
+                staged = list(self.devices)
+                staged_ids = dict(self.index.by_id)
+                report = merge_devices(staged, imported, mode='insert', index=staged_ids)
+
+                # Arquivo lido até o fim sem erro: só agora o cadastro e os índices mudam
+                self.devices[:] = staged
+                for device_id in report.added:
+                    self.index.by_id[device_id] = staged_ids[device_id]
+                self._reindex(report)
+                self.last_merge = report
+                added = len(report.added)
+                saved = self.save_devices()
+
+            if saved:
                 print(f"✓ {added} dispositivo(s) importado(s)")
                 return True
             else:
@@ -489,9 +906,185 @@ Pressione ENTER para continuar ou CTRL+C para cancelar...
                 return False
 
         except Exception as e:
-            print(f"✗ Erro ao importar: {e}")
+            print(f"\n✗ Erro ao importar (nada foi alterado): {e}")
             return False
 
+    def _print_progress(self, count: int, fraction: float) -> None:
+        """Mostra o progresso na mesma linha do console"""
+        percent = f" ({fraction:.0%})" if fraction is not None else ""
+        end = "\n" if fraction == 1.0 else ""
+        print(f"\r  • {count} dispositivo(s){percent}", end=end, flush=True)
+
+    def find_by_id(self, device_id: str) -> dict:
+        """Retorna o dispositivo com o ID ou None"""
+        return self.index.get('id', device_id)
+
+    def find_by_name(self, name: str) -> dict:
+        """Retorna o dispositivo com o nome (sem diferenciar maiúsculas) ou None"""
+        return self.index.get('name', name)
+
+    def find_by_mac(self, mac: str) -> dict:
+        """Retorna o dispositivo com o endereço MAC ou None"""
+        return self.index.get('mac', mac)
+
+    def find_by_ip(self, ip: str) -> dict:
+        """Retorna o dispositivo com o endereço IP ou None"""
+        return self.index.get('ip', ip)
+
+    def find_by_product(self, product_id: str) -> list:
+        """Lista os dispositivos de um product_id"""
+        return self.index.find_all('product_id', product_id)
+
+    def find_by_category(self, category: str) -> list:
+        """Lista os dispositivos de uma categoria Tuya (ex: 'dj' = lâmpada)"""
+        return self.index.find_all('category', category)
+
+    def cloud_data(self, device_id: str) -> dict:
+        """
+        Registro bruto da nuvem (status, online, ...) do tuya-raw.json
+
+        O arquivo só é lido na primeira consulta e relido quando muda.
+        """
+        return self.cloud.get(device_id)
+
+    def open_lamp(self, device: dict, version: float = 3.5) -> SmartLamp:
+        """
+        Cria uma SmartLamp registrada no gerenciador
+
+        Lâmpadas abertas por aqui recebem as mudanças da recarga a quente
+        (ver reload_devices) sem precisar ser recriadas.
+        """
+        lamp = SmartLamp(device, version)
+        lamp.state_store = self.state
+        lamp.calibration = self.calibration.profile(device)
+        self.sessions[device['id']] = lamp
+        return lamp
+
+    def probe_states(self, devices: list = None, timeout: int = 3, workers: int = 16,
+                     wait: bool = False) -> list:
+        """
+        Consulta o status das lâmpadas em paralelo e refina o estado conhecido
+
+        Listas e painéis usam manager.state desde a abertura (nuvem/snapshot);
+        cada resposta (ou falta dela) chega ao StateStore assim que termina.
+
+        Args:
+            devices: Dispositivos a consultar (padrão: todos com IP)
+            timeout: Timeout de conexão por lâmpada em segundos
+            workers: Consultas simultâneas
+            wait: Se True, só retorna depois de todas as consultas
+
+        Returns:
+            Lista de futures (uma por dispositivo consultado)
+        """
+        devices = [d for d in (self.devices if devices is None else devices)
+                   if (d.get('ip') or '').strip() and d.get('key')]
+
+        def probe(device):
+            try:
+                version = float(device.get('version') or 3.5)
+            except ValueError:
+                version = 3.5
+            try:
+                bulb = tinytuya.BulbDevice(dev_id=device['id'], address=device['ip'].strip(),
+                                           local_key=device['key'], version=version,
+                                           connection_timeout=timeout)
+                status = bulb.status()
+            except Exception:
+                status = None
+            online = bool(status) and 'Error' not in status
+            self.state.update(device['id'], status.get('dps') if online else None, online=online)
+            return online
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='probe')
+        futures = [executor.submit(probe, device) for device in devices]
+        executor.shutdown(wait=wait)
+        return futures
+
+    def start_watching(self, interval: float = 1.0) -> str:
+        """
+        Liga a recarga a quente: edições externas do arquivo de dispositivos
+        (ou do seu diário) são aplicadas sem reiniciar (inotify no Linux,
+        senão consulta por stat)
+
+        Returns:
+            Mecanismo usado ('inotify' ou 'stat')
+        """
+        if self.watcher is None:
+            journal = getattr(self.storage, 'journal_path', None)
+            self.watcher = FileWatcher(self.devices_file, lambda path: self.reload_devices(),
+                                       interval=interval, companions=(journal,) if journal else ())
+            self.watcher.start()
+        return self.watcher.backend
+
+    def stop_watching(self) -> None:
+        """Desliga a recarga a quente"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+
+    def reload_devices(self) -> dict:
+        """
+        Relê o arquivo de dispositivos e aplica só o que mudou
+
+        Dispositivos alterados são atualizados no lugar (os mesmos objetos),
+        então índices e SmartLamps abertas continuam válidos; só lâmpadas cujo
+        id/key/ip mudou reconectam.
+
+        Returns:
+            Diferença aplicada: added, removed (IDs) e changed (id -> campos)
+        """
+        with self._locked():
+            diff = self._apply_incoming(self.storage.load())
+        if diff['added'] or diff['removed'] or diff['changed']:
+            print(f"\n🔄 {os.path.basename(self.devices_file)} recarregado: "
+                  f"{len(diff['added'])} novo(s), {len(diff['changed'])} alterado(s), "
+                  f"{len(diff['removed'])} removido(s)")
+        return diff
+
+    def _apply_incoming(self, incoming: list) -> dict:
+        """
+        Aplica no lugar uma lista lida do disco (recarga a quente ou mesclagem
+        com a gravação de outro processo)
+
+        As lâmpadas abertas que precisam reconectar só o fazem quando a
+        trava é liberada (ver _locked).
+
+        Returns:
+            Diferença aplicada: added, removed (IDs) e changed (id -> campos)
+        """
+        with self._locked():
+            diff = diff_devices(self.devices, incoming)
+            if not (diff['added'] or diff['removed'] or diff['changed']):
+                return diff
+
+            incoming_by_id = {d['id']: d for d in incoming if d.get('id')}
+            for device_id, fields in diff['changed'].items():
+                device = self.index.by_id[device_id]
+                source = incoming_by_id[device_id]
+                for field in fields:
+                    if field in source:
+                        device[field] = source[field]
+                    else:
+                        del device[field]
+                self.index.update(device)
+                lamp = self.sessions.get(device_id)
+                if lamp is not None and lamp.config is device:
+                    self._reconnects.append((lamp, fields))
+
+            for device_id in diff['removed']:
+                self.index.discard(device_id)
+            for device_id in diff['added']:
+                device = incoming_by_id[device_id]
+                if self.compact and not isinstance(device, DeviceRecord):
+                    device = DeviceRecord(device, self.schemas)
+                self.index.update(device)
+
+            # Mantém a ordem do arquivo reaproveitando os objetos existentes
+            self.devices[:] = [self.index.by_id[d['id']] for d in incoming
+                               if d.get('id') in self.index.by_id]
+        return diff
+
 """
 END DeviceManager
 """
@@ -0,0 +1,189 @@
+"""
+Módulo de registros compactos de dispositivos
+
+Este módulo contém o DeviceRecord, uma alternativa ao dicionário por
+dispositivo para frotas grandes: os campos do devices.json ficam em
+__slots__, os textos repetidos entre dispositivos (categoria, produto,
+modelo, versão, ...) são internados e os DPs de controle da lâmpada já vêm
+resolvidos. O registro se comporta como um dicionário (get, [], in, items),
+então o DeviceManager, o DeviceIndex, a mesclagem e a SmartLamp o aceitam
+sem mudanças.
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+from .dp_schema import compile_schema
+
+
+# Campos de um dispositivo no devices.json do tinytuya, na ordem do arquivo
+RECORD_FIELDS = ('name', 'id', 'key', 'mac', 'uuid', 'sn', 'category', 'product_name',
+                 'product_id', 'biz_type', 'model', 'sub', 'icon', 'mapping', 'ip', 'version')
+
+# Campos cujos valores se repetem entre dispositivos e são internados
+INTERNED_FIELDS = ('category', 'product_name', 'product_id', 'model', 'icon', 'version')
+
+# Atributo do registro -> código Tuya do DP resolvido na criação
+DP_FIELDS = {
+    'dp_switch': 'switch_led',
+    'dp_brightness': 'bright_value',
+    'dp_temperature': 'temp_value',
+    'dp_colour': 'colour_data',
+    'dp_work_mode': 'work_mode',
+}
+
+# Sentinela para campo ausente (slot não preenchido)
+_MISSING = object()
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN DeviceRecord
+ - @param device : Dicionário do dispositivo (formato do devices.json) ou None
+ - @param schemas : SchemaRegistry para compartilhar o mapping do produto (opcional)
+ - @var/obj name, id, key, ... : Campos do devices.json em __slots__ (RECORD_FIELDS)
+ - @var/obj extra : Campos fora do formato padrão (dicionário) ou None
+ - @var/obj dp_switch, dp_brightness, dp_temperature, dp_colour, dp_work_mode : DPs resolvidos
+ - @method from_dicts : Converte uma lista de dicionários em registros
+ - @method to_dict : Dicionário no formato do devices.json
+ - @method _resolve_dps : Copia os DPs de controle do esquema compilado do mapping
+ - @retparms : Instância da classe DeviceRecord
+"""
+class DeviceRecord(MutableMapping):
+    """Registro de dispositivo com __slots__, textos internados e DPs resolvidos"""
+
+    __slots__ = RECORD_FIELDS + ('extra',) + tuple(DP_FIELDS)
+
+    def __init__(self, device: dict = None, schemas=None):
+        """
+        Cria o registro a partir de um dicionário do devices.json
+
+        Args:
+            device: Dicionário do dispositivo
+            schemas: SchemaRegistry usado para compartilhar o mapping do produto
+        """
+        self.extra = None
+        for attr in DP_FIELDS:
+            setattr(self, attr, None)
+        if device:
+            for field, value in device.items():
+                self._store(field, value)
+            if schemas is not None and isinstance(self.get('mapping'), dict):
+                self.mapping = schemas.intern(self.get('product_id'), self.mapping)
+        self._resolve_dps()
+
+    @classmethod
+    def from_dicts(cls, devices: list, schemas=None) -> list:
+        """Converte dicionários em registros (registros já convertidos são mantidos)"""
+        return [d if isinstance(d, cls) else cls(d, schemas) for d in devices]
+
+    def __getitem__(self, field):
+        if field in RECORD_FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is _MISSING:
+                raise KeyError(field)
+            return value
+        if self.extra is None:
+            raise KeyError(field)
+        return self.extra[field]
+
+    def __setitem__(self, field, value) -> None:
+        self._store(field, value)
+        if field == 'mapping':
+            self._resolve_dps()
+
+    def __delitem__(self, field) -> None:
+        if field in RECORD_FIELDS:
+            if getattr(self, field, _MISSING) is _MISSING:
+                raise KeyError(field)
+            delattr(self, field)
+            if field == 'mapping':
+                self._resolve_dps()
+            return
+        if self.extra is None:
+            raise KeyError(field)
+        del self.extra[field]
+        if not self.extra:
+            self.extra = None
+
+    def __iter__(self):
+        for field in RECORD_FIELDS:
+            if getattr(self, field, _MISSING) is not _MISSING:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        count = sum(1 for f in RECORD_FIELDS if getattr(self, f, _MISSING) is not _MISSING)
+        return count + (len(self.extra) if self.extra else 0)
+
+    def __contains__(self, field) -> bool:
+        if field in RECORD_FIELDS:
+            return getattr(self, field, _MISSING) is not _MISSING
+        return bool(self.extra) and field in self.extra
+
+    def __repr__(self) -> str:
+        return f"DeviceRecord({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        """Dicionário no formato do devices.json (usado na serialização)"""
+        return dict(self.items())
+
+    def _store(self, field, value) -> None:
+        if field in RECORD_FIELDS:
+            if field in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, field, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field] = value
+
+    def _resolve_dps(self) -> None:
+        """Copia os DPs de controle do esquema compilado (compartilhado entre registros)"""
+        schema = compile_schema(getattr(self, 'mapping', None))
+        for attr, code in DP_FIELDS.items():
+            setattr(self, attr, schema.dp(code))
+
+"""
+END DeviceRecord
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN json_default
+ - @param obj : Objeto que o módulo json não sabe serializar
+ - @retparms data : Dicionário equivalente (DeviceRecord e afins com to_dict)
+"""
+def json_default(obj):
+    """Hook 'default' do json.dump para registros de dispositivo"""
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f"Objeto do tipo {type(obj).__name__} não é serializável em JSON")
+
+"""
+END json_default
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,336 @@
+"""
+Módulo de descoberta incremental
+
+Este módulo usa o snapshot.json como ponto de partida da descoberta:
+dispositivos já conhecidos são apenas verificados (conexão TCP), e somente
+IPs novos ou dispositivos cujo id/ip/versão mudou passam pela sondagem
+completa do protocolo Tuya. O snapshot é atualizado entrada a entrada,
+com carimbos de tempo por dispositivo.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tinytuya
+
+from .scanner import NetworkScanner, probe_tcp, local_subnets, subnets_from_devices
+from .utils import atomic_write_json
+from .binary_cache import BinaryCache
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN SnapshotStore
+ - @param snapshot_file : Caminho do snapshot no formato do tinytuya (padrão: 'snapshot.json')
+ - @var/obj snapshot_file : Caminho do arquivo de snapshot
+ - @var/obj entries : Dicionário id -> entrada do snapshot
+ - @var/obj dirty : Conjunto de IDs alterados desde a última gravação
+ - @method load : Carrega o snapshot do disco
+ - @method get : Retorna a entrada de um dispositivo
+ - @method find_by_ip : Retorna a entrada associada a um IP
+ - @method update : Atualiza campos de uma entrada, marcando-a como alterada
+ - @method touch : Registra que o dispositivo foi visto agora
+ - @method save : Grava o snapshot se houver entradas alteradas
+ - @retparms : Instância da classe SnapshotStore
+"""
+class SnapshotStore:
+    """Snapshot da rede indexado por ID com carimbos de tempo por dispositivo"""
+
+    def __init__(self, snapshot_file: str = 'snapshot.json'):
+        """
+        Inicializa o snapshot
+
+        Args:
+            snapshot_file: Caminho do arquivo snapshot.json
+        """
+        self.snapshot_file = snapshot_file
+        self.entries = {}
+        self.dirty = set()
+        self._by_ip = {}
+        self.load()
+
+    def load(self) -> bool:
+        """Carrega o snapshot do disco (arquivo ausente = snapshot vazio)"""
+        self.entries = {}
+        self._by_ip = {}
+        self.dirty = set()
+        try:
+            if not os.path.exists(self.snapshot_file):
+                return False
+            data = BinaryCache(self.snapshot_file).load_json()
+        except Exception as e:
+            print(f"Erro ao carregar snapshot: {e}")
+            return False
+
+        for entry in data.get('devices', []):
+            if entry.get('id'):
+                self.entries[entry['id']] = entry
+                if entry.get('ip'):
+                    self._by_ip[entry['ip']] = entry['id']
+        return True
+
+    def get(self, device_id: str) -> dict:
+        """Retorna a entrada do dispositivo ou None"""
+        return self.entries.get(device_id)
+
+    def find_by_ip(self, ip: str) -> dict:
+        """Retorna a entrada cujo último IP conhecido é ip, ou None"""
+        device_id = self._by_ip.get(ip)
+        return self.entries.get(device_id) if device_id else None
+
+    def update(self, device_id: str, **fields) -> bool:
+        """
+        Atualiza campos de uma entrada (criando-a se necessário)
+
+        Returns:
+            True se algum campo mudou
+        """
+        entry = self.entries.get(device_id)
+        if entry is None:
+            entry = {'id': device_id, 'first_seen': time.time()}
+            self.entries[device_id] = entry
+            self.dirty.add(device_id)
+
+        changed = {k: v for k, v in fields.items() if entry.get(k) != v}
+        if not changed:
+            return False
+
+        if 'ip' in changed:
+            if self._by_ip.get(entry.get('ip')) == device_id:
+                del self._by_ip[entry['ip']]
+            if changed['ip']:
+                self._by_ip[changed['ip']] = device_id
+
+        entry.update(changed)
+        self.dirty.add(device_id)
+        return True
+
+    def touch(self, device_id: str, online: bool = True) -> None:
+        """Registra o resultado de uma verificação do dispositivo"""
+        now = time.time()
+        if online:
+            self.update(device_id, online=True, last_seen=now)
+        else:
+            self.update(device_id, online=False)
+
+    def save(self) -> bool:
+        """Grava o snapshot somente se houver entradas alteradas"""
+        if not self.dirty:
+            return True
+        try:
+            data = {
+                'timestamp': time.time(),
+                'devices': list(self.entries.values()),
+            }
+            atomic_write_json(self.snapshot_file, data)
+            BinaryCache(self.snapshot_file).save(data)
+            self.dirty.clear()
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar snapshot: {e}")
+            return False
+
+"""
+END SnapshotStore
+"""
+
+"""
+BEGIN IncrementalDiscovery
+ - @param devices : Lista de dispositivos cadastrados (id, key, ip, version)
+ - @param snapshot : Instância de SnapshotStore usada como ponto de partida
+ - @param subnets : Sub-redes a varrer (padrão: sub-redes conhecidas + rede local)
+ - @param probe_timeout : Timeout da sondagem completa em segundos (padrão: 3)
+ - @param max_probes : Número máximo de sondagens completas em paralelo (padrão: 8)
+ - @var/obj report : Resultado da última execução (verified/new/changed/offline/probed)
+ - @method run : Executa a descoberta incremental
+ - @method _plan : Decide quais dispositivos precisam de sondagem completa
+ - @method _probe_device : Sondagem completa de um dispositivo (status via tinytuya)
+ - @retparms : Instância da classe IncrementalDiscovery
+"""
+class IncrementalDiscovery:
+    """Descoberta que só sonda dispositivos novos ou alterados"""
+
+    def __init__(self, devices: list, snapshot: SnapshotStore, subnets: list = None,
+                 probe_timeout: float = 3, max_probes: int = 8, **scanner_kwargs):
+        """
+        Inicializa a descoberta
+
+        Args:
+            devices: Dispositivos cadastrados (precisam de id e key para a sondagem)
+            snapshot: Snapshot usado como ponto de partida
+            subnets: Sub-redes a varrer
+            probe_timeout: Timeout da sondagem completa em segundos
+            max_probes: Sondagens completas simultâneas
+            scanner_kwargs: Parâmetros extras do NetworkScanner
+        """
+        self.devices = {d['id']: d for d in devices if d.get('id')}
+        self.snapshot = snapshot
+        self.subnets = subnets
+        self.probe_timeout = probe_timeout
+        self.max_probes = max(1, max_probes)
+        self.scanner_kwargs = scanner_kwargs
+        self.report = {}
+
+    def run(self) -> dict:
+        """
+        Executa verificação, varredura e sondagem e atualiza o snapshot
+
+        Returns:
+            Dicionário com listas de IDs: verified, new, changed, offline, probed
+        """
+        self.report = {'verified': [], 'new': [], 'changed': [], 'offline': [], 'probed': []}
+        asyncio.run(self._run_async())
+        self.snapshot.save()
+        return self.report
+
+    async def _run_async(self) -> None:
+        snapshot = self.snapshot
+
+        # 1. Verificação barata dos IPs já conhecidos (somente TCP)
+        known = {e['ip']: device_id for device_id, e in snapshot.entries.items() if e.get('ip')}
+        alive = await asyncio.gather(*(probe_tcp(ip) for ip in known))
+        verified_ips = set()
+        for (ip, device_id), online in zip(known.items(), alive):
+            snapshot.touch(device_id, online)
+            if online:
+                verified_ips.add(ip)
+                self.report['verified'].append(device_id)
+
+        # 2. Varredura das sub-redes apenas nos IPs ainda desconhecidos
+        subnets = self.subnets or self._default_subnets()
+        scanner = NetworkScanner(subnets, exclude=verified_ips, **self.scanner_kwargs)
+        sightings = [found async for found in scanner.stream()]
+
+        # 3. Sondagem completa somente do que é novo ou mudou
+        jobs = self._plan(sightings, verified_ips)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.max_probes) as pool:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(pool, self._probe_device, ip, candidates, version)
+                for ip, candidates, version in jobs
+            ))
+
+        for (ip, _, _), result in zip(jobs, results):
+            if not result:
+                continue
+            device_id, version, dps = result
+            is_new = snapshot.get(device_id) is None
+            now = time.time()
+            snapshot.update(device_id, ip=ip, ver=version, dps={'dps': dps},
+                            online=True, last_seen=now, last_probe=now)
+            device = self.devices.get(device_id, {})
+            for field in ('name', 'key', 'mac'):
+                if device.get(field):
+                    snapshot.update(device_id, **{field: device[field]})
+            self.report['probed'].append(device_id)
+            self.report['new' if is_new else 'changed'].append(device_id)
+
+        for device_id, entry in snapshot.entries.items():
+            if entry.get('online') is False and device_id not in self.report['probed']:
+                self.report['offline'].append(device_id)
+
+    def _plan(self, sightings: list, verified_ips: set) -> list:
+        """
+        Decide quais IPs merecem sondagem completa
+
+        Returns:
+            Lista de tuplas (ip, ids_candidatos, versão)
+        """
+        jobs = []
+        # Dispositivos cadastrados que não foram confirmados em nenhum IP conhecido
+        unresolved = [
+            device_id for device_id in self.devices
+            if device_id not in self.report['verified']
+        ]
+
+        for found in sightings:
+            ip, device_id, version = found['ip'], found['id'], found['version']
+            entry = self.snapshot.get(device_id) if device_id else self.snapshot.find_by_ip(ip)
+
+            if device_id:
+                if entry and entry.get('ip') == ip and (not version or entry.get('ver') == version):
+                    self.snapshot.touch(device_id)  # Broadcast confirma o snapshot
+                    continue
+                if device_id in self.devices:
+                    jobs.append((ip, [device_id], version))
+            elif ip not in verified_ips:
+                # IP novo sem identificação: tenta apenas os cadastrados não resolvidos
+                candidates = [i for i in unresolved if i in self.devices]
+                if candidates:
+                    jobs.append((ip, candidates, version))
+        return jobs
+
+    def _probe_device(self, ip: str, candidates: list, version: str):
+        """
+        Sondagem completa: conecta com a chave local e lê os DPs
+
+        Returns:
+            Tupla (id, versão, dps) do primeiro candidato que respondeu, ou None
+        """
+        for device_id in candidates:
+            device = self.devices[device_id]
+            if not device.get('key'):
+                continue
+            # Versão por candidato: a do broadcast, senão a cadastrada, senão todas
+            if version:
+                versions = [float(version)]
+            elif device.get('version'):
+                versions = [float(device['version'])]
+            else:
+                versions = [3.5, 3.4, 3.3]
+            for ver in versions:
+                try:
+                    conn = tinytuya.Device(
+                        dev_id=device_id,
+                        address=ip,
+                        local_key=device['key'],
+                        version=ver,
+                        connection_timeout=self.probe_timeout
+                    )
+                    conn.set_socketRetryLimit(1)
+                    status = conn.status()
+                    conn.close()
+                except Exception:
+                    continue
+                if status and 'dps' in status:
+                    return device_id, str(ver), status['dps']
+        return None
+
+    def _default_subnets(self) -> list:
+        """Sub-redes dos IPs cadastrados/snapshot mais a rede local"""
+        subnets = subnets_from_devices(list(self.devices.values()) + list(self.snapshot.entries.values()))
+        for subnet in local_subnets():
+            if subnet not in subnets:
+                subnets.append(subnet)
+        return subnets
+
+"""
+END IncrementalDiscovery
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+# Não há funções fora das classes neste módulo
+
+"""
+===================
+END Declaração de funções
+===================
+"""
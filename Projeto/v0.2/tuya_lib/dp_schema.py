@@ -0,0 +1,285 @@
+"""
+Módulo de esquema compilado de DPs
+
+Este módulo transforma o 'mapping' de um produto (dp -> code, type, values)
+em um DpSchema com tabelas code -> dp e dp -> code, faixas (min/max/step),
+conjuntos de valores de Enum e fatores de escala já calculados. O esquema é
+compilado uma vez por mapping e compartilhado por todos os dispositivos do
+produto; codificar comandos, validar entradas e decodificar status viram
+consultas a dicionário. DPs Raw com layout registrado em raw_codecs são
+decodificados para objetos tipados (e codificados de volta para base64).
+"""
+
+import json
+
+from .raw_codecs import codec_for
+
+
+# Esquemas compilados: id(mapping) -> (mapping, DpSchema); os mappings são compartilhados
+_compiled = {}
+
+# Mapping usado por dispositivos sem 'mapping' (cadastro manual)
+_EMPTY_MAPPING = {}
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN DpSpec
+ - @param dp : Número do DP (texto, como no mapping)
+ - @param info : Entrada do mapping ({'code', 'type', 'values'})
+ - @var/obj dp, code, type : Identificação do DP
+ - @var/obj min, max, step, scale, unit : Faixa de valores (Integer)
+ - @var/obj factor : 10 ** scale (valor bruto = valor real * factor)
+ - @var/obj range : Valores aceitos (Enum), em ordem
+ - @var/obj maxlen : Tamanho máximo (String/Raw)
+ - @var/obj codec : RawCodec do DP (Raw com layout registrado) ou None
+ - @method encode : Valida e converte um valor real no valor bruto do DP
+ - @method decode : Converte o valor bruto do DP no valor real
+ - @method from_percent : Valor bruto correspondente a uma porcentagem da faixa
+ - @method to_percent : Porcentagem da faixa correspondente a um valor bruto
+ - @retparms : Instância da classe DpSpec
+"""
+class DpSpec:
+    """Descrição compilada de um DP"""
+
+    __slots__ = ('dp', 'code', 'type', 'min', 'max', 'step', 'scale', 'unit',
+                 'factor', 'range', '_range_set', 'maxlen', 'codec')
+
+    def __init__(self, dp: str, info: dict):
+        values = info.get('values') or {}
+        if isinstance(values, str):
+            # String/Json vêm como texto JSON (ex: '{"maxlen":255}')
+            try:
+                values = json.loads(values)
+            except ValueError:
+                values = {}
+        if not isinstance(values, dict):
+            values = {}
+
+        self.dp = str(dp)
+        self.code = info.get('code')
+        self.type = info.get('type')
+        self.min = values.get('min')
+        self.max = values.get('max')
+        self.step = values.get('step') or 1
+        self.scale = values.get('scale') or 0
+        self.unit = values.get('unit')
+        self.factor = 10 ** self.scale
+        self.range = tuple(values.get('range') or ())
+        self._range_set = frozenset(self.range)
+        self.maxlen = values.get('maxlen')
+        self.codec = codec_for(self.code) if self.type == 'Raw' else None
+
+    def __repr__(self) -> str:
+        return f"DpSpec(dp={self.dp!r}, code={self.code!r}, type={self.type!r})"
+
+    def encode(self, value):
+        """
+        Valida e converte um valor real no valor bruto do DP
+
+        Raises:
+            ValueError: Se o valor estiver fora da faixa/conjunto do DP
+        """
+        if self.type == 'Boolean':
+            if not isinstance(value, bool):
+                raise ValueError(f"{self.code}: esperado True/False, recebido {value!r}")
+            return value
+        if self.type == 'Integer':
+            raw = round(value * self.factor) if self.scale else int(value)
+            if (self.min is not None and raw < self.min) or (self.max is not None and raw > self.max):
+                raise ValueError(f"{self.code}: {value} fora da faixa "
+                                 f"{self.decode(self.min)}..{self.decode(self.max)}")
+            if self.step > 1 and (raw - (self.min or 0)) % self.step:
+                raise ValueError(f"{self.code}: {value} não respeita o passo {self.step}")
+            return raw
+        if self.type == 'Enum':
+            if value not in self._range_set:
+                raise ValueError(f"{self.code}: {value!r} inválido (válidos: {', '.join(self.range)})")
+            return value
+        if self.codec is not None and not isinstance(value, str):
+            # Objeto tipado ou dicionário -> base64
+            value = self.codec.encode(value)
+        if self.maxlen and isinstance(value, str) and len(value) > self.maxlen:
+            raise ValueError(f"{self.code}: tamanho {len(value)} maior que {self.maxlen}")
+        return value
+
+    def decode(self, raw):
+        """Converte o valor bruto no valor real (escala dos Integer, objeto tipado dos Raw)"""
+        if self.type == 'Integer' and self.scale and isinstance(raw, (int, float)):
+            return raw / self.factor
+        if self.codec is not None and isinstance(raw, str):
+            try:
+                return self.codec.decode(raw)
+            except ValueError:
+                return raw  # Layout diferente do esperado: mantém o base64
+        return raw
+
+    def from_percent(self, percent: float) -> int:
+        """Valor bruto para uma porcentagem (0-100) da faixa min..max, com limite"""
+        percent = max(0, min(100, percent))
+        raw = self.min + (self.max - self.min) * percent / 100
+        return int(round((raw - self.min) / self.step) * self.step + self.min)
+
+    def to_percent(self, raw) -> int:
+        """Porcentagem (0-100) da faixa min..max correspondente ao valor bruto"""
+        if not isinstance(raw, (int, float)) or self.max == self.min:
+            return 0
+        percent = int(round((raw - self.min) * 100 / (self.max - self.min)))
+        return max(0, min(100, percent))
+
+"""
+END DpSpec
+"""
+
+"""
+BEGIN DpSchema
+ - @param mapping : Mapping do produto (dp -> {'code', 'type', 'values'})
+ - @var/obj by_code : Dicionário code -> DpSpec
+ - @var/obj by_dp : Dicionário dp -> DpSpec
+ - @method dp : Número do DP de um código
+ - @method code : Código de um número de DP
+ - @method spec : DpSpec por código ou número de DP
+ - @method encode : Valida e converte (code, valor) em (dp, valor bruto)
+ - @method encode_many : Converte vários códigos em um dicionário dp -> valor bruto
+ - @method decode : Converte o dicionário 'dps' do status em code -> valor real
+ - @method from_percent : Valor bruto de uma porcentagem da faixa de um código
+ - @method to_percent : Porcentagem da faixa correspondente a um valor bruto
+ - @retparms : Instância da classe DpSchema
+"""
+class DpSchema:
+    """Esquema de DPs de um produto, compilado uma vez e compartilhado"""
+
+    def __init__(self, mapping: dict):
+        """
+        Compila o mapping
+
+        Args:
+            mapping: Mapping do produto (formato do devices.json)
+        """
+        self.by_dp = {}
+        self.by_code = {}
+        for dp, info in (mapping or {}).items():
+            if isinstance(info, dict) and info.get('code'):
+                spec = DpSpec(dp, info)
+                self.by_dp[spec.dp] = spec
+                self.by_code[spec.code] = spec
+
+    def __contains__(self, code) -> bool:
+        return code in self.by_code
+
+    def __len__(self) -> int:
+        return len(self.by_dp)
+
+    def dp(self, code: str) -> str:
+        """Número do DP (texto) do código ou None"""
+        spec = self.by_code.get(code)
+        return spec.dp if spec else None
+
+    def code(self, dp) -> str:
+        """Código do DP ou None"""
+        spec = self.by_dp.get(str(dp))
+        return spec.code if spec else None
+
+    def spec(self, key) -> DpSpec:
+        """DpSpec por código ou número de DP, ou None"""
+        return self.by_code.get(key) or self.by_dp.get(str(key))
+
+    def encode(self, code: str, value) -> tuple:
+        """
+        Valida e converte um valor para envio
+
+        Returns:
+            Tupla (dp, valor bruto)
+
+        Raises:
+            KeyError: Se o produto não tiver o código
+            ValueError: Se o valor for inválido para o DP
+        """
+        spec = self.by_code.get(code)
+        if spec is None:
+            raise KeyError(f"DP não disponível neste produto: {code}")
+        return spec.dp, spec.encode(value)
+
+    def encode_many(self, values: dict) -> dict:
+        """Converte {code: valor} em {dp: valor bruto} (para set_multiple_values)"""
+        encoded = {}
+        for code, value in values.items():
+            dp, raw = self.encode(code, value)
+            encoded[dp] = raw
+        return encoded
+
+    def decode(self, dps: dict) -> dict:
+        """Converte {dp: valor bruto} do status em {code: valor real}; DPs desconhecidos mantêm o número"""
+        decoded = {}
+        for dp, raw in dps.items():
+            spec = self.by_dp.get(str(dp))
+            if spec is None:
+                decoded[str(dp)] = raw
+            else:
+                decoded[spec.code] = spec.decode(raw)
+        return decoded
+
+    def from_percent(self, code: str, percent: float) -> int:
+        """Valor bruto de uma porcentagem da faixa do código"""
+        spec = self.by_code.get(code)
+        if spec is None or spec.min is None or spec.max is None:
+            raise KeyError(f"DP sem faixa neste produto: {code}")
+        return spec.from_percent(percent)
+
+    def to_percent(self, code: str, raw) -> int:
+        """Porcentagem da faixa do código para um valor bruto (0 se não houver faixa)"""
+        spec = self.by_code.get(code)
+        if spec is None or spec.min is None or spec.max is None:
+            return raw if isinstance(raw, int) else 0
+        return spec.to_percent(raw)
+
+"""
+END DpSchema
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN compile_schema
+ - @param mapping : Mapping do produto (normalmente a cópia compartilhada do SchemaRegistry)
+ - @retparms schema : DpSchema compilado (o mesmo objeto para o mesmo mapping)
+"""
+def compile_schema(mapping: dict) -> DpSchema:
+    """Compila o mapping uma única vez; chamadas seguintes devolvem o mesmo DpSchema"""
+    if not isinstance(mapping, dict):
+        mapping = _EMPTY_MAPPING
+    cached = _compiled.get(id(mapping))
+    if cached is not None and cached[0] is mapping:
+        return cached[1]
+
+    schema = DpSchema(mapping)
+    if len(_compiled) > 1024:
+        _compiled.clear()
+    _compiled[id(mapping)] = (mapping, schema)
+    return schema
+
+"""
+END compile_schema
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
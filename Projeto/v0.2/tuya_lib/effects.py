@@ -0,0 +1,440 @@
+"""
+Módulo de efeitos de luz
+
+Este módulo contém o motor de efeitos (arco-íris, respiração, estroboscópio,
+vela) para várias lâmpadas ao mesmo tempo. A cada tique (taxa fixa) o
+efeito calcula o quadro de todas as lâmpadas de uma vez com NumPy (HSV em
+lote -> colour_data); cada lâmpada tem uma caixa de correio que guarda só o
+quadro mais recente, então uma lâmpada lenta pula quadros em vez de
+acumular atraso, e só os DPs que mudaram desde o último envio são
+transmitidos.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from .color import HUE_MAX, SV_MAX, encode_hsv_batch
+
+
+# Valor mínimo aceito pelas lâmpadas no modo colour (0 é rejeitado)
+V_MIN = 10
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN Effect
+ - @var/obj name : Nome do efeito
+ - @method render : Quadro HSV (n, 3) das n lâmpadas no instante t
+ - @retparms : Instância da classe Effect
+"""
+class Effect:
+    """Base dos efeitos: render(t, n) devolve um array HSV (n, 3)"""
+
+    name = 'effect'
+
+    def render(self, t: float, n: int):
+        """
+        Calcula o quadro no instante t
+
+        Args:
+            t: Segundos desde o início do efeito
+            n: Número de lâmpadas
+
+        Returns:
+            Array int (n, 3) com h 0-360, s 0-1000, v 0-1000
+        """
+        raise NotImplementedError
+
+"""
+END Effect
+"""
+
+"""
+BEGIN Rainbow
+ - @param period : Segundos para uma volta completa do matiz (padrão: 10)
+ - @param spread : Fração do círculo distribuída entre as lâmpadas (padrão: 1.0)
+ - @param value : Brilho 10-1000 (padrão: 1000)
+ - @retparms : Instância da classe Rainbow
+"""
+class Rainbow(Effect):
+    """Matiz girando, com as lâmpadas defasadas ao longo do círculo"""
+
+    name = 'rainbow'
+
+    def __init__(self, period: float = 10, spread: float = 1.0, value: int = SV_MAX):
+        self.period = period
+        self.spread = spread
+        self.value = value
+
+    def render(self, t: float, n: int):
+        offsets = np.arange(n) * (self.spread * HUE_MAX / max(n, 1))
+        hsv = np.empty((n, 3), dtype=np.int64)
+        hsv[:, 0] = np.rint(t / self.period * HUE_MAX + offsets) % HUE_MAX
+        hsv[:, 1] = SV_MAX
+        hsv[:, 2] = self.value
+        return hsv
+
+"""
+END Rainbow
+"""
+
+"""
+BEGIN Breathe
+ - @param hue : Matiz 0-360 (padrão: 200)
+ - @param saturation : Saturação 0-1000 (padrão: 1000)
+ - @param period : Segundos de um ciclo completo (padrão: 4)
+ - @param low : Brilho mínimo (padrão: 10)
+ - @param high : Brilho máximo (padrão: 1000)
+ - @param phase : Defasagem entre lâmpadas, em fração do ciclo (padrão: 0)
+ - @retparms : Instância da classe Breathe
+"""
+class Breathe(Effect):
+    """Brilho subindo e descendo em senoide"""
+
+    name = 'breathe'
+
+    def __init__(self, hue: int = 200, saturation: int = SV_MAX, period: float = 4,
+                 low: int = V_MIN, high: int = SV_MAX, phase: float = 0.0):
+        self.hue = hue
+        self.saturation = saturation
+        self.period = period
+        self.low = low
+        self.high = high
+        self.phase = phase
+
+    def render(self, t: float, n: int):
+        angle = 2 * np.pi * (t / self.period + np.arange(n) * self.phase)
+        level = (1 - np.cos(angle)) / 2
+        hsv = np.empty((n, 3), dtype=np.int64)
+        hsv[:, 0] = self.hue
+        hsv[:, 1] = self.saturation
+        hsv[:, 2] = np.rint(self.low + (self.high - self.low) * level)
+        return hsv
+
+"""
+END Breathe
+"""
+
+"""
+BEGIN Strobe
+ - @param hue : Matiz 0-360 (padrão: 0)
+ - @param saturation : Saturação 0-1000 (padrão: 0 = branco)
+ - @param hz : Piscadas por segundo (padrão: 4)
+ - @param duty : Fração do ciclo acesa (padrão: 0.5)
+ - @param alternate : Se True, lâmpadas pares e ímpares alternam (padrão: False)
+ - @retparms : Instância da classe Strobe
+"""
+class Strobe(Effect):
+    """Pisca entre o brilho máximo e o mínimo"""
+
+    name = 'strobe'
+
+    def __init__(self, hue: int = 0, saturation: int = 0, hz: float = 4,
+                 duty: float = 0.5, alternate: bool = False):
+        self.hue = hue
+        self.saturation = saturation
+        self.hz = hz
+        self.duty = duty
+        self.alternate = alternate
+
+    def render(self, t: float, n: int):
+        cycle = t * self.hz + (np.arange(n) % 2) * 0.5 * self.alternate
+        on = (cycle % 1.0) < self.duty
+        hsv = np.empty((n, 3), dtype=np.int64)
+        hsv[:, 0] = self.hue
+        hsv[:, 1] = self.saturation
+        hsv[:, 2] = np.where(on, SV_MAX, V_MIN)
+        return hsv
+
+"""
+END Strobe
+"""
+
+"""
+BEGIN Candle
+ - @param hue : Matiz base 0-360 (padrão: 28, âmbar)
+ - @param flicker : Intensidade da oscilação 0-1 (padrão: 0.35)
+ - @param smoothing : Suavização por tique 0-1 (padrão: 0.6; maior = mais lento)
+ - @param seed : Semente do gerador aleatório (padrão: None)
+ - @retparms : Instância da classe Candle
+"""
+class Candle(Effect):
+    """Chama de vela: ruído suavizado independente por lâmpada"""
+
+    name = 'candle'
+
+    def __init__(self, hue: int = 28, flicker: float = 0.35, smoothing: float = 0.6,
+                 seed: int = None):
+        self.hue = hue
+        self.flicker = flicker
+        self.smoothing = smoothing
+        self._rng = np.random.default_rng(seed)
+        self._level = None
+
+    def render(self, t: float, n: int):
+        if self._level is None or len(self._level) != n:
+            self._level = np.ones(n)
+        target = 1 - self.flicker * self._rng.random(n)
+        self._level = self.smoothing * self._level + (1 - self.smoothing) * target
+        hsv = np.empty((n, 3), dtype=np.int64)
+        hsv[:, 0] = np.rint(self.hue + 6 * (self._level - 1))
+        hsv[:, 1] = SV_MAX - np.rint(150 * (1 - self._level))
+        hsv[:, 2] = np.clip(np.rint(SV_MAX * self._level), V_MIN, SV_MAX)
+        return hsv
+
+"""
+END Candle
+"""
+
+"""
+BEGIN LampChannel
+ - @param lamp : SmartLamp conectada
+ - @var/obj lamp : Lâmpada de destino
+ - @var/obj sent : Último valor enviado por DP
+ - @var/obj frames : Quadros entregues à caixa de correio
+ - @var/obj sends : Comandos efetivamente enviados
+ - @var/obj dropped : Quadros substituídos antes do envio (lâmpada atrasada)
+ - @var/obj skipped : Quadros sem mudança (nada a enviar)
+ - @method post : Deixa o quadro mais recente na caixa de correio
+ - @method start : Inicia a thread de envio
+ - @method stop : Encerra a thread de envio
+ - @retparms : Instância da classe LampChannel
+"""
+class LampChannel:
+    """Caixa de correio de uma lâmpada: só o quadro mais recente é enviado"""
+
+    def __init__(self, lamp):
+        self.lamp = lamp
+        self.sent = {}
+        self.frames = 0
+        self.sends = 0
+        self.dropped = 0
+        self.skipped = 0
+        self._pending = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def post(self, dps: dict) -> None:
+        """Substitui o quadro pendente (o anterior, se não enviado, é descartado)"""
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = dps
+            self.frames += 1
+            self._cond.notify()
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"effect:{self.lamp.config.get('name', '')}")
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(2)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                dps, self._pending = self._pending, None
+
+            # Só os DPs que mudaram desde o último envio
+            changed = {dp: value for dp, value in dps.items() if self.sent.get(dp) != value}
+            if not changed:
+                self.skipped += 1
+                continue
+            if self.lamp.set_dps(changed):
+                self.sent.update(changed)
+                self.sends += 1
+
+"""
+END LampChannel
+"""
+
+"""
+BEGIN EffectEngine
+ - @param lamps : Lista de SmartLamp conectadas
+ - @param effect : Instância de Effect
+ - @param fps : Quadros por segundo (padrão: 10)
+ - @var/obj lamps : Lâmpadas animadas
+ - @var/obj effect : Efeito atual (pode ser trocado em execução)
+ - @var/obj fps : Taxa de quadros
+ - @var/obj channels : Um LampChannel por lâmpada
+ - @var/obj ticks : Quadros calculados
+ - @var/obj late_ticks : Tiques pulados porque o cálculo atrasou
+ - @method start : Inicia o relógio e as threads de envio
+ - @method stop : Para o efeito e restaura as conexões
+ - @method run : Executa o efeito por um tempo (bloqueante)
+ - @method tick : Calcula e distribui um quadro (usado pelo relógio)
+ - @method stats : Resumo de quadros, envios e descartes
+ - @retparms : Instância da classe EffectEngine
+"""
+class EffectEngine:
+    """Renderiza um efeito para várias lâmpadas a uma taxa fixa"""
+
+    def __init__(self, lamps: list, effect: Effect, fps: float = 10):
+        """
+        Inicializa o motor (nada é enviado até start)
+
+        Args:
+            lamps: SmartLamps conectadas (DPs de modo e cor no mapping)
+            effect: Efeito a executar
+            fps: Quadros por segundo
+        """
+        self.lamps = [lamp for lamp in lamps if lamp.dp_colour and lamp.dp_work_mode]
+        self.effect = effect
+        self.fps = fps
+        self.channels = [LampChannel(lamp) for lamp in self.lamps]
+        self.ticks = 0
+        self.late_ticks = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._persist = []
+
+    def start(self) -> None:
+        """Mantém os sockets abertos e inicia o relógio do efeito"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._persist = []
+        for lamp in self.lamps:
+            # Um socket por lâmpada durante o efeito (sem renegociar a cada quadro)
+            self._persist.append(getattr(lamp.device, 'socketPersistent', False))
+            lamp.device.set_socketPersistent(True)
+        for channel in self.channels:
+            channel.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._clock, daemon=True, name='effect-clock')
+        self._thread.start()
+
+    def stop(self) -> dict:
+        """
+        Para o efeito
+
+        Returns:
+            Estatísticas (ver stats)
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(2)
+            self._thread = None
+        for channel in self.channels:
+            channel.stop()
+        for lamp, persist in zip(self.lamps, self._persist):
+            lamp.device.set_socketPersistent(persist)
+        self._persist = []
+        return self.stats()
+
+    def run(self, duration: float) -> dict:
+        """
+        Executa o efeito por duration segundos (Ctrl+C interrompe)
+
+        Returns:
+            Estatísticas (ver stats)
+        """
+        self.start()
+        try:
+            self._stop.wait(duration)
+        except KeyboardInterrupt:
+            pass
+        return self.stop()
+
+    def tick(self, t: float) -> None:
+        """Calcula o quadro de todas as lâmpadas de uma vez e o entrega às caixas de correio"""
+        if not self.channels:
+            return
+        colours = encode_hsv_batch(np.maximum(self.effect.render(t, len(self.channels)),
+                                              [0, 0, V_MIN]))
+        for channel, colour in zip(self.channels, colours.tolist()):
+            lamp = channel.lamp
+            channel.post({lamp.dp_work_mode: 'colour', lamp.dp_colour: colour})
+        self.ticks += 1
+
+    def stats(self) -> dict:
+        """Quadros calculados, enviados, descartados e sem mudança"""
+        return {
+            'ticks': self.ticks,
+            'late_ticks': self.late_ticks,
+            'sends': sum(c.sends for c in self.channels),
+            'dropped': sum(c.dropped for c in self.channels),
+            'skipped': sum(c.skipped for c in self.channels),
+        }
+
+    def _clock(self) -> None:
+        interval = 1.0 / self.fps
+        start = time.monotonic()
+        frame = 0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            due = int((now - start) / interval)
+            if due > frame:
+                # Atrasou mais de um tique: pula direto para o quadro atual
+                self.late_ticks += due - frame
+                frame = due
+            try:
+                self.tick(frame * interval)
+            except Exception as e:
+                print(f"Erro no efeito {self.effect.name}: {e}")
+                return
+            frame += 1
+            self._stop.wait(max(0.0, start + frame * interval - time.monotonic()))
+
+"""
+END EffectEngine
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN make_effect
+ - @param name : 'rainbow', 'breathe', 'strobe' ou 'candle'
+ - @param options : Parâmetros repassados ao construtor do efeito
+ - @retparms effect : Instância do efeito
+"""
+def make_effect(name: str, **options) -> Effect:
+    """
+    Cria um efeito pelo nome
+
+    Raises:
+        ValueError: Nome desconhecido
+    """
+    effects = {cls.name: cls for cls in (Rainbow, Breathe, Strobe, Candle)}
+    if name not in effects:
+        raise ValueError(f"Efeito desconhecido: {name} (use {', '.join(effects)})")
+    return effects[name](**options)
+
+"""
+END make_effect
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,171 @@
+"""
+Módulo de travas entre processos
+
+Este módulo contém o FileLock, uma trava consultiva (fcntl.flock) sobre um
+arquivo '<cadastro>.lock' que também guarda um contador de versão: cada
+gravação do cadastro incrementa o contador sob trava exclusiva, então um
+processo percebe que outro gravou desde a sua última leitura e pode mesclar
+em vez de sobrescrever. Sem fcntl (Windows) a trava vale só entre threads.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem travas entre processos
+    fcntl = None
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN FileLock
+ - @param path : Caminho do arquivo de trava (ex: 'devices.json.lock')
+ - @param timeout : Tempo máximo de espera pela trava em segundos (padrão: 10)
+ - @var/obj path : Caminho do arquivo de trava
+ - @var/obj timeout : Tempo máximo de espera
+ - @method shared : Context manager com trava compartilhada (leitura)
+ - @method exclusive : Context manager com trava exclusiva (leitura-modificação-gravação)
+ - @method version : Contador de versão atual (ler com a trava adquirida)
+ - @method bump : Incrementa o contador de versão (com trava exclusiva)
+ - @retparms : Instância da classe FileLock
+"""
+class FileLock:
+    """Trava consultiva reentrante com contador de versão"""
+
+    def __init__(self, path: str, timeout: float = 10):
+        """
+        Inicializa a trava (o arquivo só é aberto na primeira aquisição)
+
+        Args:
+            path: Caminho do arquivo de trava
+            timeout: Espera máxima pela trava em segundos
+        """
+        self.path = path
+        self.timeout = timeout
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+        self._thread_lock = threading.RLock()
+
+    @contextmanager
+    def shared(self):
+        """Trava compartilhada: vários leitores ao mesmo tempo"""
+        self._acquire(exclusive=False)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    @contextmanager
+    def exclusive(self):
+        """Trava exclusiva: um único processo no ciclo leitura-modificação-gravação"""
+        self._acquire(exclusive=True)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    def version(self) -> int:
+        """Contador de versão gravado no arquivo de trava (0 se vazio)"""
+        if self._fd is None:
+            return 0
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        data = os.read(self._fd, 32).strip()
+        return int(data) if data.isdigit() else 0
+
+    def bump(self) -> int:
+        """
+        Incrementa o contador de versão
+
+        Returns:
+            Nova versão
+
+        Raises:
+            RuntimeError: Se a trava exclusiva não estiver adquirida
+        """
+        if self._fd is None or not self._exclusive:
+            raise RuntimeError("bump() exige a trava exclusiva")
+        version = self.version() + 1
+        os.ftruncate(self._fd, 0)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, str(version).encode())
+        return version
+
+    def _acquire(self, exclusive: bool) -> None:
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._lock(exclusive)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                # Promoção de compartilhada para exclusiva dentro do mesmo processo
+                self._lock(True)
+                self._exclusive = True
+        except BaseException:
+            if self._depth == 0 and self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+        self._depth += 1
+
+    def _lock(self, exclusive: bool) -> None:
+        """flock não bloqueante em laço, até o timeout"""
+        if fcntl is None:
+            return
+        mode = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        deadline = time.monotonic() + self.timeout
+        delay = 0.01
+        while True:
+            try:
+                fcntl.flock(self._fd, mode)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Trava ocupada por outro processo: {self.path}")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.2)
+
+    def _release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+            self._exclusive = False
+        self._thread_lock.release()
+
+"""
+END FileLock
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+# Não há funções fora das classes neste módulo
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,168 @@
+"""
+Módulo de mesclagem de dispositivos
+
+Este módulo contém o motor de mesclagem usado pelo wizard e pela
+importação: um hash join de passada única entre o cadastro e os dados
+recebidos, indexado pelo ID do dispositivo, que produz um relatório
+estruturado das mudanças.
+"""
+
+
+# Campos que não são apagados quando a origem os traz vazios
+PRESERVE_IF_EMPTY = ('ip', 'version')
+
+# Sentinela para diferenciar campo ausente de campo com valor None
+_MISSING = object()
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN MergeReport
+ - @var/obj added : IDs dos dispositivos adicionados
+ - @var/obj updated : Dicionário id -> lista de campos alterados
+ - @var/obj unchanged : IDs dos dispositivos sem alterações
+ - @var/obj removed : IDs removidos do cadastro (somente com remove_missing)
+ - @var/obj skipped : IDs ignorados (já existentes no modo 'insert' ou registros sem ID)
+ - @method changed : Indica se o cadastro foi alterado
+ - @method summary : Resumo de uma linha do relatório
+ - @method to_dict : Relatório como dicionário
+ - @retparms : Instância da classe MergeReport
+"""
+class MergeReport:
+    """Relatório estruturado de uma mesclagem"""
+
+    def __init__(self):
+        self.added = []
+        self.updated = {}
+        self.unchanged = []
+        self.removed = []
+        self.skipped = []
+
+    def changed(self) -> bool:
+        """True se algum dispositivo foi adicionado, alterado ou removido"""
+        return bool(self.added or self.updated or self.removed)
+
+    def summary(self) -> str:
+        """Resumo de uma linha do relatório"""
+        return (f"{len(self.added)} novo(s), {len(self.updated)} atualizado(s), "
+                f"{len(self.unchanged)} sem alteração, {len(self.removed)} removido(s)")
+
+    def to_dict(self) -> dict:
+        """Relatório como dicionário"""
+        return {
+            'added': self.added,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'removed': self.removed,
+            'skipped': self.skipped,
+        }
+
+"""
+END MergeReport
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN merge_devices
+ - @param registry : Lista de dispositivos cadastrados (alterada no lugar)
+ - @param incoming : Iterável de dispositivos recebidos (wizard, importação, ...)
+ - @param mode : 'update' (insere e atualiza) ou 'insert' (só insere novos)
+ - @param remove_missing : Se True, remove do cadastro o que não veio em incoming
+ - @param index : Índice id -> dispositivo do cadastro, se já existir (evita reconstruí-lo)
+ - @retparms report : Instância de MergeReport com as mudanças
+"""
+def merge_devices(registry: list, incoming, mode: str = 'update',
+                  remove_missing: bool = False, index: dict = None) -> MergeReport:
+    """
+    Mescla incoming em registry com um hash join de passada única por ID
+
+    Custo O(n + m): o índice do cadastro é montado uma vez (ou reaproveitado)
+    e cada dispositivo recebido é resolvido com uma consulta ao dicionário.
+    """
+    if mode not in ('update', 'insert'):
+        raise ValueError(f"Modo inválido: {mode}")
+
+    report = MergeReport()
+    by_id = index if index is not None else {d['id']: d for d in registry if 'id' in d}
+    seen = set()
+    added = set()
+
+    for new_device in incoming:
+        device_id = new_device.get('id') if isinstance(new_device, dict) else None
+        if not device_id:
+            report.skipped.append(device_id)
+            continue
+        seen.add(device_id)
+
+        existing = by_id.get(device_id)
+        if existing is None:
+            device = dict(new_device)
+            registry.append(device)
+            by_id[device_id] = device
+            report.added.append(device_id)
+            added.add(device_id)
+            continue
+
+        if mode == 'insert' and device_id not in added:
+            report.skipped.append(device_id)
+            continue
+
+        changed = []
+        for field, value in new_device.items():
+            if not value and field in PRESERVE_IF_EMPTY:
+                continue
+            if existing.get(field, _MISSING) != value:
+                existing[field] = value
+                changed.append(field)
+
+        if device_id in added:
+            # Repetição de um ID inserido nesta mesclagem: os campos entram
+            # no novo dispositivo, que continua contado só como adicionado
+            continue
+        if changed:
+            fields = report.updated.setdefault(device_id, [])
+            fields.extend(f for f in changed if f not in fields)
+        else:
+            report.unchanged.append(device_id)
+
+    # Um ID repetido em incoming conta uma vez só, com o resultado mais forte
+    if len(seen) != len(report.added) + len(report.updated) + len(report.unchanged):
+        touched = set(report.added) | set(report.updated)
+        report.unchanged = list(dict.fromkeys(i for i in report.unchanged if i not in touched))
+
+    if remove_missing:
+        report.removed = [i for i in by_id if i not in seen]
+        if report.removed:
+            removed = set(report.removed)
+            registry[:] = [d for d in registry if d.get('id') not in removed]
+            for device_id in report.removed:
+                del by_id[device_id]
+
+    return report
+
+"""
+END merge_devices
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
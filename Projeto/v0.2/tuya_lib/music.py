@@ -0,0 +1,315 @@
+"""
+Módulo de modo música (music_data, DP 27)
+
+Este módulo lê áudio PCM local (arquivo WAV ou PCM cru pela entrada padrão)
+em blocos, analisa cada bloco com FFT do NumPy (energia por banda e detecção
+de batida) e transforma o resultado em quadros do DP music_data:
+
+    m hhhh ssss vvvv bbbb tttt
+        m     troca: 0 = salto (batida), 1 = gradiente
+        hhhh ssss vvvv  cor HSV (H 0-360, S/V 0-1000)
+        bbbb tttt       brilho e temperatura (zero no modo colorido)
+
+Os quadros saem a uma taxa limitada (~20 Hz) pelas caixas de correio do
+motor de efeitos: cada lâmpada recebe só o quadro mais recente e uma
+lâmpada lenta pula quadros. Tocando um arquivo, blocos atrasados em relação
+ao relógio de reprodução são descartados sem análise. Tudo funciona sem
+rede externa.
+"""
+
+import sys
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+from .color import HUE_MAX, SV_MAX, encode_hsv
+from .effects import EffectEngine, V_MIN
+
+
+# Quadros por segundo enviados às lâmpadas
+FRAME_HZ = 20
+
+# Bandas analisadas (Hz) e o matiz de cada uma: graves vermelho, médios verde, agudos azul
+BANDS = ((20, 250), (250, 2000), (2000, 8000))
+BAND_HUES = (0, 120, 240)
+
+# Batida: energia dos graves acima de BEAT_RATIO vezes a média do último segundo
+BEAT_RATIO = 1.5
+
+# Escala das amostras inteiras (largura em bytes -> dtype, deslocamento, escala)
+_PCM_FORMATS = {1: ('u1', 128, 128.0), 2: ('<i2', 0, 32768.0), 4: ('<i4', 0, 2147483648.0)}
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN PcmSource
+ - @param stream : Arquivo binário com amostras PCM intercaladas (little-endian)
+ - @param rate : Taxa de amostragem em Hz
+ - @param channels : Número de canais (padrão: 1)
+ - @param sampwidth : Bytes por amostra: 1, 2 ou 4 (padrão: 2)
+ - @param live : True para fluxos ao vivo (stdin), que não são ritmados pelo relógio
+ - @var/obj rate, channels, sampwidth, live : Formato do fluxo
+ - @method open : Abre um arquivo WAV, ou a entrada padrão ('-') como PCM cru
+ - @method chunks : Gera blocos mono float (-1..1) de tamanho fixo
+ - @method close : Fecha o arquivo
+ - @retparms : Instância da classe PcmSource
+"""
+class PcmSource:
+    """Fluxo de áudio PCM lido em blocos"""
+
+    def __init__(self, stream, rate: int, channels: int = 1, sampwidth: int = 2,
+                 live: bool = False):
+        """
+        Raises:
+            ValueError: Largura de amostra não suportada
+        """
+        if sampwidth not in _PCM_FORMATS:
+            raise ValueError(f"Amostras de {sampwidth} bytes não suportadas (use 1, 2 ou 4)")
+        self.stream = stream
+        self.rate = rate
+        self.channels = channels
+        self.sampwidth = sampwidth
+        self.live = live
+        self._wave = None
+
+    @classmethod
+    def open(cls, path: str, rate: int = 44100, channels: int = 1, sampwidth: int = 2):
+        """
+        Abre a fonte de áudio
+
+        Args:
+            path: Arquivo .wav, ou '-' para PCM cru (s16le) na entrada padrão
+            rate, channels, sampwidth: Formato do PCM cru (ignorados no WAV)
+
+        Raises:
+            OSError: Arquivo inexistente
+            ValueError: WAV inválido ou compactado
+        """
+        if path == '-':
+            return cls(sys.stdin.buffer, rate, channels, sampwidth, live=True)
+        try:
+            reader = wave.open(path, 'rb')
+        except wave.Error as e:
+            raise ValueError(f"WAV inválido ({path}): {e}") from None
+        source = cls(reader, reader.getframerate(), reader.getnchannels(), reader.getsampwidth())
+        source._wave = reader
+        return source
+
+    def chunks(self, size: int):
+        """
+        Gera blocos de size amostras (mono, float64 -1..1); o último bloco incompleto é descartado
+
+        Args:
+            size: Amostras por bloco (por canal)
+        """
+        dtype, offset, scale = _PCM_FORMATS[self.sampwidth]
+        frame_bytes = self.sampwidth * self.channels
+        while True:
+            data = self._read(size, size * frame_bytes)
+            if len(data) < size * frame_bytes:
+                return
+            samples = np.frombuffer(data, dtype=dtype).astype(np.float64)
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+            yield (samples - offset) / scale
+
+    def close(self) -> None:
+        try:
+            (self._wave or self.stream).close()
+        except Exception:
+            pass
+
+    def _read(self, frames: int, nbytes: int) -> bytes:
+        if self._wave is not None:
+            return self._wave.readframes(frames)
+        # Pipes entregam leituras parciais: completa o bloco até o fim do fluxo
+        data = b''
+        while len(data) < nbytes:
+            part = self.stream.read(nbytes - len(data))
+            if not part:
+                break
+            data += part
+        return data
+
+"""
+END PcmSource
+"""
+
+"""
+BEGIN AudioAnalyzer
+ - @param rate : Taxa de amostragem em Hz
+ - @param size : Amostras por bloco
+ - @param history : Blocos na média da detecção de batida (padrão: FRAME_HZ, ~1 s)
+ - @var/obj weights : Matriz (bandas, bins) que soma a potência de cada banda
+ - @var/obj beats : Batidas detectadas
+ - @method analyze : Energia por banda, nível e batida de um bloco
+ - @method frame : Quadro HSV (h, s, v) e batida de um bloco
+ - @retparms : Instância da classe AudioAnalyzer
+"""
+class AudioAnalyzer:
+    """FFT por bloco com janela, bandas e ganho automático pré-calculados"""
+
+    def __init__(self, rate: int, size: int, history: int = FRAME_HZ):
+        self.window = np.hanning(size)
+        freqs = np.fft.rfftfreq(size, 1.0 / rate)
+        self.weights = np.array([(freqs >= low) & (freqs < high) for low, high in BANDS],
+                                dtype=np.float64)
+        # Vetores unitários dos matizes das bandas (média circular)
+        angles = np.radians(BAND_HUES)
+        self.hue_vectors = np.stack([np.cos(angles), np.sin(angles)])
+        self.beats = 0
+        self._bass = deque(maxlen=history)
+        self._peak = 1e-9
+
+    def analyze(self, samples) -> tuple:
+        """
+        Analisa um bloco
+
+        Returns:
+            Tupla (energia por banda normalizada 0-1, nível 0-1, batida True/False)
+        """
+        power = np.abs(np.fft.rfft(samples * self.window)) ** 2
+        energy = self.weights @ power
+
+        # Ganho automático: o pico decai devagar para acompanhar músicas mais baixas
+        total = float(energy.sum())
+        self._peak = max(total, self._peak * 0.995)
+        level = min(1.0, np.sqrt(total / self._peak)) if self._peak > 1e-9 else 0.0
+
+        bass = float(energy[0])
+        beat = (len(self._bass) == self._bass.maxlen
+                and bass > BEAT_RATIO * (sum(self._bass) / len(self._bass)) and level > 0.3)
+        self._bass.append(bass)
+        if beat:
+            self.beats += 1
+        return energy / total if total > 0 else energy, level, beat
+
+    def frame(self, samples) -> tuple:
+        """
+        Quadro de cor de um bloco
+
+        Returns:
+            Tupla (h, s, v, batida): matiz pela média circular das bandas,
+            V pelo nível (máximo na batida)
+        """
+        share, level, beat = self.analyze(samples)
+        x, y = self.hue_vectors @ share
+        h = int(np.degrees(np.arctan2(y, x))) % HUE_MAX
+        v = SV_MAX if beat else max(V_MIN, int(level * SV_MAX))
+        return h, SV_MAX, v, beat
+
+"""
+END AudioAnalyzer
+"""
+
+"""
+BEGIN MusicStream
+ - @param lamps : Lista de SmartLamp conectadas (com music_data no mapping)
+ - @param source : PcmSource
+ - @param fps : Quadros por segundo (padrão: FRAME_HZ)
+ - @param realtime : Ritmar pelo relógio de reprodução (padrão: True, exceto stdin)
+ - @var/obj source : Fonte de áudio
+ - @var/obj analyzer : AudioAnalyzer do fluxo
+ - @var/obj frame : Último quadro music_data enviado às caixas de correio
+ - @method feed : Analisa um bloco e entrega o quadro às lâmpadas
+ - @retparms : Instância da classe MusicStream (start/stop/run/stats de EffectEngine)
+"""
+class MusicStream(EffectEngine):
+    """Modo música: áudio local -> music_data nas lâmpadas, a uma taxa limitada"""
+
+    def __init__(self, lamps: list, source: PcmSource, fps: float = FRAME_HZ,
+                 realtime: bool = None):
+        super().__init__([lamp for lamp in lamps if lamp.schema.dp('music_data')], None, fps)
+        self.source = source
+        self.realtime = not source.live if realtime is None else realtime
+        self.size = max(64, int(source.rate / fps))
+        self.analyzer = AudioAnalyzer(source.rate, self.size)
+        self.frame = None
+
+    def feed(self, samples) -> None:
+        """Analisa um bloco de áudio e deixa o quadro nas caixas de correio"""
+        h, s, v, beat = self.analyzer.frame(samples)
+        self.frame = f"{0 if beat else 1}{encode_hsv(h, s, v)}00000000"
+        for channel in self.channels:
+            lamp = channel.lamp
+            channel.post({lamp.dp_work_mode: 'music', lamp.schema.dp('music_data'): self.frame})
+        self.ticks += 1
+
+    def stats(self) -> dict:
+        """Estatísticas do EffectEngine mais as batidas detectadas"""
+        return dict(super().stats(), beats=self.analyzer.beats)
+
+    def _clock(self) -> None:
+        interval = self.size / self.source.rate
+        start = time.monotonic()
+        try:
+            for index, samples in enumerate(self.source.chunks(self.size)):
+                if self._stop.is_set():
+                    return
+                if self.realtime:
+                    # Bloco que já devia ter tocado: descarta sem analisar
+                    if time.monotonic() - start > (index + 1) * interval:
+                        self.late_ticks += 1
+                        continue
+                self.feed(samples)
+                if self.realtime:
+                    self._stop.wait(max(0.0, start + (index + 1) * interval - time.monotonic()))
+        except Exception as e:
+            print(f"Erro no modo música: {e}")
+        finally:
+            # Fim do áudio: libera run()
+            self._stop.set()
+
+"""
+END MusicStream
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN play_music
+ - @param lamps : Lista de SmartLamp conectadas
+ - @param path : Arquivo .wav ou '-' (PCM s16le cru na entrada padrão)
+ - @param duration : Segundos máximos (padrão: None = até o fim do áudio)
+ - @param options : rate, channels, sampwidth do PCM cru
+ - @retparms stats : Estatísticas do fluxo (quadros, envios, descartes, batidas)
+"""
+def play_music(lamps: list, path: str, duration: float = None, **options) -> dict:
+    """
+    Toca um arquivo (ou stdin) nas lâmpadas em modo música (bloqueante, Ctrl+C para)
+
+    Raises:
+        OSError, ValueError: Fonte de áudio inválida
+    """
+    source = PcmSource.open(path, **options)
+    try:
+        return MusicStream(lamps, source).run(duration)
+    finally:
+        source.close()
+
+"""
+END play_music
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,163 @@
+"""
+Módulo de importação/exportação em NDJSON
+
+Este módulo lê e grava cadastros no formato NDJSON (um dispositivo JSON por
+linha), opcionalmente comprimido com gzip (extensão .gz). Leitura e escrita
+são feitas em fluxo, linha a linha, então a memória usada não depende do
+tamanho do arquivo; callbacks de progresso permitem acompanhar inventários
+de centenas de milhares de dispositivos.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+
+from .device_record import json_default
+
+
+# Extensões reconhecidas como NDJSON (com ou sem .gz)
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+
+# Intervalo padrão (em dispositivos) entre chamadas do callback de progresso
+PROGRESS_EVERY = 1000
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+# Não há classes neste módulo
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN is_ndjson
+ - @param path : Caminho do arquivo
+ - @retparms ndjson : True se a extensão for .ndjson/.jsonl (com ou sem .gz)
+"""
+def is_ndjson(path: str) -> bool:
+    """Indica se o arquivo deve ser tratado como NDJSON pela extensão"""
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return name.endswith(NDJSON_EXTENSIONS)
+
+"""
+END is_ndjson
+"""
+
+"""
+BEGIN iter_ndjson
+ - @param path : Caminho do arquivo NDJSON (.gz = comprimido)
+ - @param progress : Função progress(contagem, fração) chamada periodicamente (opcional)
+ - @param every : Dispositivos entre chamadas de progress (padrão: 1000)
+ - @retparms devices : Gerador de dicionários, um por linha
+"""
+def iter_ndjson(path: str, progress=None, every: int = PROGRESS_EVERY):
+    """
+    Lê um NDJSON em fluxo, um dispositivo por vez
+
+    A fração do progresso é a posição no arquivo em disco (comprimido ou
+    não) dividida pelo seu tamanho. Linhas vazias são ignoradas.
+
+    Raises:
+        ValueError: Linha que não é um objeto JSON (com o número da linha)
+    """
+    size = os.path.getsize(path) or 1
+    with open(path, 'rb') as raw:
+        stream = gzip.GzipFile(fileobj=raw, mode='rb') if path.lower().endswith('.gz') else raw
+        count = 0
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                device = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}, linha {number}: {e}") from None
+            if not isinstance(device, dict):
+                raise ValueError(f"{path}, linha {number}: esperado um objeto JSON")
+            yield device
+            count += 1
+            if progress and count % every == 0:
+                progress(count, min(raw.tell() / size, 1.0))
+        if progress:
+            progress(count, 1.0)
+
+"""
+END iter_ndjson
+"""
+
+"""
+BEGIN write_ndjson
+ - @param path : Caminho de destino (.gz = comprimido)
+ - @param devices : Iterável de dispositivos (lista, gerador, DeviceRecord, ...)
+ - @param progress : Função progress(contagem, fração) chamada periodicamente (opcional)
+ - @param every : Dispositivos entre chamadas de progress (padrão: 1000)
+ - @param compresslevel : Nível do gzip (padrão: 6)
+ - @retparms count : Número de dispositivos gravados
+"""
+def write_ndjson(path: str, devices, progress=None, every: int = PROGRESS_EVERY,
+                 compresslevel: int = 6) -> int:
+    """
+    Grava um NDJSON em fluxo, de forma atômica
+
+    Cada dispositivo é serializado e escrito isoladamente; o arquivo final só
+    substitui o destino (os.replace) depois de completo e sincronizado.
+    A fração do progresso é None quando o total não é conhecido (gerador).
+    """
+    total = len(devices) if hasattr(devices, '__len__') else None
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=directory)
+    count = 0
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            if path.lower().endswith('.gz'):
+                stream = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=compresslevel,
+                                       filename='', mtime=0)
+            else:
+                stream = raw
+            for device in devices:
+                line = json.dumps(device, ensure_ascii=False, separators=(',', ':'),
+                                  default=json_default)
+                stream.write(line.encode('utf-8') + b'\n')
+                count += 1
+                if progress and count % every == 0:
+                    progress(count, count / total if total else None)
+            if stream is not raw:
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if progress:
+        progress(count, 1.0)
+    return count
+
+"""
+END write_ndjson
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,373 @@
+"""
+Módulo de paleta de imagens
+
+Este módulo extrai as cores dominantes de uma imagem e colore um grupo de
+lâmpadas com elas. A imagem é reduzida na leitura (miniatura do Pillow ou
+passo fixo de pixels no PPM), uma amostra de pixels passa por um k-means
+vetorizado com NumPy (k-means++ na inicialização, distâncias de todos os
+pixels a todos os centros em uma operação de matriz) e as cores são
+distribuídas entre as lâmpadas na proporção do peso de cada cor.
+
+O Pillow é opcional: sem ele, só arquivos PPM/PGM (P2, P3, P5, P6) são
+lidos. As paletas ficam em cache pelo SHA-256 do arquivo (em memória e em
+um JSON ao lado do projeto), então a mesma imagem não é processada de novo.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .utils import atomic_write_json
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# Lado máximo da miniatura analisada (pixels)
+THUMB_SIZE = 256
+
+# Pixels amostrados para o k-means
+SAMPLE_SIZE = 20000
+
+# Arquivo do cache de paletas (SHA-256:k -> cores e pesos)
+CACHE_FILE = 'palette-cache.json'
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN PaletteExtractor
+ - @param colours : Número de cores da paleta (padrão: 5)
+ - @param cache_file : JSON do cache de paletas (padrão: CACHE_FILE; None = só memória)
+ - @param seed : Semente da amostragem e do k-means (padrão: 0, resultado reprodutível)
+ - @var/obj colours : Tamanho da paleta
+ - @var/obj hits, misses : Consultas atendidas pelo cache / calculadas
+ - @method extract : Paleta [(r, g, b), ...] e pesos de um arquivo de imagem
+ - @method apply : Colore as lâmpadas com a paleta de uma imagem, em paralelo
+ - @retparms : Instância da classe PaletteExtractor
+"""
+class PaletteExtractor:
+    """Cores dominantes de imagens, com cache por hash do arquivo"""
+
+    def __init__(self, colours: int = 5, cache_file: str = CACHE_FILE, seed: int = 0):
+        self.colours = colours
+        self.cache_file = cache_file
+        self.seed = seed
+        self.hits = 0
+        self.misses = 0
+        self._cache = None
+
+    def extract(self, path: str) -> tuple:
+        """
+        Paleta de uma imagem, da cor mais frequente para a menos frequente
+
+        Args:
+            path: Arquivo de imagem (qualquer formato do Pillow, ou PPM/PGM sem ele)
+
+        Returns:
+            Tupla (cores [(r, g, b), ...], pesos [fração dos pixels, ...])
+
+        Raises:
+            OSError: Arquivo inexistente
+            ValueError: Formato não suportado sem o Pillow ou imagem inválida
+        """
+        key = f"{file_digest(path)}:{self.colours}"
+        cache = self._load_cache()
+        if key in cache:
+            self.hits += 1
+            entry = cache[key]
+            return [tuple(c) for c in entry['colours']], entry['weights']
+
+        self.misses += 1
+        pixels = sample_pixels(load_pixels(path), SAMPLE_SIZE, self.seed)
+        centers, weights = kmeans(pixels, self.colours, seed=self.seed)
+        colours = [tuple(int(v) for v in c) for c in np.rint(centers).astype(int)]
+        weights = [round(float(w), 4) for w in weights]
+
+        cache[key] = {'colours': colours, 'weights': weights}
+        self._save_cache()
+        return colours, weights
+
+    def apply(self, lamps: list, path: str, workers: int = 8) -> list:
+        """
+        Colore as lâmpadas com a paleta da imagem (comandos em paralelo)
+
+        Args:
+            lamps: SmartLamps conectadas
+            path: Arquivo de imagem
+            workers: Comandos simultâneos
+
+        Returns:
+            Lista de (lâmpada, (r, g, b), sucesso)
+        """
+        colours, weights = self.extract(path)
+        assigned = assign_colours(colours, weights, len(lamps))
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='palette') as pool:
+            results = list(pool.map(lambda item: item[0].set_color_rgb(*item[1]),
+                                    zip(lamps, assigned)))
+        return list(zip(lamps, assigned, results))
+
+    def _load_cache(self) -> dict:
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_file and os.path.exists(self.cache_file):
+                try:
+                    with open(self.cache_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if isinstance(data, dict):
+                        self._cache = data
+                except (OSError, ValueError) as e:
+                    print(f"⚠️  Cache de paletas ignorado ({e})")
+        return self._cache
+
+    def _save_cache(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            atomic_write_json(self.cache_file, self._cache, indent=None)
+        except OSError as e:
+            print(f"⚠️  Não foi possível gravar o cache de paletas: {e}")
+
+"""
+END PaletteExtractor
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN load_pixels
+ - @param path : Arquivo de imagem
+ - @param size : Lado máximo da miniatura (padrão: THUMB_SIZE)
+ - @retparms pixels : Array uint8 (n, 3) com os pixels RGB da imagem reduzida
+"""
+def load_pixels(path: str, size: int = THUMB_SIZE):
+    """
+    Lê a imagem já reduzida (a imagem inteira nunca vira array)
+
+    Raises:
+        OSError: Arquivo inexistente
+        ValueError: Formato não suportado sem o Pillow ou imagem inválida
+    """
+    if Image is not None:
+        try:
+            with Image.open(path) as image:
+                # JPEG: decodifica direto em escala reduzida
+                image.draft('RGB', (size, size))
+                image = image.convert('RGB')
+                image.thumbnail((size, size))
+                return np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            # Formato que o Pillow não lê: tenta o PPM abaixo
+
+    pixels = _read_pnm(path)
+    step = max(1, -(-max(pixels.shape[:2]) // size))
+    return np.ascontiguousarray(pixels[::step, ::step]).reshape(-1, 3)
+
+"""
+END load_pixels
+"""
+
+"""
+BEGIN sample_pixels
+ - @param pixels : Array (n, 3)
+ - @param count : Máximo de pixels (padrão: SAMPLE_SIZE)
+ - @param seed : Semente da amostragem (padrão: 0)
+ - @retparms sample : Array float64 (m, 3), m <= count
+"""
+def sample_pixels(pixels, count: int = SAMPLE_SIZE, seed: int = 0):
+    """Amostra aleatória (sem reposição) dos pixels, em float64"""
+    pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 3)
+    if len(pixels) > count:
+        pixels = pixels[np.random.default_rng(seed).choice(len(pixels), count, replace=False)]
+    return pixels
+
+"""
+END sample_pixels
+"""
+
+"""
+BEGIN kmeans
+ - @param points : Array (n, d)
+ - @param k : Número de grupos
+ - @param iterations : Máximo de iterações (padrão: 25)
+ - @param seed : Semente da inicialização (padrão: 0)
+ - @retparms result : Tupla (centros (k', d), pesos (k',)) ordenada do maior grupo ao menor
+"""
+def kmeans(points, k: int, iterations: int = 25, seed: int = 0) -> tuple:
+    """
+    k-means vetorizado (k-means++ na inicialização)
+
+    Grupos vazios são descartados, então pode haver menos de k centros
+    (ex: imagem de uma cor só).
+
+    Raises:
+        ValueError: Sem pontos ou k < 1
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 0 or k < 1:
+        raise ValueError("k-means precisa de pontos e k >= 1")
+    rng = np.random.default_rng(seed)
+    norms = np.einsum('ij,ij->i', points, points)
+
+    # k-means++: cada centro novo é sorteado com probabilidade proporcional à distância
+    centers = [points[rng.integers(len(points))]]
+    nearest = norms - 2 * points @ centers[0] + centers[0] @ centers[0]
+    for _ in range(1, min(k, len(points))):
+        total = nearest.sum()
+        if total <= 0:
+            break
+        center = points[rng.choice(len(points), p=np.maximum(nearest, 0) / total)]
+        centers.append(center)
+        nearest = np.minimum(nearest, norms - 2 * points @ center + center @ center)
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(iterations):
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, para todos os pares de uma vez
+        distances = norms[:, None] - 2 * points @ centers.T + np.einsum('ij,ij->i', centers, centers)
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        keep = counts > 0
+        centers = sums[keep] / counts[keep, None]
+        if not keep.all():
+            labels = None
+
+    distances = norms[:, None] - 2 * points @ centers.T + np.einsum('ij,ij->i', centers, centers)
+    counts = np.bincount(distances.argmin(axis=1), minlength=len(centers))
+    order = np.argsort(-counts, kind='stable')
+    return centers[order], counts[order] / counts.sum()
+
+"""
+END kmeans
+"""
+
+"""
+BEGIN assign_colours
+ - @param colours : Paleta [(r, g, b), ...]
+ - @param weights : Peso de cada cor
+ - @param count : Número de lâmpadas
+ - @retparms assigned : Uma cor por lâmpada
+"""
+def assign_colours(colours: list, weights: list, count: int) -> list:
+    """
+    Distribui as cores entre as lâmpadas na proporção dos pesos
+
+    Cada cor recebe ao menos uma lâmpada enquanto houver lâmpadas (as mais
+    fortes primeiro); as restantes seguem os maiores restos da divisão.
+    """
+    if not colours or count <= 0:
+        return []
+    colours = colours[:count]
+    weights = np.asarray(weights[:len(colours)], dtype=np.float64)
+    extra = count - len(colours)
+    share = weights / weights.sum() * extra if weights.sum() > 0 else np.zeros(len(colours))
+    lamps = 1 + np.floor(share).astype(int)
+    for i in np.argsort(-(share - np.floor(share)), kind='stable')[:count - lamps.sum()]:
+        lamps[i] += 1
+    return [colour for colour, n in zip(colours, lamps) for _ in range(n)]
+
+"""
+END assign_colours
+"""
+
+"""
+BEGIN file_digest
+ - @param path : Caminho do arquivo
+ - @retparms digest : SHA-256 do conteúdo (hexadecimal)
+"""
+def file_digest(path: str) -> str:
+    """SHA-256 do arquivo, lido em blocos de 1 MiB"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+"""
+END file_digest
+"""
+
+"""
+BEGIN _read_pnm
+ - @param path : Arquivo PPM/PGM (P2, P3, P5 ou P6)
+ - @retparms pixels : Array uint8 (altura, largura, 3)
+"""
+def _read_pnm(path: str):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic = data[:2]
+    if magic not in (b'P2', b'P3', b'P5', b'P6'):
+        raise ValueError(f"Formato não suportado sem o Pillow (pip install pillow): {path}")
+
+    # Cabeçalho: magic, largura, altura, valor máximo (com comentários '#')
+    fields, pos = [], 2
+    while len(fields) < 3:
+        while pos < len(data) and data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.find(b'\n', pos) + 1 or len(data)
+            continue
+        end = pos
+        while end < len(data) and data[end:end + 1].isdigit():
+            end += 1
+        if end == pos:
+            raise ValueError(f"Cabeçalho PPM inválido: {path}")
+        fields.append(int(data[pos:end]))
+        pos = end
+    width, height, maxval = fields
+    channels = 3 if magic in (b'P3', b'P6') else 1
+
+    count = width * height * channels
+    if magic in (b'P5', b'P6'):
+        dtype = np.dtype('>u2' if maxval > 255 else 'u1')
+        if len(data) - pos - 1 < count * dtype.itemsize:
+            raise ValueError(f"PPM truncado: {path}")
+        body = np.frombuffer(data, dtype=dtype, count=count, offset=pos + 1)
+    else:
+        body = np.array([int(v) for v in data[pos:].split()[:count]], dtype=np.int64)
+        if body.size != count:
+            raise ValueError(f"PPM truncado: {path}")
+
+    pixels = body.reshape(height, width, channels)
+    if channels == 1:
+        pixels = np.repeat(pixels, 3, axis=2)
+    if maxval != 255:
+        pixels = pixels.astype(np.float64) * (255.0 / maxval)
+    return np.rint(pixels).astype(np.uint8) if pixels.dtype != np.uint8 else pixels
+
+"""
+END _read_pnm
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
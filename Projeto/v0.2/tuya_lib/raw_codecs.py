@@ -0,0 +1,332 @@
+"""
+Módulo de codecs dos DPs Raw (base64)
+
+Este módulo contém o registro de codecs por código de DP para os valores
+Raw das lâmpadas (power_memory, switch_gradient, rhythm_mode,
+candle_mode_data e os agendamentos). Cada layout é compilado uma vez em um
+struct.Struct (big-endian) e decodifica para um objeto tipado (namedtuple
+imutável), ex:
+
+    'AAEAAAPoA+gD6APo' (power_memory) ->
+        PowerMemory(version=0, mode=1, h=0, s=1000, v=1000, bright=1000, temp=1000)
+
+Os valores decodificados ficam em cache por texto: as leituras de status
+repetem quase sempre o mesmo base64 e só um valor novo é decodificado de
+novo. O DpSchema usa este registro ao decodificar e codificar DPs Raw.
+"""
+
+import base64
+import struct
+from collections import namedtuple
+
+
+# Máximo de valores decodificados guardados por codec
+CACHE_SIZE = 256
+
+# Formato extra dos layouts: inteiro sem sinal de 3 bytes (tempos em ms)
+U24 = 'u24'
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN RawCodec
+ - @param code : Código do DP (ex: 'power_memory')
+ - @param header : Lista de (campo, formato struct ou 'u24') do cabeçalho
+ - @param node : Lista de (campo, formato) de cada nó (padrão: None = sem nós)
+ - @param max_nodes : Máximo de nós aceito (padrão: 0)
+ - @var/obj code : Código do DP
+ - @var/obj type : namedtuple do valor decodificado (campos do cabeçalho + 'nodes')
+ - @var/obj node_type : namedtuple de cada nó (None se o DP não tiver nós)
+ - @method encode : Objeto tipado ou dicionário -> base64
+ - @method decode : base64 -> objeto tipado (em cache por texto)
+ - @method make : Cria o objeto tipado (campos ausentes valem 0)
+ - @retparms : Instância da classe RawCodec
+"""
+class RawCodec:
+    """Codec de um DP Raw: cabeçalho fixo e, opcionalmente, contagem + nós de tamanho fixo"""
+
+    def __init__(self, code: str, header: list, node: list = None, max_nodes: int = 0):
+        self.code = code
+        self.max_nodes = max_nodes
+        self.header_fields = tuple(name for name, _ in header)
+        self.fields = tuple(name for name, _ in node or ())
+        self._header_wide = _wide_fields(header)
+        self._node_wide = _wide_fields(node or ())
+        # Com nós, a contagem é o último byte do cabeçalho
+        self._header = struct.Struct('>' + _formats(header) + ('B' if node else ''))
+        self._node = struct.Struct('>' + _formats(node)) if node else None
+
+        name = ''.join(part.capitalize() for part in code.split('_'))
+        self.type = namedtuple(name, self.header_fields + (('nodes',) if node else ()))
+        self.node_type = namedtuple(name + 'Node', self.fields) if node else None
+        self._cache = {}
+
+    def make(self, **fields):
+        """Objeto tipado a partir de campos nomeados (ausentes = 0, nós = nenhum)"""
+        values = {f: fields.get(f, 0) for f in self.header_fields}
+        if self._node is not None:
+            values['nodes'] = tuple(self.node_type(**n) if isinstance(n, dict) else n
+                                    for n in fields.get('nodes', ()))
+        return self.type(**values)
+
+    def encode(self, value) -> str:
+        """
+        Monta o valor base64 do DP
+
+        Args:
+            value: Objeto tipado (self.type) ou dicionário {campo: valor, 'nodes': [...]};
+                   campos do cabeçalho ausentes valem 0, os nós podem ser dicionários
+
+        Raises:
+            ValueError: Nós demais, campo de nó ausente ou valor fora da faixa do campo
+        """
+        if hasattr(value, '_asdict'):
+            value = value._asdict()
+        header = [value.get(f, 0) for f in self.header_fields]
+        nodes = list(value.get('nodes', ())) if self._node is not None else []
+        if len(nodes) > self.max_nodes:
+            raise ValueError(f"{self.code}: no máximo {self.max_nodes} nós")
+
+        try:
+            if self._node is not None:
+                header.append(len(nodes))
+            data = self._header.pack(*_to_wide(header, self._header_wide))
+            for node in nodes:
+                if hasattr(node, '_asdict'):
+                    node = node._asdict()
+                data += self._node.pack(*_to_wide([node[f] for f in self.fields], self._node_wide))
+        except KeyError as e:
+            raise ValueError(f"{self.code}: campo ausente {e}") from None
+        except (struct.error, OverflowError) as e:
+            raise ValueError(f"{self.code}: valor fora da faixa ({e})") from None
+        return base64.b64encode(data).decode('ascii')
+
+    def decode(self, text: str):
+        """
+        Lê o valor base64 do DP (o mesmo texto devolve o mesmo objeto, sem refazer o parse)
+
+        Raises:
+            ValueError: base64 inválido ou tamanho incompatível com o layout
+        """
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+
+        try:
+            data = base64.b64decode(text, validate=True)
+        except (ValueError, TypeError):
+            raise ValueError(f"{self.code}: base64 inválido: {text!r}") from None
+        if len(data) < self._header.size:
+            raise ValueError(f"{self.code}: valor curto demais ({len(data)} bytes)")
+
+        header = _from_wide(self._header.unpack_from(data), self._header_wide)
+        if self._node is None:
+            if len(data) != self._header.size:
+                raise ValueError(f"{self.code}: esperados {self._header.size} bytes, "
+                                 f"recebidos {len(data)}")
+            value = self.type(*header)
+        else:
+            *header, count = header
+            expected = self._header.size + count * self._node.size
+            if len(data) != expected:
+                raise ValueError(f"{self.code}: {count} nó(s) exigem {expected} bytes, "
+                                 f"recebidos {len(data)}")
+            nodes = tuple(self.node_type(*_from_wide(self._node.unpack_from(data, offset),
+                                                     self._node_wide))
+                          for offset in range(self._header.size, expected, self._node.size))
+            value = self.type(*header, nodes)
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[text] = value
+        return value
+
+    def __repr__(self) -> str:
+        return f"RawCodec({self.code!r}, {self._header.size} + n*{self._node.size if self._node else 0} bytes)"
+
+"""
+END RawCodec
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN codec_for
+ - @param code : Código do DP
+ - @retparms codec : RawCodec registrado ou None
+"""
+def codec_for(code: str) -> RawCodec:
+    """Codec registrado para o código do DP (None se o DP não tiver layout conhecido)"""
+    return CODECS.get(code)
+
+"""
+END codec_for
+"""
+
+"""
+BEGIN encode_raw
+ - @param code : Código do DP
+ - @param value : Objeto tipado ou dicionário
+ - @retparms text : Valor base64 do DP
+"""
+def encode_raw(code: str, value) -> str:
+    """
+    Codifica o valor de um DP Raw registrado
+
+    Raises:
+        ValueError: DP sem codec ou valor inválido
+    """
+    return _codec(code).encode(value)
+
+"""
+END encode_raw
+"""
+
+"""
+BEGIN decode_raw
+ - @param code : Código do DP
+ - @param text : Valor base64 lido do status
+ - @retparms value : Objeto tipado do DP
+"""
+def decode_raw(code: str, text: str):
+    """
+    Decodifica o valor de um DP Raw registrado
+
+    Raises:
+        ValueError: DP sem codec ou valor inválido
+    """
+    return _codec(code).decode(text)
+
+"""
+END decode_raw
+"""
+
+"""
+BEGIN _codec
+ - @param code : Código do DP
+ - @retparms codec : RawCodec do DP (ValueError se desconhecido)
+"""
+def _codec(code: str) -> RawCodec:
+    if code not in CODECS:
+        raise ValueError(f"DP Raw sem codec: {code} (conhecidos: {', '.join(CODECS)})")
+    return CODECS[code]
+
+"""
+END _codec
+"""
+
+"""
+BEGIN _formats
+ - @param layout : Lista de (campo, formato)
+ - @retparms formats : Formatos struct concatenados ('u24' vira '3s')
+"""
+def _formats(layout: list) -> str:
+    return ''.join('3s' if fmt == U24 else fmt for _, fmt in layout)
+
+"""
+END _formats
+"""
+
+"""
+BEGIN _wide_fields
+ - @param layout : Lista de (campo, formato)
+ - @retparms indexes : Posições dos campos 'u24'
+"""
+def _wide_fields(layout) -> frozenset:
+    return frozenset(i for i, (_, fmt) in enumerate(layout) if fmt == U24)
+
+"""
+END _wide_fields
+"""
+
+"""
+BEGIN _to_wide
+ - @param values : Valores na ordem do layout
+ - @param wide : Posições dos campos 'u24'
+ - @retparms values : Valores prontos para struct.pack (u24 em 3 bytes)
+"""
+def _to_wide(values: list, wide: frozenset) -> list:
+    if not wide:
+        return values
+    return [int(v).to_bytes(3, 'big') if i in wide else v for i, v in enumerate(values)]
+
+"""
+END _to_wide
+"""
+
+"""
+BEGIN _from_wide
+ - @param values : Tupla de struct.unpack
+ - @param wide : Posições dos campos 'u24'
+ - @retparms values : Valores com os u24 convertidos para int
+"""
+def _from_wide(values: tuple, wide: frozenset) -> tuple:
+    if not wide:
+        return values
+    return tuple(int.from_bytes(v, 'big') if i in wide else v for i, v in enumerate(values))
+
+"""
+END _from_wide
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
+
+
+# Cor dos agendamentos: H 0-360 em 2 bytes; S, V, brilho e temperatura em % de 1 byte
+_LIGHT = [('h', 'H'), ('s', 'B'), ('v', 'B'), ('bright', 'B'), ('temp', 'B')]
+
+# Registro código do DP -> codec (layouts do protocolo de iluminação Tuya)
+CODECS = {
+    # Estado ao religar: modo 0 = padrão, 1 = último estado, 2 = cor/branco definidos
+    'power_memory': RawCodec(
+        'power_memory',
+        [('version', 'B'), ('mode', 'B'), ('h', 'H'), ('s', 'H'), ('v', 'H'),
+         ('bright', 'H'), ('temp', 'H')]),
+    # Tempos de transição ao ligar/desligar, em ms
+    'switch_gradient': RawCodec(
+        'switch_gradient', [('version', 'B'), ('on_ms', U24), ('off_ms', U24)]),
+    # Ritmo biológico: pontos do dia com cor/brilho, interpolados pela lâmpada
+    'rhythm_mode': RawCodec(
+        'rhythm_mode', [('version', 'B'), ('enabled', 'B'), ('mode', 'B'), ('weekdays', 'B')],
+        [('on', 'B'), ('hour', 'B'), ('minute', 'B')] + _LIGHT, max_nodes=8),
+    # Modo vela: cor base, amplitude e velocidade da cintilação
+    'candle_mode_data': RawCodec(
+        'candle_mode_data',
+        [('version', 'B'), ('enabled', 'B'), ('h', 'H'), ('s', 'H'), ('v', 'H'),
+         ('flicker', 'B'), ('speed', 'B')]),
+    'wakeup_mode': RawCodec(
+        'wakeup_mode', [('version', 'B')],
+        [('on', 'B'), ('weekdays', 'B'), ('hour', 'B'), ('minute', 'B'), ('fade', 'B')]
+        + _LIGHT + [('duration', 'B')], max_nodes=4),
+    'sleep_mode': RawCodec(
+        'sleep_mode', [('version', 'B')],
+        [('on', 'B'), ('weekdays', 'B'), ('hour', 'B'), ('minute', 'B'), ('fade', 'B')]
+        + _LIGHT, max_nodes=4),
+    'cycle_timing': RawCodec(
+        'cycle_timing', [('version', 'B'), ('enabled', 'B')],
+        [('on', 'B'), ('weekdays', 'B'), ('start', 'H'), ('end', 'H'),
+         ('on_minutes', 'H'), ('off_minutes', 'H')] + _LIGHT, max_nodes=4),
+    'random_timing': RawCodec(
+        'random_timing', [('version', 'B'), ('enabled', 'B')],
+        [('on', 'B'), ('weekdays', 'B'), ('start', 'H'), ('end', 'H')] + _LIGHT, max_nodes=4),
+}
@@ -0,0 +1,204 @@
+"""
+Módulo de registro de esquemas de produto
+
+Este módulo contém o SchemaRegistry, que guarda uma única cópia do
+'mapping' (esquema de DPs) por product_id e faz todos os dispositivos do
+mesmo produto apontarem para ela, e o CloudDataCache, que só lê o
+tuya-raw.json (dados brutos da nuvem) na primeira consulta.
+"""
+
+import json
+import os
+
+from .dp_schema import compile_schema, DpSchema
+from .binary_cache import load_json_cached
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN SchemaRegistry
+ - @var/obj _schemas : Dicionário product_id -> mapping compartilhado
+ - @var/obj _raw : Dicionário product_id -> mapping em texto JSON ainda não lido
+ - @method intern : Troca um mapping pela cópia compartilhada do produto
+ - @method intern_devices : Aplica intern a uma lista de dispositivos
+ - @method add_raw : Registra um mapping em texto JSON para leitura sob demanda
+ - @method get : Mapping compartilhado de um produto (lido na primeira consulta)
+ - @method compiled : DpSchema compilado do produto
+ - @method product_ids : IDs de produto conhecidos
+ - @retparms : Instância da classe SchemaRegistry
+"""
+class SchemaRegistry:
+    """Uma cópia do esquema de DPs por product_id, compartilhada pelos dispositivos"""
+
+    def __init__(self):
+        self._schemas = {}
+        self._raw = {}
+
+    def __len__(self) -> int:
+        return len(self._schemas.keys() | self._raw.keys())
+
+    def __contains__(self, product_id) -> bool:
+        return product_id in self._schemas or product_id in self._raw
+
+    def intern(self, product_id: str, mapping):
+        """
+        Retorna a cópia compartilhada do mapping do produto
+
+        O primeiro mapping visto para um product_id vira o esquema do produto.
+        Um mapping diferente do esquema (firmware diferente, edição manual) é
+        devolvido sem alteração, então nenhum dispositivo perde informação.
+
+        Args:
+            product_id: ID do produto
+            mapping: Mapping do dispositivo
+
+        Returns:
+            Mapping compartilhado, ou o próprio mapping se não puder ser compartilhado
+        """
+        if not product_id or not isinstance(mapping, dict):
+            return mapping
+        schema = self.get(product_id)
+        if schema is None:
+            self._schemas[product_id] = mapping
+            return mapping
+        if schema is mapping or schema == mapping:
+            return schema
+        return mapping
+
+    def intern_devices(self, devices: list) -> int:
+        """
+        Faz os dispositivos apontarem para o esquema compartilhado do produto
+
+        Returns:
+            Número de dispositivos cujo mapping passou a ser compartilhado
+        """
+        shared = 0
+        for device in devices:
+            mapping = device.get('mapping')
+            if mapping is None:
+                continue
+            schema = self.intern(device.get('product_id'), mapping)
+            if schema is not mapping:
+                device['mapping'] = schema
+                shared += 1
+        return shared
+
+    def add_raw(self, product_id: str, text: str) -> None:
+        """Registra o mapping do produto em texto JSON; só é lido quando pedido"""
+        if product_id and text and product_id not in self._schemas:
+            self._raw[product_id] = text
+
+    def get(self, product_id: str) -> dict:
+        """Mapping compartilhado do produto ou None"""
+        schema = self._schemas.get(product_id)
+        if schema is None and product_id in self._raw:
+            schema = json.loads(self._raw.pop(product_id))
+            self._schemas[product_id] = schema
+        return schema
+
+    def compiled(self, product_id: str) -> DpSchema:
+        """Esquema compilado do produto (vazio se o produto não for conhecido)"""
+        return compile_schema(self.get(product_id))
+
+    def product_ids(self) -> list:
+        """IDs de produto com esquema registrado"""
+        return list(self._schemas.keys() | self._raw.keys())
+
+"""
+END SchemaRegistry
+"""
+
+"""
+BEGIN CloudDataCache
+ - @param raw_file : Caminho do tuya-raw.json (padrão: 'tuya-raw.json')
+ - @var/obj raw_file : Caminho do arquivo raw
+ - @method get : Registro da nuvem de um dispositivo (status, online, ...)
+ - @method records : Todos os registros da nuvem
+ - @method mtime : Data de modificação do arquivo lido (propriedade)
+ - @method invalidate : Descarta o cache (próxima consulta relê o arquivo)
+ - @method _load : Lê o arquivo se ele mudou desde a última leitura
+ - @retparms : Instância da classe CloudDataCache
+"""
+class CloudDataCache:
+    """Dados brutos da nuvem (tuya-raw.json), lidos só na primeira consulta"""
+
+    def __init__(self, raw_file: str = 'tuya-raw.json'):
+        """
+        Inicializa o cache sem ler o arquivo
+
+        Args:
+            raw_file: Caminho do tuya-raw.json
+        """
+        self.raw_file = raw_file
+        self._by_id = None
+        self._mtime = None
+
+    def get(self, device_id: str) -> dict:
+        """Registro do dispositivo em tuya-raw.json ou None"""
+        self._load()
+        return self._by_id.get(device_id)
+
+    def records(self) -> list:
+        """Todos os registros de tuya-raw.json (lê o arquivo se necessário)"""
+        self._load()
+        return list(self._by_id.values())
+
+    @property
+    def mtime(self) -> float:
+        """Data de modificação do arquivo lido (None se ausente)"""
+        self._load()
+        return self._mtime
+
+    def invalidate(self) -> None:
+        """Descarta o cache; a próxima consulta relê o arquivo"""
+        self._by_id = None
+        self._mtime = None
+
+    def _load(self) -> None:
+        try:
+            mtime = os.path.getmtime(self.raw_file)
+        except OSError:
+            self._by_id, self._mtime = {}, None
+            return
+        if self._by_id is not None and mtime == self._mtime:
+            return
+
+        try:
+            data = load_json_cached(self.raw_file)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao carregar {self.raw_file}: {e}")
+            data = {}
+
+        records = data.get('result', []) if isinstance(data, dict) else data
+        self._by_id = {r['id']: r for r in records if isinstance(r, dict) and r.get('id')}
+        self._mtime = mtime
+
+"""
+END CloudDataCache
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+# Não há funções fora das classes neste módulo
+
+"""
+===================
+END Declaração de funções
+===================
+"""
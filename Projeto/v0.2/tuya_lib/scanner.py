@@ -0,0 +1,348 @@
+"""
+Módulo de varredura de rede assíncrona
+
+Este módulo contém o scanner asyncio que substitui o deviceScan bloqueante
+do tinytuya: escuta os broadcasts UDP dos dispositivos Tuya e, em paralelo,
+faz uma varredura TCP com concorrência limitada da porta 6668 nas sub-redes
+configuradas, entregando os dispositivos à medida que são encontrados.
+"""
+
+import asyncio
+import ipaddress
+import json
+import socket
+import time
+import tinytuya
+
+
+# Porta TCP do protocolo local e portas UDP de broadcast (3.1, 3.3, app/3.5)
+TUYA_TCP_PORT = 6668
+TUYA_UDP_PORTS = (6666, 6667, 7000)
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN NetworkScanner
+ - @param subnets : Lista de sub-redes em notação CIDR (padrão: sub-rede /24 local)
+ - @param port : Porta TCP varrida (padrão: 6668)
+ - @param concurrency : Número máximo de conexões TCP simultâneas (padrão: 256)
+ - @param connect_timeout : Timeout de cada tentativa de conexão em segundos (padrão: 0.5)
+ - @param listen_time : Tempo mínimo de escuta dos broadcasts em segundos (padrão: 1.5)
+ - @param broadcast : Habilita a escuta dos broadcasts UDP (padrão: True)
+ - @param exclude : IPs que não entram na varredura TCP (ex: já verificados)
+ - @var/obj subnets : Sub-redes a serem varridas
+ - @var/obj found : Dicionário IP -> dispositivo encontrado na última varredura
+ - @method stream : Gerador assíncrono que entrega os dispositivos conforme são encontrados
+ - @method scan : Executa a varredura de forma síncrona e retorna a lista de dispositivos
+ - @method _sweep : Varredura TCP das sub-redes com concorrência limitada
+ - @method _listen : Abre os sockets UDP de broadcast
+ - @retparms : Instância da classe NetworkScanner
+"""
+class NetworkScanner:
+    """Scanner asyncio de dispositivos Tuya (broadcast UDP + varredura TCP)"""
+
+    def __init__(self, subnets: list = None, port: int = TUYA_TCP_PORT,
+                 concurrency: int = 256, connect_timeout: float = 0.5,
+                 listen_time: float = 1.5, broadcast: bool = True,
+                 exclude=None):
+        """
+        Inicializa o scanner
+
+        Args:
+            subnets: Sub-redes em notação CIDR (ex: ['192.168.1.0/24'])
+            port: Porta TCP a ser varrida
+            concurrency: Conexões TCP simultâneas
+            connect_timeout: Timeout de cada conexão em segundos
+            listen_time: Tempo mínimo de escuta dos broadcasts em segundos
+            broadcast: Se True, escuta os broadcasts UDP
+            exclude: IPs ignorados pela varredura TCP (broadcasts continuam valendo)
+        """
+        self.subnets = subnets or local_subnets()
+        self.port = port
+        self.concurrency = max(1, concurrency)
+        self.connect_timeout = connect_timeout
+        self.listen_time = listen_time
+        self.broadcast = broadcast
+        self.exclude = set(exclude or ())
+        self.found = {}
+
+    async def stream(self):
+        """
+        Gerador assíncrono com os dispositivos encontrados
+
+        Um mesmo IP pode ser entregue duas vezes: primeiro pela varredura TCP
+        (sem ID) e depois pelo broadcast, que acrescenta ID e versão.
+
+        Yields:
+            Dicionário com ip, id, version, product_key, origin e time
+
+        Raises:
+            ValueError: Sub-rede inválida (ou outro erro da varredura TCP)
+        """
+        self.found = {}
+        queue = asyncio.Queue()
+        transports = await self._listen(queue) if self.broadcast else []
+        sweep = asyncio.ensure_future(self._sweep(queue))
+        deadline = time.monotonic() + (self.listen_time if transports else 0)
+
+        try:
+            while not (sweep.done() and queue.empty() and time.monotonic() >= deadline):
+                try:
+                    device = await asyncio.wait_for(queue.get(), timeout=0.05)
+                except asyncio.TimeoutError:
+                    continue
+
+                known = self.found.get(device['ip'])
+                if known and (known.get('id') or not device.get('id')):
+                    continue  # Nada de novo sobre este IP
+                if known:
+                    known.update({k: v for k, v in device.items() if v})
+                    device = known
+                else:
+                    self.found[device['ip']] = device
+                yield dict(device)
+
+            # Erro da varredura (ex: sub-rede inválida) chega a quem chamou, não vira "0 dispositivos"
+            sweep.result()
+        finally:
+            sweep.cancel()
+            for transport in transports:
+                transport.close()
+
+    def scan(self, callback=None) -> list:
+        """
+        Executa a varredura de forma síncrona
+
+        Args:
+            callback: Função chamada com cada dispositivo assim que é encontrado
+
+        Returns:
+            Lista de dispositivos encontrados (um por IP)
+        """
+        async def _collect():
+            async for device in self.stream():
+                if callback:
+                    callback(device)
+
+        asyncio.run(_collect())
+        return list(self.found.values())
+
+    async def _sweep(self, queue: asyncio.Queue) -> None:
+        """Varre as sub-redes com um pool fixo de workers"""
+        hosts = (ip for ip in iter_hosts(self.subnets) if ip not in self.exclude)
+
+        async def worker():
+            for ip in hosts:
+                if await probe_tcp(ip, self.port, self.connect_timeout):
+                    queue.put_nowait(_make_result(ip, origin='tcp'))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def _listen(self, queue: asyncio.Queue) -> list:
+        """Abre um socket UDP por porta de broadcast (portas ocupadas são ignoradas)"""
+        loop = asyncio.get_running_loop()
+        transports = []
+
+        for udp_port in TUYA_UDP_PORTS:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                sock.bind(('', udp_port))
+                sock.setblocking(False)
+            except OSError:
+                continue
+
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _BroadcastProtocol(queue), sock=sock
+            )
+            transports.append(transport)
+
+        return transports
+
+"""
+END NetworkScanner
+"""
+
+"""
+BEGIN _BroadcastProtocol
+ - @param queue : Fila onde os dispositivos decodificados são colocados
+ - @method datagram_received : Decodifica o broadcast e enfileira o dispositivo
+ - @retparms : Instância da classe _BroadcastProtocol
+"""
+class _BroadcastProtocol(asyncio.DatagramProtocol):
+    """Protocolo asyncio que decodifica os broadcasts UDP dos dispositivos"""
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            payload = json.loads(tinytuya.decrypt_udp(data))
+        except Exception:
+            return  # Pacote que não é de um dispositivo Tuya
+
+        ip = payload.get('ip') or addr[0]
+        self.queue.put_nowait(_make_result(
+            ip,
+            device_id=payload.get('gwId', ''),
+            version=payload.get('version', ''),
+            product_key=payload.get('productKey', ''),
+            origin='broadcast'
+        ))
+
+"""
+END _BroadcastProtocol
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN local_subnets
+ - @param prefix : Tamanho do prefixo da sub-rede local (padrão: 24)
+ - @retparms subnets : Lista com a sub-rede da interface de saída padrão
+"""
+def local_subnets(prefix: int = 24) -> list:
+    """Descobre a sub-rede local sem enviar pacotes (connect em socket UDP)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(('10.255.255.255', 1))
+        address = sock.getsockname()[0]
+    except OSError:
+        address = '192.168.1.1'
+    finally:
+        sock.close()
+
+    return [str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))]
+
+"""
+END local_subnets
+"""
+
+"""
+BEGIN subnets_from_devices
+ - @param devices : Lista de dispositivos com campo 'ip'
+ - @param prefix : Tamanho do prefixo das sub-redes (padrão: 24)
+ - @retparms subnets : Lista de sub-redes (sem repetição) dos IPs conhecidos
+"""
+def subnets_from_devices(devices: list, prefix: int = 24) -> list:
+    """Deriva as sub-redes a partir dos IPs já cadastrados"""
+    subnets = []
+    for device in devices:
+        address = (device.get('ip') or '').strip()
+        if not address:
+            continue
+        try:
+            subnet = str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+        except ValueError:
+            continue
+        if subnet not in subnets:
+            subnets.append(subnet)
+    return subnets
+
+"""
+END subnets_from_devices
+"""
+
+"""
+BEGIN iter_hosts
+ - @param subnets : Lista de sub-redes em notação CIDR
+ - @retparms hosts : Gerador de IPs (string) de todas as sub-redes, sem repetição
+"""
+def iter_hosts(subnets: list):
+    """Gera os IPs de host das sub-redes sem materializar a lista inteira"""
+    seen = set()
+    for subnet in subnets:
+        network = ipaddress.ip_network(subnet, strict=False)
+        for host in network.hosts():
+            ip = str(host)
+            if ip not in seen:
+                seen.add(ip)
+                yield ip
+
+"""
+END iter_hosts
+"""
+
+"""
+BEGIN probe_tcp
+ - @param ip : Endereço IP do dispositivo
+ - @param port : Porta TCP (padrão: 6668)
+ - @param timeout : Timeout da conexão em segundos (padrão: 0.5)
+ - @retparms open : True se a porta aceitou a conexão
+"""
+async def probe_tcp(ip: str, port: int = TUYA_TCP_PORT, timeout: float = 0.5) -> bool:
+    """Verificação barata de presença: apenas abre e fecha a conexão TCP"""
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(ip, port), timeout=timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+"""
+END probe_tcp
+"""
+
+"""
+BEGIN scan_network
+ - @param subnets : Lista de sub-redes em notação CIDR (padrão: sub-rede local)
+ - @param callback : Função chamada para cada dispositivo encontrado (opcional)
+ - @param kwargs : Demais parâmetros repassados ao NetworkScanner
+ - @retparms devices : Lista de dispositivos encontrados
+"""
+def scan_network(subnets: list = None, callback=None, **kwargs) -> list:
+    """Atalho síncrono para NetworkScanner(...).scan()"""
+    return NetworkScanner(subnets, **kwargs).scan(callback)
+
+"""
+END scan_network
+"""
+
+"""
+BEGIN _make_result
+ - @retparms device : Dicionário padronizado com o resultado da varredura
+"""
+def _make_result(ip: str, device_id: str = '', version: str = '',
+                 product_key: str = '', origin: str = 'tcp') -> dict:
+    return {
+        'ip': ip,
+        'id': device_id,
+        'version': version,
+        'product_key': product_key,
+        'origin': origin,
+        'time': time.time(),
+    }
+
+"""
+END _make_result
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,267 @@
+"""
+Módulo de cenas nativas (scene_data, DP 25)
+
+Este módulo codifica e decodifica o texto do DP scene_data das lâmpadas
+Tuya (formato v2, hexadecimal):
+
+    nn + até 8 unidades de 13 bytes:
+        tt  intervalo de troca (velocidade, 0-100)
+        gg  tempo de transição (0-100)
+        mm  modo: 00 estático, 01 salto, 02 gradiente
+        hhhh ssss vvvv  cor HSV (H 0-360, S/V 0-1000; zero nas unidades brancas)
+        bbbb tttt       brilho e temperatura (10-1000/0-1000; zero nas coloridas)
+
+Ex: '000e0d0000000000000000c80000' = cena 0, uma unidade branca com brilho
+200. Uma cena de vários passos é compilada uma vez e enviada em um único
+comando; a lâmpada anima sozinha, sem CPU nem rede do lado do computador.
+"""
+
+from .color import HUE_MAX, SV_MAX, rgb_to_hsv
+
+
+# Modos de troca entre unidades
+MODES = {'static': 0, 'jump': 1, 'gradient': 2}
+
+# Máximo de unidades por cena aceito pelo firmware
+MAX_UNITS = 8
+
+# Tamanho de uma unidade em dígitos hexadecimais (13 bytes)
+UNIT_LEN = 26
+
+# Faixa de velocidade/transição
+SPEED_MAX = 100
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN SceneUnit
+ - @param mode : 'static', 'jump' ou 'gradient' (padrão: 'static')
+ - @param speed : Intervalo de troca 0-100 (padrão: 50)
+ - @param transition : Tempo de transição 0-100 (padrão: 50)
+ - @param h, s, v : Cor HSV (unidade colorida)
+ - @param bright, temp : Brilho e temperatura (unidade branca)
+ - @method colour : Cria uma unidade colorida (HSV)
+ - @method rgb : Cria uma unidade colorida a partir de RGB
+ - @method white : Cria uma unidade branca (brilho/temperatura)
+ - @method encode : Texto hexadecimal da unidade (26 dígitos)
+ - @method decode : Lê uma unidade de 26 dígitos
+ - @method is_white : Indica se é uma unidade branca
+ - @retparms : Instância da classe SceneUnit
+"""
+class SceneUnit:
+    """Um passo da cena: cor ou branco, com modo e velocidades"""
+
+    __slots__ = ('mode', 'speed', 'transition', 'h', 's', 'v', 'bright', 'temp')
+
+    def __init__(self, mode: str = 'static', speed: int = 50, transition: int = 50,
+                 h: int = 0, s: int = 0, v: int = 0, bright: int = 0, temp: int = 0):
+        """
+        Raises:
+            ValueError: Modo desconhecido ou valor fora da faixa
+        """
+        if mode not in MODES:
+            raise ValueError(f"Modo de cena inválido: {mode} (use {', '.join(MODES)})")
+        self.mode = mode
+        self.speed = _checked('speed', speed, SPEED_MAX)
+        self.transition = _checked('transition', transition, SPEED_MAX)
+        self.h = _checked('h', h, HUE_MAX)
+        self.s = _checked('s', s, SV_MAX)
+        self.v = _checked('v', v, SV_MAX)
+        self.bright = _checked('bright', bright, SV_MAX)
+        self.temp = _checked('temp', temp, SV_MAX)
+
+    @classmethod
+    def colour(cls, h: int, s: int = SV_MAX, v: int = SV_MAX, mode: str = 'gradient',
+               speed: int = 50, transition: int = 50):
+        """Unidade colorida (HSV no formato Tuya)"""
+        return cls(mode, speed, transition, h=h, s=s, v=v)
+
+    @classmethod
+    def rgb(cls, r: int, g: int, b: int, mode: str = 'gradient', speed: int = 50,
+            transition: int = 50):
+        """Unidade colorida a partir de RGB 0-255"""
+        h, s, v = rgb_to_hsv(r, g, b)
+        return cls(mode, speed, transition, h=h, s=s, v=max(v, 10))
+
+    @classmethod
+    def white(cls, bright: int = SV_MAX, temp: int = 500, mode: str = 'static',
+              speed: int = 50, transition: int = 50):
+        """Unidade branca (brilho 10-1000, temperatura 0-1000)"""
+        return cls(mode, speed, transition, bright=bright, temp=temp)
+
+    def is_white(self) -> bool:
+        """Unidade branca: sem HSV, com brilho"""
+        return not (self.h or self.s or self.v) and bool(self.bright)
+
+    def encode(self) -> str:
+        """Texto da unidade: tt gg mm hhhh ssss vvvv bbbb tttt"""
+        return (f"{self.speed:02x}{self.transition:02x}{MODES[self.mode]:02x}"
+                f"{self.h:04x}{self.s:04x}{self.v:04x}{self.bright:04x}{self.temp:04x}")
+
+    @classmethod
+    def decode(cls, text: str):
+        """
+        Lê uma unidade de 26 dígitos hexadecimais
+
+        Raises:
+            ValueError: Tamanho, dígitos, modo ou valores inválidos
+        """
+        if len(text) != UNIT_LEN:
+            raise ValueError(f"Unidade de cena deve ter {UNIT_LEN} dígitos: {text!r}")
+        try:
+            fields = [int(text[i:i + 2], 16) for i in (0, 2, 4)]
+            fields += [int(text[i:i + 4], 16) for i in range(6, UNIT_LEN, 4)]
+        except ValueError:
+            raise ValueError(f"Unidade de cena inválida: {text!r}") from None
+        speed, transition, mode, h, s, v, bright, temp = fields
+        modes = {code: name for name, code in MODES.items()}
+        if mode not in modes:
+            raise ValueError(f"Modo de cena desconhecido: {mode:02x}")
+        return cls(modes[mode], speed, transition, h, s, v, bright, temp)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SceneUnit):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self.__slots__)
+
+    def __repr__(self) -> str:
+        if self.is_white():
+            detail = f"branco brilho={self.bright} temp={self.temp}"
+        else:
+            detail = f"HSV({self.h}, {self.s}, {self.v})"
+        return (f"SceneUnit({self.mode}, {detail}, speed={self.speed}, "
+                f"transition={self.transition})")
+
+"""
+END SceneUnit
+"""
+
+"""
+BEGIN Scene
+ - @param units : Lista de SceneUnit (1 a 8)
+ - @param number : Número da cena 0-255 (padrão: 0)
+ - @var/obj units : Passos da cena
+ - @var/obj number : Número da cena
+ - @method encode : Texto do scene_data (compilado uma vez por cena)
+ - @method decode : Lê um scene_data
+ - @retparms : Instância da classe Scene
+"""
+class Scene:
+    """Cena de vários passos executada pela própria lâmpada"""
+
+    def __init__(self, units: list, number: int = 0):
+        """
+        Raises:
+            ValueError: Nenhuma unidade, mais de 8 ou número fora de 0-255
+        """
+        if not 1 <= len(units) <= MAX_UNITS:
+            raise ValueError(f"Uma cena tem de 1 a {MAX_UNITS} unidades ({len(units)} dadas)")
+        self.units = tuple(units)
+        self.number = _checked('number', number, 255)
+        self._encoded = None
+
+    def encode(self) -> str:
+        """
+        Texto do scene_data ('nn' + unidades)
+
+        Calculado só na primeira chamada; as unidades não devem ser
+        alteradas depois de criar a cena.
+        """
+        if self._encoded is None:
+            self._encoded = f"{self.number:02x}" + ''.join(u.encode() for u in self.units)
+        return self._encoded
+
+    @classmethod
+    def decode(cls, text: str):
+        """
+        Lê um scene_data
+
+        Raises:
+            ValueError: Texto com tamanho ou conteúdo inválido
+        """
+        text = text.strip()
+        if len(text) < 2 + UNIT_LEN or (len(text) - 2) % UNIT_LEN:
+            raise ValueError(f"scene_data com tamanho inválido ({len(text)} dígitos)")
+        try:
+            number = int(text[:2], 16)
+        except ValueError:
+            raise ValueError(f"scene_data inválido: {text!r}") from None
+        units = [SceneUnit.decode(text[i:i + UNIT_LEN]) for i in range(2, len(text), UNIT_LEN)]
+        return cls(units, number)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Scene):
+            return NotImplemented
+        return self.number == other.number and self.units == other.units
+
+    def __repr__(self) -> str:
+        return f"Scene({self.number}, {list(self.units)})"
+
+"""
+END Scene
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN preset_scenes
+ - @retparms scenes : Dicionário nome -> Scene com cenas prontas
+"""
+def preset_scenes() -> dict:
+    """Cenas prontas (a 'noite' é a cena de fábrica vista no status das lâmpadas)"""
+    rainbow = [SceneUnit.colour(h, mode='gradient', speed=60, transition=60)
+               for h in (0, 60, 120, 180, 240, 300)]
+    return {
+        'noite': Scene.decode('000e0d0000000000000000c80000'),
+        'leitura': Scene([SceneUnit.white(bright=1000, temp=600)], number=1),
+        'arco_iris': Scene(rainbow, number=2),
+        'alerta': Scene([SceneUnit.colour(0, mode='jump', speed=90, transition=0),
+                         SceneUnit.colour(240, mode='jump', speed=90, transition=0)], number=3),
+        'por_do_sol': Scene([SceneUnit.colour(30, 900, 800, speed=20, transition=80),
+                             SceneUnit.colour(10, 1000, 400, speed=20, transition=80),
+                             SceneUnit.white(bright=100, temp=0, mode='gradient',
+                                             speed=20, transition=80)], number=4),
+    }
+
+"""
+END preset_scenes
+"""
+
+"""
+BEGIN _checked
+ - @param name : Nome do campo (para a mensagem de erro)
+ - @param value : Valor inteiro
+ - @param high : Limite superior (o inferior é 0)
+ - @retparms value : O próprio valor, como int
+"""
+def _checked(name: str, value, high: int) -> int:
+    value = int(value)
+    if not 0 <= value <= high:
+        raise ValueError(f"{name} fora da faixa 0-{high}: {value}")
+    return value
+
+"""
+END _checked
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
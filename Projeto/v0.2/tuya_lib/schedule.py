@@ -0,0 +1,269 @@
+"""
+Módulo de agendamentos nativos da lâmpada
+
+Este módulo codifica e decodifica os DPs de agendamento que a própria
+lâmpada executa, sem o computador ligado nem sockets abertos:
+  - countdown (DP 26): segundos até inverter o estado (0 = cancelado);
+  - wakeup_mode (DP 32): despertar com rampa de brilho;
+  - sleep_mode (DP 31): apagar com rampa de brilho;
+  - cycle_timing (DP 209): liga/desliga em ciclos dentro de um horário;
+  - random_timing (DP 210): liga/desliga aleatório dentro de um horário.
+
+Os DPs Raw vêm em base64; o conteúdo é um cabeçalho (versão, ...) seguido
+de nós de tamanho fixo, descritos como layouts struct (big-endian) no
+registro de raw_codecs. Ex: 'AAA=' (wakeup/sleep) e 'AAAA' (cycle/random)
+são as listas vazias vistas no tuya-raw.json.
+"""
+
+from .raw_codecs import CODECS
+
+
+# DPs de agendamento (codecs registrados em raw_codecs.CODECS)
+SCHEDULE_CODES = ('wakeup_mode', 'sleep_mode', 'cycle_timing', 'random_timing')
+
+# Dias da semana: bit 0 = domingo ... bit 6 = sábado
+WEEKDAYS = ('dom', 'seg', 'ter', 'qua', 'qui', 'sex', 'sab')
+ALL_DAYS = 0x7F
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+# Não há classes neste módulo (os layouts ficam no registro de raw_codecs)
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN weekdays_mask
+ - @param days : Dias ('seg', 'sex', ...) ou números 0-6 (0 = domingo); None = todos
+ - @retparms mask : Máscara de bits dos dias (bit 0 = domingo)
+"""
+def weekdays_mask(days=None) -> int:
+    """
+    Converte uma lista de dias na máscara usada pelos agendamentos
+
+    Raises:
+        ValueError: Dia desconhecido
+    """
+    if days is None:
+        return ALL_DAYS
+    mask = 0
+    for day in days:
+        if isinstance(day, str):
+            if day.lower()[:3] not in WEEKDAYS:
+                raise ValueError(f"Dia desconhecido: {day} (use {', '.join(WEEKDAYS)})")
+            day = WEEKDAYS.index(day.lower()[:3])
+        if not 0 <= day <= 6:
+            raise ValueError(f"Dia fora da faixa 0-6: {day}")
+        mask |= 1 << day
+    return mask
+
+"""
+END weekdays_mask
+"""
+
+"""
+BEGIN mask_weekdays
+ - @param mask : Máscara de bits dos dias
+ - @retparms days : Lista de nomes dos dias ('dom', 'seg', ...)
+"""
+def mask_weekdays(mask: int) -> list:
+    """Converte a máscara de dias de volta em nomes"""
+    return [name for bit, name in enumerate(WEEKDAYS) if mask & (1 << bit)]
+
+"""
+END mask_weekdays
+"""
+
+"""
+BEGIN wakeup_node
+ - @param hour, minute : Horário do despertar
+ - @param fade : Minutos de rampa até o brilho final (padrão: 15)
+ - @param days : Dias da semana (padrão: todos)
+ - @param bright : Brilho final em % (padrão: 100)
+ - @param temp : Temperatura em % (padrão: 50)
+ - @param duration : Minutos acesa depois da rampa (0 = fica acesa) (padrão: 0)
+ - @param hsv : (h 0-360, s %, v %) para despertar colorido (padrão: None = branco)
+ - @retparms node : Nó do wakeup_mode
+"""
+def wakeup_node(hour: int, minute: int, fade: int = 15, days=None, bright: int = 100,
+                temp: int = 50, duration: int = 0, hsv: tuple = None) -> dict:
+    """Despertar: a lâmpada acende em rampa até bright no horário"""
+    _minutes(f"{hour}:{minute}")
+    node = {'on': 1, 'weekdays': weekdays_mask(days), 'hour': hour, 'minute': minute,
+            'fade': fade, 'duration': duration}
+    node.update(_light(bright, temp, hsv))
+    return node
+
+"""
+END wakeup_node
+"""
+
+"""
+BEGIN sleep_node
+ - @param hour, minute : Horário de começar a apagar
+ - @param fade : Minutos de rampa até apagar (padrão: 30)
+ - @param days : Dias da semana (padrão: todos)
+ - @param bright : Brilho de partida em % (padrão: 50)
+ - @param temp : Temperatura em % (padrão: 0, mais quente)
+ - @param hsv : (h, s %, v %) para apagar em cor (padrão: None = branco)
+ - @retparms node : Nó do sleep_mode
+"""
+def sleep_node(hour: int, minute: int, fade: int = 30, days=None, bright: int = 50,
+               temp: int = 0, hsv: tuple = None) -> dict:
+    """Dormir: a lâmpada apaga em rampa a partir do horário"""
+    _minutes(f"{hour}:{minute}")
+    node = {'on': 1, 'weekdays': weekdays_mask(days), 'hour': hour, 'minute': minute,
+            'fade': fade}
+    node.update(_light(bright, temp, hsv))
+    return node
+
+"""
+END sleep_node
+"""
+
+"""
+BEGIN cycle_node
+ - @param start, end : Horários 'HH:MM' da janela
+ - @param on_minutes, off_minutes : Minutos ligada e desligada em cada ciclo
+ - @param days : Dias da semana (padrão: todos)
+ - @param bright, temp, hsv : Luz usada quando ligada
+ - @retparms node : Nó do cycle_timing
+"""
+def cycle_node(start: str, end: str, on_minutes: int, off_minutes: int, days=None,
+               bright: int = 100, temp: int = 50, hsv: tuple = None) -> dict:
+    """Ciclo: liga on_minutes, desliga off_minutes, repetindo dentro da janela"""
+    node = {'on': 1, 'weekdays': weekdays_mask(days), 'start': _minutes(start),
+            'end': _minutes(end), 'on_minutes': on_minutes, 'off_minutes': off_minutes}
+    node.update(_light(bright, temp, hsv))
+    return node
+
+"""
+END cycle_node
+"""
+
+"""
+BEGIN random_node
+ - @param start, end : Horários 'HH:MM' da janela
+ - @param days : Dias da semana (padrão: todos)
+ - @param bright, temp, hsv : Luz usada quando ligada
+ - @retparms node : Nó do random_timing
+"""
+def random_node(start: str, end: str, days=None, bright: int = 100, temp: int = 50,
+                hsv: tuple = None) -> dict:
+    """Aleatório: liga e desliga em momentos aleatórios dentro da janela (simula presença)"""
+    node = {'on': 1, 'weekdays': weekdays_mask(days), 'start': _minutes(start),
+            'end': _minutes(end)}
+    node.update(_light(bright, temp, hsv))
+    return node
+
+"""
+END random_node
+"""
+
+"""
+BEGIN encode_schedule
+ - @param code : Código do DP ('wakeup_mode', 'sleep_mode', 'cycle_timing', 'random_timing')
+ - @param nodes : Lista de nós (ver *_node)
+ - @param header : Campos do cabeçalho (padrão: versão 0; cycle/random habilitados)
+ - @retparms value : Valor base64 do DP
+"""
+def encode_schedule(code: str, nodes: list, **header) -> str:
+    """Monta o valor de um DP de agendamento (lista vazia = sem agendamentos)"""
+    codec = _codec(code)
+    if 'enabled' in codec.header_fields:
+        header.setdefault('enabled', 1 if nodes else 0)
+    return codec.encode(dict(header, nodes=nodes))
+
+"""
+END encode_schedule
+"""
+
+"""
+BEGIN decode_schedule
+ - @param code : Código do DP
+ - @param value : Valor base64 lido do status
+ - @retparms schedule : Dicionário {cabeçalho..., 'nodes': [...]}
+"""
+def decode_schedule(code: str, value: str) -> dict:
+    """Lê o valor de um DP de agendamento (dicionários, como em encode_schedule)"""
+    decoded = _codec(code).decode(value)
+    schedule = decoded._asdict()
+    schedule['nodes'] = [node._asdict() for node in decoded.nodes]
+    return schedule
+
+"""
+END decode_schedule
+"""
+
+"""
+BEGIN _codec
+ - @param code : Código do DP
+ - @retparms codec : RawCodec do DP (ValueError se desconhecido)
+"""
+def _codec(code: str):
+    if code not in SCHEDULE_CODES:
+        raise ValueError(f"DP de agendamento desconhecido: {code} (use {', '.join(SCHEDULE_CODES)})")
+    return CODECS[code]
+
+"""
+END _codec
+"""
+
+"""
+BEGIN _light
+ - @param bright, temp : Brilho e temperatura em %
+ - @param hsv : (h, s %, v %) ou None
+ - @retparms fields : Campos h, s, v, bright, temp do nó
+"""
+def _light(bright: int, temp: int, hsv: tuple) -> dict:
+    if hsv:
+        h, s, v = hsv
+        if not (0 <= h <= 360 and 0 <= s <= 100 and 0 <= v <= 100):
+            raise ValueError(f"Cor fora da faixa (h 0-360, s/v 0-100%): {hsv}")
+        return {'h': h, 's': s, 'v': v, 'bright': 0, 'temp': 0}
+    if not (0 <= bright <= 100 and 0 <= temp <= 100):
+        raise ValueError(f"Brilho/temperatura fora de 0-100%: {bright}, {temp}")
+    return {'h': 0, 's': 0, 'v': 0, 'bright': bright, 'temp': temp}
+
+"""
+END _light
+"""
+
+"""
+BEGIN _minutes
+ - @param text : Horário 'HH:MM'
+ - @retparms minutes : Minutos desde a meia-noite
+"""
+def _minutes(text: str) -> int:
+    try:
+        hour, minute = (int(part) for part in text.split(':'))
+    except ValueError:
+        raise ValueError(f"Horário inválido (use HH:MM): {text!r}") from None
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"Horário inválido (use HH:MM): {text!r}")
+    return hour * 60 + minute
+
+"""
+END _minutes
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
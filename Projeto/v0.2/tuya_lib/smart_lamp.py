@@ -11,6 +11,12 @@ import tinytuya
 import os
 import socket
 
+from .dp_schema import compile_schema
+from .color import SV_MAX, decode_colour, encode_hsv, hex_to_rgb, rgb_to_colour
+from .calibration import NEUTRAL
+from .scene import Scene
+from .schedule import encode_schedule, decode_schedule
+
 
 """
 ===================
@@ -20,19 +26,23 @@ BEGIN Declaração de classes
 
 """
 BEGIN SmartLamp
- - @param device_config : Dicionário com configurações do dispositivo (id, name, key, ip, etc.)
+ - @param device_config : Dicionário ou DeviceRecord com configurações do dispositivo (id, name, key, ip, etc.)
  - @param version : Versão do protocolo Tuya (padrão 3.5)
  - @var/obj config : Configurações do dispositivo
  - @var/obj version : Versão do protocolo Tuya
  - @var/obj device : Instância do BulbDevice do tinytuya
  - @var/obj connected : Status de conexão (True/False)
+ - @var/obj schema : DpSchema compilado do mapping (faixas, enums, escala)
  - @var/obj dp_switch : Data Point para controle liga/desliga
  - @var/obj dp_brightness : Data Point para controle de brilho
  - @var/obj dp_work_mode : Data Point para modo de trabalho
  - @var/obj dp_colour : Data Point para dados de cor
  - @var/obj dp_temperature : Data Point para temperatura da cor
+ - @var/obj state_store : StateStore que recebe as leituras ao vivo (definido por DeviceManager.open_lamp)
+ - @var/obj calibration : Calibration do produto (LUTs de cor e brilho; neutra por padrão)
  - @method connect : Conecta ao dispositivo Tuya
  - @method get_status : Obtém status atual do dispositivo
+ - @method last_known : Último estado conhecido sem acessar a rede (nuvem/snapshot/ao vivo)
  - @method turn_on : Liga a lâmpada
  - @method turn_off : Desliga a lâmpada
  - @method set_brightness : Define brilho da lâmpada (0-100%)
@@ -40,7 +50,16 @@ BEGIN SmartLamp
  - @method set_color_hex : Define cor por código hexadecimal
  - @method set_color_rgb : Define cor por valores RGB
  - @method set_temperature : Define temperatura da cor (0-100%)
+ - @method set_dps : Envia vários DPs brutos em um único comando
+ - @method set_values : Envia vários DPs por código (valores reais/objetos tipados) em um comando
+ - @method get_values : Status decodificado por código (Raw como objetos tipados)
+ - @method set_scene : Envia uma cena nativa (scene_data) em um único comando
+ - @method get_scene : Lê a cena atual da lâmpada
+ - @method set_countdown : Inverte o estado da lâmpada depois de N segundos (na lâmpada)
+ - @method set_schedule : Grava agendamentos nativos (despertar, dormir, ciclo, aleatório)
+ - @method get_schedule : Lê os agendamentos nativos de um DP
  - @method get_info : Retorna informações formatadas da lâmpada
+ - @method apply_config_change : Aplica campos alterados da configuração (recarga a quente)
  - @retparms : Instância da classe SmartLamp
 """
 class SmartLamp:
@@ -59,12 +78,58 @@ class SmartLamp:
         self.device = None
         self.connected = False
 
+        # Esquema compilado do produto (compartilhado entre lâmpadas do mesmo mapping)
+        self.schema = compile_schema(device_config.get('mapping'))
+
         # Extrai DPs importantes
-        self.dp_switch = get_dp_from_mapping(device_config, 'switch_led')
-        self.dp_brightness = get_dp_from_mapping(device_config, 'bright_value')
-        self.dp_work_mode = get_dp_from_mapping(device_config, 'work_mode')
-        self.dp_colour = get_dp_from_mapping(device_config, 'colour_data')
-        self.dp_temperature = get_dp_from_mapping(device_config, 'temp_value')
+        self.dp_switch = self.schema.dp('switch_led')
+        self.dp_brightness = self.schema.dp('bright_value')
+        self.dp_work_mode = self.schema.dp('work_mode')
+        self.dp_colour = self.schema.dp('colour_data')
+        self.dp_temperature = self.schema.dp('temp_value')
+
+        # Último estado conhecido (alimentado por get_status quando houver)
+        self.state_store = None
+
+        # Calibração do produto (DeviceManager.open_lamp define a do calibration.json)
+        self.calibration = NEUTRAL
+
+    def apply_config_change(self, fields: list) -> bool:
+        """
+        Aplica campos alterados em self.config (já atualizado no lugar)
+
+        Mudanças no mapping recompilam o esquema; só mudanças de id, key ou
+        ip derrubam a conexão, que é refeita se a lâmpada estava conectada.
+        Nome, modelo e demais campos não afetam a sessão.
+
+        Args:
+            fields: Campos alterados
+
+        Returns:
+            True se a lâmpada precisou reconectar
+        """
+        if 'mapping' in fields:
+            self.schema = compile_schema(self.config.get('mapping'))
+            self.dp_switch = self.schema.dp('switch_led')
+            self.dp_brightness = self.schema.dp('bright_value')
+            self.dp_work_mode = self.schema.dp('work_mode')
+            self.dp_colour = self.schema.dp('colour_data')
+            self.dp_temperature = self.schema.dp('temp_value')
+
+        if not any(field in fields for field in ('id', 'key', 'ip')):
+            return False
+
+        was_connected = self.connected
+        if self.device:
+            try:
+                self.device.close()
+            except Exception:
+                pass
+        self.device = None
+        self.connected = False
+        if was_connected:
+            self.connect()
+        return True
 
     def connect(self, timeout: int = 5) -> bool:
         """
@@ -136,11 +201,29 @@ class SmartLamp:
             return None
 
         try:
-            return self.device.status()
+            status = self.device.status()
         except Exception as e:
             print(f"Erro ao obter status: {e}")
             return None
 
+        if self.state_store is not None:
+            if status and 'Error' not in status:
+                self.state_store.update(self.config['id'], status.get('dps'), online=True)
+            else:
+                self.state_store.update(self.config['id'], online=False)
+        return status
+
+    def last_known(self) -> dict:
+        """
+        Último estado conhecido, sem acessar a rede
+
+        Returns:
+            Estado {'dps', 'online', 'source', 'updated'} ou None
+        """
+        if self.state_store is None:
+            return None
+        return self.state_store.get(self.config['id'])
+
     def turn_on(self) -> bool:
         """Liga a lâmpada"""
         if not self.connected or not self.device:
@@ -169,7 +252,11 @@ class SmartLamp:
 
     def set_brightness(self, value: int) -> bool:
         """
-        Define o brilho da lâmpada usando porcentagem
+        Define o brilho da lâmpada usando porcentagem, conforme o modo atual
+
+        No modo colour o V do colour_data é reescrito (cor mantida); nos
+        demais o bright_value recebe a porcentagem pela tabela da calibração,
+        voltando ao modo white se preciso. 0% desliga a lâmpada.
 
         Args:
             value: Valor de brilho em porcentagem (0-100)
@@ -183,9 +270,34 @@ class SmartLamp:
 
         print(f"DEBUG: Configurando brilho para {value}%")
 
+        if value == 0:
+            return self.turn_off()
+
         try:
-            # Usa set_brightness_percentage do BulbDevice
-            result = self.device.set_brightness_percentage(value, nowait=False)
+            if 'bright_value' not in self.schema or not self.dp_work_mode:
+                # Sem mapping: set_brightness_percentage do BulbDevice (também segue o modo)
+                result = self.device.set_brightness_percentage(value, nowait=False)
+                print(f"DEBUG: Resultado: {result}")
+                return 'Error' not in str(result)
+
+            status = self.device.status()
+            if not status or 'Error' in status:
+                print(f"✗ Erro ao ler o modo atual: {status}")
+                return False
+            dps = status.get('dps', {})
+            mode = dps.get(self.dp_work_mode)
+
+            if mode == 'colour' and self.dp_colour and dps.get(self.dp_colour):
+                # Mesma cor com o novo V (linear: o V já é percebido pela lâmpada)
+                h, s, _ = decode_colour(dps[self.dp_colour])
+                dps = {self.dp_colour: encode_hsv(h, s, value * SV_MAX // 100)}
+            else:
+                # Porcentagem -> faixa min..max do DP (ex: 10-1000) pela tabela da calibração
+                raw = self.calibration.brightness(self.schema.spec('bright_value'), value)
+                dps = {self.dp_brightness: raw}
+                if mode != 'white':
+                    dps[self.dp_work_mode] = 'white'
+            result = self.device.set_multiple_values(dps, nowait=False)
             print(f"DEBUG: Resultado: {result}")
             return 'Error' not in str(result)
         except Exception as e:
@@ -205,7 +317,8 @@ class SmartLamp:
             print("Dispositivo não conectado!")
             return False
 
-        valid_modes = ['white', 'colour', 'scene', 'music']
+        spec = self.schema.spec('work_mode')
+        valid_modes = spec.range if spec and spec.range else ('white', 'colour', 'scene', 'music')
         if mode not in valid_modes:
             print(f"Modo inválido! Modos válidos: {', '.join(valid_modes)}")
             return False
@@ -213,8 +326,11 @@ class SmartLamp:
         print(f"DEBUG: Mudando para modo '{mode}'")
 
         try:
-            # Usa set_mode do BulbDevice
-            result = self.device.set_mode(mode, nowait=False)
+            if spec:
+                result = self.device.set_value(self.dp_work_mode, mode, nowait=False)
+            else:
+                # Sem mapping: usa set_mode do BulbDevice
+                result = self.device.set_mode(mode, nowait=False)
             print(f"DEBUG: Resultado: {result}")
             return 'Error' not in str(result)
         except Exception as e:
@@ -234,20 +350,13 @@ class SmartLamp:
             print("Dispositivo não conectado!")
             return False
 
-        # Remove '#' se presente
-        hex_color = hex_color.lstrip('#').upper()
-
-        # Valida o formato
-        if len(hex_color) != 6 or not all(c in '0123456789ABCDEFabcdef' for c in hex_color):
-            print("Formato inválido! Use 6 caracteres hexadecimais (ex: FF0000)")
+        # Valida e converte (com ou sem '#'; presets repetidos vêm do cache)
+        try:
+            r, g, b = hex_to_rgb(hex_color)
+        except ValueError as e:
+            print(e)
             return False
 
-        # Converte hexadecimal para RGB
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
-
-        # Usa o método set_colour do BulbDevice
         return self.set_color_rgb(r, g, b)
 
     def set_color_rgb(self, r: int, g: int, b: int) -> bool:
@@ -263,16 +372,21 @@ class SmartLamp:
             print("Dispositivo não conectado!")
             return False
 
-        # Valida valores
-        r = max(0, min(255, r))
-        g = max(0, min(255, g))
-        b = max(0, min(255, b))
-
-        print(f"DEBUG: Enviando cor RGB({r}, {g}, {b}) usando set_colour()")
+        # Valida valores e aplica as LUTs da calibração (gamma e balanço de branco)
+        r, g, b = self.calibration.rgb(max(0, min(255, int(r))), max(0, min(255, int(g))),
+                                       max(0, min(255, int(b))))
 
         try:
-            # Usa o método set_colour do BulbDevice que faz a conversão corretamente
-            result = self.device.set_colour(r, g, b, nowait=False)
+            if self.dp_colour and self.dp_work_mode:
+                # Modo colour + colour_data 'hhhhssssvvvv' em um único comando
+                colour_data = rgb_to_colour(r, g, b)
+                print(f"DEBUG: Enviando cor RGB({r}, {g}, {b}) como colour_data {colour_data}")
+                result = self.device.set_multiple_values(
+                    {self.dp_work_mode: 'colour', self.dp_colour: colour_data}, nowait=False)
+            else:
+                # Sem o DP no mapping: conversão do próprio BulbDevice
+                print(f"DEBUG: Enviando cor RGB({r}, {g}, {b}) usando set_colour()")
+                result = self.device.set_colour(r, g, b, nowait=False)
             print(f"DEBUG: Resultado: {result}")
             return 'Error' not in str(result)
         except Exception as e:
@@ -281,10 +395,126 @@ class SmartLamp:
             traceback.print_exc()
             return False
 
+    def set_dps(self, dps: dict, nowait: bool = False) -> bool:
+        """
+        Envia vários DPs (valores brutos) em um único comando
+
+        Args:
+            dps: DP (texto) -> valor bruto, ex: {'21': 'colour', '24': '000003e803e8'}
+            nowait: Se True, não espera a resposta da lâmpada (efeitos, animações)
+        """
+        if not self.connected or not self.device:
+            print("Dispositivo não conectado!")
+            return False
+
+        try:
+            result = self.device.set_multiple_values(dps, nowait=nowait)
+            return 'Error' not in str(result)
+        except Exception as e:
+            print(f"Erro ao enviar DPs: {e}")
+            return False
+
+    def set_values(self, values: dict, nowait: bool = False) -> bool:
+        """
+        Envia vários DPs por código em um único comando
+
+        Args:
+            values: Código -> valor real, ex: {'power_memory': pm._replace(mode=1),
+                    'switch_gradient': {'on_ms': 500, 'off_ms': 500}}
+            nowait: Se True, não espera a resposta da lâmpada
+        """
+        try:
+            dps = self.schema.encode_many(values)
+        except (KeyError, ValueError) as e:
+            print(f"Valor inválido: {e}")
+            return False
+        return self.set_dps(dps, nowait=nowait)
+
+    def get_values(self) -> dict:
+        """Status decodificado por código (ex: 'power_memory' -> PowerMemory(...)) ou None"""
+        status = self.get_status()
+        if not status or 'Error' in status:
+            return None
+        return self.schema.decode(status.get('dps', {}))
+
+    def set_scene(self, scene) -> bool:
+        """
+        Envia uma cena para a lâmpada executar sozinha (modo scene + scene_data)
+
+        Args:
+            scene: Scene ou texto scene_data já compilado
+        """
+        dp_scene = self.schema.dp('scene_data')
+        if not dp_scene or not self.dp_work_mode:
+            print("Lâmpada sem DP de cena no mapping!")
+            return False
+
+        data = scene.encode() if isinstance(scene, Scene) else scene
+        return self.set_dps({self.dp_work_mode: 'scene', dp_scene: data})
+
+    def get_scene(self) -> Scene:
+        """Cena atual (scene_data do status) ou None"""
+        status = self.get_status()
+        data = (status or {}).get('dps', {}).get(self.schema.dp('scene_data'))
+        try:
+            return Scene.decode(data) if data else None
+        except ValueError as e:
+            print(f"Erro ao ler cena: {e}")
+            return None
+
+    def set_countdown(self, seconds: int) -> bool:
+        """
+        Programa a lâmpada para inverter o estado depois de seconds (0 cancela)
+
+        O temporizador roda na própria lâmpada; o computador pode desligar.
+        """
+        dp_countdown = self.schema.dp('countdown')
+        if not dp_countdown:
+            print("Lâmpada sem DP de countdown no mapping!")
+            return False
+        try:
+            _, raw = self.schema.encode('countdown', int(seconds))
+        except ValueError as e:
+            print(f"Countdown inválido: {e}")
+            return False
+        return self.set_dps({dp_countdown: raw})
+
+    def set_schedule(self, code: str, nodes: list) -> bool:
+        """
+        Grava os agendamentos nativos de um DP (substitui os anteriores)
+
+        Args:
+            code: 'wakeup_mode', 'sleep_mode', 'cycle_timing' ou 'random_timing'
+            nodes: Nós montados com wakeup_node, sleep_node, cycle_node ou random_node
+                   (lista vazia apaga os agendamentos)
+        """
+        dp = self.schema.dp(code)
+        if not dp:
+            print(f"Lâmpada sem DP {code} no mapping!")
+            return False
+        try:
+            value = encode_schedule(code, nodes)
+        except ValueError as e:
+            print(f"Agendamento inválido: {e}")
+            return False
+        return self.set_dps({dp: value})
+
+    def get_schedule(self, code: str) -> dict:
+        """Agendamentos de um DP ({cabeçalho..., 'nodes': [...]}) ou None"""
+        status = self.get_status()
+        value = (status or {}).get('dps', {}).get(self.schema.dp(code))
+        try:
+            return decode_schedule(code, value) if value else None
+        except ValueError as e:
+            print(f"Erro ao ler agendamento: {e}")
+            return None
+
     def set_temperature(self, value: int) -> bool:
         """
         Define a temperatura da cor em modo white (porcentagem)
 
+        Liga a lâmpada e muda para o modo white se ela estiver em outro modo.
+
         Args:
             value: Valor de temperatura em porcentagem (0-100)
                    0% = branco frio (6500K)
@@ -300,8 +530,17 @@ class SmartLamp:
         print(f"DEBUG: Configurando temperatura para {value}%")
 
         try:
-            # Usa set_colourtemp_percentage do BulbDevice
-            result = self.device.set_colourtemp_percentage(value, nowait=False)
+            if 'temp_value' in self.schema:
+                # Como o set_colourtemp do BulbDevice: liga e volta ao modo white no mesmo comando
+                dps = {self.dp_temperature: self.schema.from_percent('temp_value', value)}
+                if self.dp_work_mode:
+                    dps[self.dp_work_mode] = 'white'
+                if self.dp_switch:
+                    dps[self.dp_switch] = True
+                result = self.device.set_multiple_values(dps, nowait=False)
+            else:
+                # Sem mapping: usa set_colourtemp_percentage do BulbDevice
+                result = self.device.set_colourtemp_percentage(value, nowait=False)
             print(f"DEBUG: Resultado: {result}")
             return 'Error' not in str(result)
         except Exception as e:
@@ -389,12 +628,8 @@ BEGIN get_dp_from_mapping
  - @retparms dp : String com o Data Point correspondente ou None se não encontrado
 """
 def get_dp_from_mapping(device: dict, code: str) -> str:
-    """Extrai o DP (Data Point) baseado no código de funcionalidade"""
-    mapping = device.get('mapping', {})
-    for dp, info in mapping.items():
-        if info.get('code') == code:
-            return dp
-    return None
+    """Extrai o DP (Data Point) baseado no código de funcionalidade (via esquema compilado)"""
+    return compile_schema(device.get('mapping')).dp(code)
 
 """
 END get_dp_from_mapping
@@ -0,0 +1,215 @@
+"""
+Módulo de estado conhecido dos dispositivos
+
+Este módulo contém o StateStore, que guarda o último estado conhecido de
+cada dispositivo (DPs, online) para que listas e painéis tenham o que mostrar
+logo na abertura, sem esperar a rede. O estado inicial vem do tuya-raw.json
+(lista status da nuvem, por código, e flag online) e do snapshot.json (DPs
+locais da última descoberta); as consultas ao vivo refinam esse estado à
+medida que chegam. Cada DP guarda sua origem ('cloud', 'snapshot', 'live').
+"""
+
+import os
+import threading
+import time
+
+from .binary_cache import load_json_cached
+from .dp_schema import compile_schema
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN StateStore
+ - @param cloud : CloudDataCache com o tuya-raw.json
+ - @param snapshot_file : Caminho do snapshot.json (padrão: 'snapshot.json')
+ - @param lookup : Função lookup(device_id) -> dispositivo do cadastro (para o mapping), opcional
+ - @var/obj states : ID -> estado {'dps', 'online', 'source', 'updated'}
+ - @var/obj listeners : Funções listener(device_id, estado) chamadas a cada refinamento
+ - @method seed : Carrega o estado inicial da nuvem e do snapshot
+ - @method get : Cópia do estado conhecido de um dispositivo
+ - @method dps : DPs conhecidos de um dispositivo (formato do tinytuya)
+ - @method online : Último online conhecido (None se nunca visto)
+ - @method update : Registra uma consulta ao vivo (DPs e/ou online)
+ - @method subscribe : Registra um listener de refinamentos
+ - @method _merge : Aplica DPs de uma origem se forem mais novos que os atuais
+ - @method _schema : Esquema compilado do dispositivo (cadastro ou registro da nuvem)
+ - @method _snapshot_entries : Entradas do snapshot.json com a data do arquivo
+ - @retparms : Instância da classe StateStore
+"""
+class StateStore:
+    """Último estado conhecido por dispositivo, semeado dos arquivos e refinado ao vivo"""
+
+    def __init__(self, cloud, snapshot_file: str = 'snapshot.json', lookup=None):
+        """
+        Inicializa o armazenamento (os arquivos só são lidos em seed ou na primeira consulta)
+
+        Args:
+            cloud: CloudDataCache com o tuya-raw.json
+            snapshot_file: Caminho do snapshot.json
+            lookup: Função lookup(device_id) que devolve o dispositivo do cadastro
+        """
+        self.cloud = cloud
+        self.snapshot_file = snapshot_file
+        self.lookup = lookup
+        self.states = {}
+        self.listeners = []
+        self._seeded = False
+        self._lock = threading.RLock()
+
+    def seed(self) -> int:
+        """
+        Carrega o estado inicial dos arquivos
+
+        A nuvem vale a data do tuya-raw.json; o snapshot vale o last_seen de
+        cada entrada (ou a data do arquivo). Por DP, vence o mais novo; um
+        valor ao vivo nunca é sobrescrito pelos arquivos.
+
+        Returns:
+            Número de dispositivos com estado conhecido
+        """
+        with self._lock:
+            cloud_time = self.cloud.mtime or 0.0
+            for record in self.cloud.records():
+                device_id = record.get('id')
+                status = record.get('status')
+                if not device_id or not isinstance(status, list):
+                    continue
+                schema = self._schema(device_id, record)
+                dps = {}
+                for item in status:
+                    dp = schema.dp(item.get('code')) if isinstance(item, dict) else None
+                    if dp is not None:
+                        dps[dp] = item.get('value')
+                self._merge(device_id, dps, record.get('online'), 'cloud', cloud_time)
+
+            for entry in self._snapshot_entries():
+                device_id = entry.get('id')
+                dps = entry.get('dps') or {}
+                dps = dps.get('dps', dps) if isinstance(dps, dict) else {}
+                updated = entry.get('last_seen') or entry.get('_file_time', 0.0)
+                self._merge(device_id, {str(k): v for k, v in dps.items()},
+                            entry.get('online'), 'snapshot', updated)
+
+            self._seeded = True
+            return len(self.states)
+
+    def get(self, device_id: str) -> dict:
+        """Cópia do estado conhecido ({'dps', 'online', 'source', 'updated'}) ou None"""
+        with self._lock:
+            if not self._seeded:
+                self.seed()
+            state = self.states.get(device_id)
+            if state is None:
+                return None
+            return dict(state, dps=dict(state['dps']), source=dict(state['source']))
+
+    def dps(self, device_id: str) -> dict:
+        """DPs conhecidos no formato de status() do tinytuya (DP em texto -> valor)"""
+        state = self.get(device_id)
+        return state['dps'] if state else {}
+
+    def online(self, device_id: str):
+        """Último online conhecido: True, False ou None (sem informação)"""
+        state = self.get(device_id)
+        return state['online'] if state else None
+
+    def update(self, device_id: str, dps: dict = None, online: bool = True) -> bool:
+        """
+        Registra o resultado de uma consulta ao vivo
+
+        Args:
+            device_id: ID do dispositivo
+            dps: DPs lidos (status()['dps']), ou None se só o online mudou
+            online: Se o dispositivo respondeu
+
+        Returns:
+            True se algum valor mudou (os listeners foram chamados)
+        """
+        with self._lock:
+            if not self._seeded:
+                self.seed()
+            changed = self._merge(device_id, {str(k): v for k, v in (dps or {}).items()},
+                                  online, 'live', time.time())
+            state = self.get(device_id) if changed else None
+
+        if changed:
+            for listener in list(self.listeners):
+                try:
+                    listener(device_id, state)
+                except Exception as e:
+                    print(f"Erro no listener de estado: {e}")
+        return changed
+
+    def subscribe(self, listener) -> None:
+        """Registra listener(device_id, estado), chamado quando uma consulta muda o estado"""
+        self.listeners.append(listener)
+
+    def _merge(self, device_id: str, dps: dict, online, source: str, updated: float) -> bool:
+        state = self.states.get(device_id)
+        if state is None:
+            state = {'dps': {}, 'online': None, 'source': {}, 'updated': 0.0}
+            self.states[device_id] = state
+
+        changed = False
+        for dp, value in dps.items():
+            current = state['source'].get(dp)
+            # Arquivos não sobrescrevem leitura ao vivo nem um valor mais novo
+            if current == 'live' and source != 'live':
+                continue
+            if dp in state['dps'] and source != 'live' and updated < state['updated']:
+                continue
+            if state['dps'].get(dp) != value or dp not in state['dps']:
+                state['dps'][dp] = value
+                changed = True
+            state['source'][dp] = source
+
+        if online is not None and (source == 'live' or updated >= state['updated']):
+            if state['online'] != online:
+                state['online'] = online
+                changed = True
+        state['updated'] = max(state['updated'], updated)
+        return changed
+
+    def _schema(self, device_id: str, record: dict):
+        device = self.lookup(device_id) if self.lookup else None
+        mapping = (device or {}).get('mapping') or record.get('mapping')
+        return compile_schema(mapping)
+
+    def _snapshot_entries(self) -> list:
+        try:
+            file_time = os.path.getmtime(self.snapshot_file)
+            data = load_json_cached(self.snapshot_file)
+        except (OSError, ValueError):
+            return []
+        entries = data.get('devices', []) if isinstance(data, dict) else []
+        return [dict(e, _file_time=file_time) for e in entries if isinstance(e, dict) and e.get('id')]
+
+"""
+END StateStore
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+# Não há funções fora das classes neste módulo
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,567 @@
+"""
+Módulo de armazenamento do cadastro de dispositivos
+
+Este módulo contém os backends de persistência usados pelo DeviceManager:
+o JsonStorage (devices.json, formato atual) e o SqliteStorage, com tabelas
+indexadas de dispositivos e de esquemas de produto, atualizações
+transacionais de uma linha e modo WAL para leitores concorrentes.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .utils import atomic_write_json
+from .registry import SchemaRegistry
+from .device_record import json_default
+from .binary_cache import BinaryCache
+from .locking import FileLock
+
+
+# Colunas indexadas da tabela devices (o registro completo fica em 'data')
+DEVICE_COLUMNS = ('id', 'name', 'key', 'ip', 'mac', 'uuid', 'model',
+                  'version', 'product_id', 'category')
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN JsonStorage
+ - @param path : Caminho do arquivo JSON (padrão: 'devices.json')
+ - @param compact_every : Nº de registros no diário que força a compactação (padrão: 200)
+ - @param compact_delay : Segundos após a primeira alteração pendente até compactar (padrão: 5)
+ - @param schemas : SchemaRegistry compartilhado (padrão: um registro próprio)
+ - @param use_cache : Se True, usa o cache binário devices.json.cache (padrão: True)
+ - @var/obj path : Caminho do arquivo
+ - @var/obj schemas : Esquemas de produto compartilhados pelos dispositivos carregados
+ - @var/obj cache : BinaryCache do devices.json ou None
+ - @var/obj journal_path : Caminho do diário de alterações (path + '.journal')
+ - @var/obj dirty : IDs alterados desde a última compactação
+ - @var/obj lock : FileLock do cadastro (path + '.lock', com contador de versão)
+ - @var/obj on_merge : Função on_merge(lista) chamada quando uma gravação precisou mesclar
+ - @var/obj on_write : Função on_write() chamada após cada gravação própria (arquivo ou diário)
+ - @method exists : Indica se o arquivo existe
+ - @method load : Carrega a lista de dispositivos e reaplica o diário pendente
+ - @method save : Grava a lista inteira atomicamente (mesclando gravações de outros processos)
+ - @method save_device : Registra a alteração de um dispositivo no diário
+ - @method delete_device : Registra a remoção de um dispositivo no diário
+ - @method flush : Compacta o diário no devices.json (gravação atômica)
+ - @method close : Compacta pendências e cancela o timer e o registro no atexit
+ - @method _append : Acrescenta um registro ao diário (com fsync) e arma o timer de compactação
+ - @method _maybe_compact : Compacta quando o diário ou o atraso passam do limite
+ - @method _compact_due : Compactação disparada pelo timer (compact_delay sem nova gravação)
+ - @method _cancel_timer : Cancela o timer de compactação pendente
+ - @method _state : Versão da trava e mtime/tamanho do arquivo (detecta gravações alheias)
+ - @method _merge : Aplica as alterações deste processo sobre o arquivo gravado por outro
+ - @retparms : Instância da classe JsonStorage
+"""
+class JsonStorage:
+    """Backend JSON: o formato devices.json gerado pelo wizard do tinytuya"""
+
+    def __init__(self, path: str = 'devices.json', compact_every: int = 200,
+                 compact_delay: float = 5, schemas: SchemaRegistry = None,
+                 use_cache: bool = True):
+        """
+        Inicializa o backend
+
+        Cada alteração individual vira uma linha no diário (append + fsync,
+        barato); o devices.json só é regravado, de forma atômica, quando o
+        diário é compactado. Rajadas de edições viram uma única regravação.
+
+        Args:
+            path: Caminho do arquivo devices.json
+            compact_every: Registros no diário que forçam a compactação
+            compact_delay: Atraso máximo (s) entre a primeira pendência e a compactação
+            schemas: Registro de esquemas de produto
+            use_cache: Lê/grava o cache binário ao lado do JSON (inicialização rápida)
+        """
+        self.path = path
+        self.schemas = schemas if schemas is not None else SchemaRegistry()
+        self.cache = BinaryCache(path) if use_cache else None
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        self.compact_delay = compact_delay
+        self.dirty = set()
+        self.lock = FileLock(path + '.lock')
+        self.on_merge = None
+        self.on_write = None
+        self._disk_state = None
+        self._devices = None
+        self._journal_size = 0
+        self._pending_since = None
+        # Timer da compactação atrasada; o timer e o processo principal gravam sob _mutex
+        self._timer = None
+        self._mutex = threading.RLock()
+        self._atexit = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) or os.path.exists(self.journal_path)
+
+    def load(self) -> list:
+        """Carrega a lista de dispositivos e reaplica o diário de uma execução interrompida"""
+        devices = []
+        cached = False
+        with self.lock.shared():
+            if os.path.exists(self.path):
+                if self.cache is not None:
+                    # Cache binário válido = sem reinterpretar o JSON
+                    devices = self.cache.load()
+                    cached = self.cache.last_hit
+                if not cached:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        devices = json.load(f)
+            replayed = _replay_journal(self.journal_path, devices)
+            self._disk_state = self._state()
+
+        # Uma cópia do mapping por produto; as duplicatas lidas do arquivo são liberadas
+        self.schemas.intern_devices(devices)
+        self._devices = devices
+        if replayed:
+            # Diário de uma execução interrompida: incorpora ao arquivo agora
+            self.save(devices)
+        elif self.cache is not None and not cached and os.path.exists(self.path):
+            # Gravado depois do intern: o cache guarda um mapping por produto
+            self.cache.save(devices)
+        return devices
+
+    def save(self, devices: list, changed=None) -> list:
+        """
+        Grava a lista inteira atomicamente e descarta o diário
+
+        Tudo acontece sob a trava exclusiva. Se outro processo gravou desde a
+        última leitura (versão da trava ou mtime/tamanho diferentes), as
+        alterações deste processo são aplicadas sobre o arquivo atual em vez
+        de sobrescrevê-lo.
+
+        Args:
+            devices: Lista de dispositivos deste processo
+            changed: IDs alterados por este processo (None = todos os da lista)
+
+        Returns:
+            Lista mesclada gravada, ou None se não houve gravação concorrente
+        """
+        merged = None
+        with self._mutex, self.lock.exclusive():
+            self._cancel_timer()
+            content = devices
+            if (self._disk_state is not None and os.path.exists(self.path)
+                    and self._state() != self._disk_state):
+                if changed is not None:
+                    changed = set(changed) | self.dirty
+                merged = content = self._merge(devices, changed)
+                print(f"⚠️  {os.path.basename(self.path)} foi alterado por outro processo: "
+                      f"alterações mescladas")
+            atomic_write_json(self.path, content)
+            self.lock.bump()
+            self._disk_state = self._state()
+            if self.cache is not None:
+                self.cache.save([d if type(d) is dict else dict(d) for d in content])
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._devices = devices
+            self.dirty.clear()
+            self._journal_size = 0
+            self._pending_since = None
+
+        if self.on_write:
+            self.on_write()
+        if merged is not None and self.on_merge:
+            self.on_merge(merged)
+        return merged
+
+    def save_device(self, device: dict, devices: list) -> None:
+        """Registra a inclusão/alteração de um dispositivo no diário"""
+        self._devices = devices
+        self._append({'op': 'put', 'device': device})
+        self.dirty.add(device['id'])
+        self._maybe_compact()
+
+    def delete_device(self, device_id: str, devices: list) -> None:
+        """Registra a remoção de um dispositivo no diário"""
+        self._devices = devices
+        self._append({'op': 'del', 'id': device_id})
+        self.dirty.add(device_id)
+        self._maybe_compact()
+
+    def flush(self) -> None:
+        """Compacta as alterações pendentes em uma única regravação atômica"""
+        # save() fora do _mutex: on_merge (que trava o DeviceManager) nunca roda com ele adquirido
+        with self._mutex:
+            devices = self._devices if self._journal_size else None
+        if devices is not None:
+            self.save(devices, changed=self.dirty)
+
+    def close(self) -> None:
+        self.flush()
+        with self._mutex:
+            self._cancel_timer()
+        if self._atexit:
+            atexit.unregister(self.flush)
+            self._atexit = False
+
+    def _append(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=json_default) + '\n'
+        with self._mutex, self.lock.exclusive():
+            stale = self._state() != self._disk_state
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            # O diário também é estado compartilhado: outros processos precisam ver a versão mudar
+            self.lock.bump()
+            if not stale:
+                self._disk_state = self._state()
+            self._journal_size += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if self._timer is None:
+                # Sem novas gravações o diário ainda é compactado após compact_delay
+                self._timer = threading.Timer(self.compact_delay, self._compact_due)
+                self._timer.daemon = True
+                self._timer.start()
+        if not self._atexit:
+            # Uma vez por instância, e só se houver diário para compactar na saída
+            atexit.register(self.flush)
+            self._atexit = True
+        if self.on_write:
+            self.on_write()
+
+    def _maybe_compact(self) -> None:
+        if (self._journal_size >= self.compact_every or
+                time.monotonic() - self._pending_since >= self.compact_delay):
+            self.flush()
+
+    def _compact_due(self) -> None:
+        with self._mutex:
+            if self._timer is None or self._timer is not threading.current_thread():
+                return  # Cancelado (ou substituído) enquanto esperava a trava
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"⚠️  Erro ao compactar {os.path.basename(self.path)}: {e}")
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _state(self) -> tuple:
+        """Versão da trava e (mtime_ns, tamanho) do arquivo; ler com a trava adquirida"""
+        try:
+            stat = os.stat(self.path)
+            file_state = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            file_state = None
+        return self.lock.version(), file_state
+
+    def _merge(self, devices: list, changed) -> list:
+        """
+        Aplica as alterações deste processo sobre o arquivo atual (granularidade: dispositivo)
+
+        Dispositivos em changed vêm desta lista (ou são removidos, se não
+        estiverem nela); os demais ficam como o outro processo gravou.
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            disk = json.load(f)
+        # Entradas do diário de outros processos ainda não compactadas também contam
+        _replay_journal(self.journal_path, disk)
+
+        ours = {d['id']: d for d in devices if d.get('id')}
+        if changed is None:
+            changed = set(ours)
+
+        merged = []
+        seen = set()
+        for device in disk:
+            device_id = device.get('id')
+            if device_id in changed:
+                seen.add(device_id)
+                if device_id in ours:
+                    merged.append(ours[device_id])
+            else:
+                merged.append(device)
+        merged.extend(d for i, d in ours.items() if i in changed and i not in seen)
+        self.schemas.intern_devices(merged)
+        return merged
+
+"""
+END JsonStorage
+"""
+
+"""
+BEGIN SqliteStorage
+ - @param path : Caminho do banco SQLite (padrão: 'devices.db')
+ - @param schemas : SchemaRegistry compartilhado (padrão: um registro próprio)
+ - @var/obj path : Caminho do banco
+ - @var/obj conn : Conexão sqlite3 (modo WAL)
+ - @var/obj schemas : Esquemas de produto (lidos da tabela products sob demanda)
+ - @var/obj on_write : Função on_write() chamada após cada transação de gravação
+ - @method exists : Indica se o banco tem dispositivos
+ - @method load : Carrega os dispositivos no formato do devices.json
+ - @method save : Sincroniza a lista inteira em uma transação
+ - @method save_device : Insere/atualiza uma única linha em uma transação
+ - @method delete_device : Remove uma única linha em uma transação
+ - @method import_json : Importa um devices.json para o banco (substitui o conteúdo)
+ - @method export_json : Exporta o banco para o formato devices.json
+ - @method flush : Aplica o WAL no arquivo principal (antes de copiar o banco)
+ - @method close : Fecha a conexão
+ - @method _upsert : Grava dispositivo e esquema de produto (sem commit)
+ - @retparms : Instância da classe SqliteStorage
+"""
+class SqliteStorage:
+    """Backend SQLite com tabelas indexadas de dispositivos e de esquemas de produto"""
+
+    def __init__(self, path: str = 'devices.db', schemas: SchemaRegistry = None):
+        """
+        Abre (ou cria) o banco
+
+        Args:
+            path: Caminho do arquivo SQLite
+            schemas: Registro de esquemas de produto
+        """
+        self.path = path
+        self.schemas = schemas if schemas is not None else SchemaRegistry()
+        self.on_write = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS products (
+                product_id   TEXT PRIMARY KEY,
+                product_name TEXT,
+                category     TEXT,
+                mapping      TEXT
+            );
+            CREATE TABLE IF NOT EXISTS devices (
+                id         TEXT PRIMARY KEY,
+                position   INTEGER NOT NULL,
+                name       TEXT,
+                key        TEXT,
+                ip         TEXT,
+                mac        TEXT,
+                uuid       TEXT,
+                model      TEXT,
+                version    TEXT,
+                product_id TEXT REFERENCES products(product_id),
+                category   TEXT,
+                data       TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_devices_name ON devices(name);
+            CREATE INDEX IF NOT EXISTS idx_devices_mac ON devices(mac);
+            CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices(ip);
+            CREATE INDEX IF NOT EXISTS idx_devices_product ON devices(product_id);
+            CREATE INDEX IF NOT EXISTS idx_devices_category ON devices(category);
+        """)
+        self.conn.commit()
+
+    def exists(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM devices LIMIT 1").fetchone() is not None
+
+    def load(self) -> list:
+        """Carrega os dispositivos na ordem de cadastro, no formato do devices.json"""
+        # Os esquemas ficam em texto e só são lidos para produtos que têm dispositivos
+        for product_id, mapping in self.conn.execute("SELECT product_id, mapping FROM products"):
+            if product_id not in self.schemas:
+                self.schemas.add_raw(product_id, mapping)
+
+        devices = []
+        for product_id, data in self.conn.execute(
+                "SELECT product_id, data FROM devices ORDER BY position"):
+            device = json.loads(data)
+            # Mapeamento ausente em 'data' = igual ao esquema do produto (compartilhado)
+            if 'mapping' in device and device['mapping'] is None:
+                device['mapping'] = self.schemas.get(product_id)
+            devices.append(device)
+        return devices
+
+    def save(self, devices: list, changed=None) -> None:
+        """
+        Sincroniza a lista inteira (upsert de todos + remoção dos ausentes) em uma transação
+
+        changed é aceito por compatibilidade com o JsonStorage; o SQLite já
+        isola processos concorrentes com as próprias transações.
+        """
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_ids (id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep_ids")
+            products = {}
+            for position, device in enumerate(devices):
+                self._upsert(device, position, products)
+                self.conn.execute("INSERT OR IGNORE INTO keep_ids VALUES (?)", (device['id'],))
+            self.conn.execute("DELETE FROM devices WHERE id NOT IN (SELECT id FROM keep_ids)")
+        if self.on_write:
+            self.on_write()
+
+    def save_device(self, device: dict, devices: list = None) -> None:
+        """Insere/atualiza uma única linha (a posição é preservada ou vai para o fim)"""
+        with self.conn:
+            row = self.conn.execute("SELECT position FROM devices WHERE id = ?",
+                                    (device['id'],)).fetchone()
+            if row:
+                position = row[0]
+            else:
+                position = self.conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM devices").fetchone()[0]
+            self._upsert(device, position, {})
+        if self.on_write:
+            self.on_write()
+
+    def delete_device(self, device_id: str, devices: list = None) -> None:
+        """Remove uma única linha"""
+        with self.conn:
+            self.conn.execute("DELETE FROM devices WHERE id = ?", (device_id,))
+        if self.on_write:
+            self.on_write()
+
+    def import_json(self, json_path: str) -> int:
+        """
+        Importa um devices.json, substituindo o conteúdo do banco
+
+        Returns:
+            Número de dispositivos importados
+        """
+        # Leitura direta: sem .cache/.lock ao lado de um arquivo qualquer do usuário
+        with open(json_path, 'r', encoding='utf-8') as f:
+            devices = json.load(f)
+        if not isinstance(devices, list):
+            raise ValueError(f"{json_path}: esperada uma lista de dispositivos")
+        self.schemas.intern_devices(devices)
+        self.save(devices)
+        return len(devices)
+
+    def export_json(self, json_path: str) -> int:
+        """
+        Exporta o banco para um arquivo no formato devices.json
+
+        Returns:
+            Número de dispositivos exportados
+        """
+        devices = self.load()
+        atomic_write_json(json_path, devices)
+        return len(devices)
+
+    def flush(self) -> None:
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _upsert(self, device: dict, position: int, products: dict) -> None:
+        """Grava o esquema do produto (uma vez por product_id) e a linha do dispositivo"""
+        data = dict(device)
+        product_id = device.get('product_id')
+        mapping = device.get('mapping')
+
+        if product_id and mapping is not None:
+            if product_id not in products:
+                row = self.conn.execute("SELECT mapping FROM products WHERE product_id = ?",
+                                        (product_id,)).fetchone()
+                products[product_id] = json.loads(row[0]) if row and row[0] else None
+                if products[product_id] is None:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+                        (product_id, device.get('product_name'), device.get('category'),
+                         json.dumps(mapping, ensure_ascii=False))
+                    )
+                    products[product_id] = mapping
+            if products[product_id] == mapping:
+                data['mapping'] = None  # Referência ao esquema compartilhado
+
+        values = [device.get(c) for c in DEVICE_COLUMNS]
+        values.insert(1, position)
+        values.append(json.dumps(data, ensure_ascii=False))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO devices "
+            "(id, position, name, key, ip, mac, uuid, model, version, product_id, category, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            values
+        )
+
+"""
+END SqliteStorage
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN _replay_journal
+ - @param journal_path : Caminho do diário de alterações
+ - @param devices : Lista de dispositivos (alterada no lugar)
+ - @retparms replayed : Número de registros reaplicados
+"""
+def _replay_journal(journal_path: str, devices: list) -> int:
+    """Reaplica put/del do diário; uma última linha incompleta (queda no meio) é ignorada"""
+    if not os.path.exists(journal_path):
+        return 0
+
+    positions = {d.get('id'): i for i, d in enumerate(devices)}
+    replayed = 0
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record.get('op') == 'put':
+                device = record['device']
+                if device['id'] in positions:
+                    devices[positions[device['id']]] = device
+                else:
+                    positions[device['id']] = len(devices)
+                    devices.append(device)
+            elif record.get('op') == 'del' and record.get('id') in positions:
+                devices[positions.pop(record['id'])] = None
+            replayed += 1
+
+    devices[:] = [d for d in devices if d is not None]
+    return replayed
+
+"""
+END _replay_journal
+"""
+
+"""
+BEGIN open_storage
+ - @param path : Caminho do cadastro
+ - @param backend : 'json', 'sqlite' ou None (deduz pela extensão .db/.sqlite)
+ - @param schemas : SchemaRegistry compartilhado (opcional)
+ - @retparms storage : Instância de JsonStorage ou SqliteStorage
+"""
+def open_storage(path: str, backend: str = None, schemas: SchemaRegistry = None):
+    """Escolhe o backend de armazenamento do cadastro"""
+    if backend is None:
+        backend = 'sqlite' if path.endswith(('.db', '.sqlite', '.sqlite3')) else 'json'
+    if backend == 'sqlite':
+        return SqliteStorage(path, schemas=schemas)
+    if backend == 'json':
+        return JsonStorage(path, schemas=schemas)
+    raise ValueError(f"Backend desconhecido: {backend}")
+
+"""
+END open_storage
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -5,7 +5,13 @@ Este módulo contém funções auxiliares para formatação de status,
 limpeza de tela e outras operações comuns.
 """
 
+import json
 import os
+import tempfile
+from datetime import datetime
+
+from .device_record import json_default
+from .color import colour_to_rgb, decode_colour, rgb_to_hex
 
 
 """
@@ -47,62 +53,58 @@ BEGIN format_status_readable
  - @retparms status_text : String formatada com informações do status da lâmpada
 """
 def format_status_readable(lamp) -> str:
-    """Formata o status da lâmpada de forma legível"""
-    status = lamp.get_status()
-
-    if not status:
-        return "❌ Erro ao obter status da lâmpada"
-
-    if 'Error' in str(status):
-        return f"❌ Erro: {status}"
-
-    # Extrai informações do status
-    state_data = {}
-    if 'dps' in status:
-        for dp, value in status['dps'].items():
-            state_data[dp] = value
-
-    # Mapeia os DPs para informações legíveis
-    is_on = state_data.get(lamp.dp_switch, False)
-    brightness = state_data.get(lamp.dp_brightness, 0)
-    mode = state_data.get(lamp.dp_work_mode, 'Desconhecido')
-    temperature = state_data.get(lamp.dp_temperature, 0)
-    colour_data = state_data.get(lamp.dp_colour, '')
-
-    # Converte para porcentagem se necessário
-    if brightness and lamp.device and hasattr(lamp.device, 'dpset'):
-        if lamp.device.dpset.get('value_max'):
-            brightness_pct = int((brightness / lamp.device.dpset['value_max']) * 100)
-        else:
-            brightness_pct = brightness
-    else:
-        brightness_pct = brightness
+    """
+    Formata o status da lâmpada de forma legível
 
-    if temperature and lamp.device and hasattr(lamp.device, 'dpset'):
-        if lamp.device.dpset.get('value_max'):
-            temperature_pct = int((temperature / lamp.device.dpset['value_max']) * 100)
-        else:
-            temperature_pct = temperature
+    Sem resposta da lâmpada, mostra o último estado conhecido (nuvem,
+    snapshot ou última leitura) quando houver, indicando origem e horário.
+    """
+    status = lamp.get_status()
+    known_line = ""
+
+    if not status or 'Error' in str(status):
+        known = lamp.last_known() if hasattr(lamp, 'last_known') else None
+        if not known or not known['dps']:
+            return f"❌ Erro: {status}" if status else "❌ Erro ao obter status da lâmpada"
+        origins = {'cloud': 'nuvem', 'snapshot': 'snapshot', 'live': 'última leitura'}
+        origin = ', '.join(sorted({origins.get(o, o) for o in known['source'].values()}))
+        when = datetime.fromtimestamp(known['updated']).strftime('%d/%m %H:%M')
+        known_line = f"│ ⚠️  Último estado conhecido ({origin}, {when})\n"
+        status = {'dps': known['dps']}
+
+    # Decodifica os DPs pelo esquema compilado da lâmpada (code -> valor real)
+    state_data = lamp.schema.decode(status.get('dps', {}))
+
+    is_on = state_data.get('switch_led', False)
+    mode = state_data.get('work_mode', 'Desconhecido')
+    colour_data = state_data.get('colour_data', '')
+
+    # Porcentagem da faixa min..max de cada DP (ex: brilho 10-1000); o brilho
+    # segue a curva da calibração (inverso de set_brightness)
+    calibration = getattr(lamp, 'calibration', None)
+    spec = lamp.schema.spec('bright_value')
+    if calibration is not None and spec is not None and spec.min is not None and spec.max is not None:
+        brightness_pct = calibration.brightness_percent(spec, state_data.get('bright_value', 0))
     else:
-        temperature_pct = temperature
+        brightness_pct = lamp.schema.to_percent('bright_value', state_data.get('bright_value', 0))
+    temperature_pct = lamp.schema.to_percent('temp_value', state_data.get('temp_value', 0))
 
     # Extrai cor em formato legível (se disponível)
     color_display = "N/A"
     if colour_data:
         try:
-            # colour_data geralmente vem como string "rrggbbhhhssvv"
-            if isinstance(colour_data, str) and len(colour_data) >= 6:
-                hex_color = colour_data[:6].upper()
-                color_display = f"#{hex_color}"
-        except:
-            color_display = str(colour_data)[:20]  # Limita a 20 caracteres
+            # colour_data vem como 'hhhhssssvvvv' (HSV em hexadecimal)
+            h, s, v = decode_colour(colour_data)
+            color_display = f"#{rgb_to_hex(*colour_to_rgb(colour_data))} (H {h}°, S {s // 10}%, V {v // 10}%)"
+        except ValueError:
+            color_display = str(colour_data)[:20]  # Formato desconhecido: limita a 20 caracteres
 
     # Monta o status formatado
     status_text = f"""
 ┌─────────────────────────────────────┐
 │          STATUS DA LÂMPADA          │
 ├─────────────────────────────────────┤
-│ Ligada: {'✓ Sim' if is_on else '✗ Não'}
+{known_line}│ Ligada: {'✓ Sim' if is_on else '✗ Não'}
 │ Modo: {mode}
 │ Brilho: {brightness_pct}%
 │ Temperatura: {temperature_pct}%
@@ -163,6 +165,48 @@ def is_lamp_online(device_config: dict, timeout: int = 3) -> bool:
 END is_lamp_online
 """
 
+"""
+BEGIN atomic_write_json
+ - @param path : Caminho do arquivo JSON de destino
+ - @param data : Objeto serializável em JSON
+ - @param indent : Indentação do JSON (padrão: 4, como o tinytuya)
+ - @retparms : None (o arquivo é substituído atomicamente)
+"""
+def atomic_write_json(path: str, data, indent: int = 4) -> None:
+    """
+    Grava JSON em um temporário no mesmo diretório, faz fsync e renomeia
+
+    Se o processo morrer no meio da gravação, o arquivo original continua
+    intacto: o os.replace só acontece depois que o conteúdo está no disco.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False, default=json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Garante que a renomeação também chegou ao disco (não suportado no Windows)
+    if os.name != 'nt':
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+"""
+END atomic_write_json
+"""
+
 """
 ===================
 END Declaração de funções
@@ -0,0 +1,291 @@
+"""
+Módulo de observação de arquivos
+
+Este módulo contém o FileWatcher, que acompanha um arquivo (ex:
+devices.json) em uma thread de fundo usando inotify no Linux (via ctypes,
+observando o diretório para pegar também substituições atômicas) ou, nos
+demais sistemas, consulta periódica de os.stat, junto com arquivos
+companheiros no mesmo diretório (ex: o diário devices.json.journal). O
+callback só é chamado quando o SHA-256 do conteúdo mudou. Também contém
+diff_devices, que compara duas listas de dispositivos por ID.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import threading
+
+
+# Eventos do inotify usados (ver inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# Cabeçalho de cada evento lido do descritor do inotify
+_EVENT = struct.Struct('iIII')
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN FileWatcher
+ - @param path : Arquivo observado
+ - @param callback : Função callback(path) chamada quando o conteúdo muda
+ - @param interval : Intervalo da consulta por stat em segundos (padrão: 1.0)
+ - @param use_inotify : Se True, tenta usar inotify antes da consulta por stat (padrão: True)
+ - @param companions : Outros arquivos do mesmo diretório observados junto (padrão: nenhum)
+ - @var/obj path : Arquivo observado
+ - @var/obj paths : Arquivo observado e companheiros
+ - @var/obj backend : 'inotify' ou 'stat' (definido em start)
+ - @method start : Inicia a thread de observação
+ - @method stop : Encerra a thread
+ - @method acknowledge : Registra o conteúdo atual como já conhecido (gravação própria)
+ - @method check : Verifica o arquivo agora e chama o callback se o conteúdo mudou
+ - @retparms : Instância da classe FileWatcher
+"""
+class FileWatcher:
+    """Observa um arquivo e avisa quando o conteúdo (hash) muda"""
+
+    def __init__(self, path: str, callback, interval: float = 1.0, use_inotify: bool = True,
+                 companions: tuple = ()):
+        """
+        Inicializa o observador (a thread só começa em start)
+
+        Args:
+            path: Arquivo observado
+            callback: Função callback(path) chamada na mudança de conteúdo
+            interval: Intervalo da consulta por stat (e timeout do inotify)
+            use_inotify: Tenta usar inotify no Linux
+            companions: Arquivos do mesmo diretório cuja mudança também chama o callback
+        """
+        self.path = os.path.abspath(path)
+        self.paths = (self.path,) + tuple(os.path.abspath(p) for p in companions)
+        self.callback = callback
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self.backend = None
+        self._stat = None
+        self._digest = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Inicia a observação em uma thread daemon"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.acknowledge()
+        self._stop.clear()
+        fd = _inotify_open(os.path.dirname(self.path)) if self.use_inotify else None
+        self.backend = 'inotify' if fd is not None else 'stat'
+        self._thread = threading.Thread(target=self._run, args=(fd,),
+                                        name=f"watch:{os.path.basename(self.path)}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Encerra a observação"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.interval + 1)
+            self._thread = None
+
+    def acknowledge(self) -> None:
+        """Registra o conteúdo atual como conhecido (não dispara o callback)"""
+        with self._lock:
+            self._stat = tuple(_stat_key(p) for p in self.paths)
+            self._digest = tuple(_digest(p) for p in self.paths)
+
+    def check(self) -> bool:
+        """
+        Verifica o arquivo agora
+
+        O stat (mtime, tamanho, inode) filtra as consultas; o hash só é
+        calculado quando ele mudou, e o callback só roda se o hash mudou.
+
+        Returns:
+            True se o conteúdo mudou (e o callback foi chamado)
+        """
+        with self._lock:
+            stat = tuple(_stat_key(p) for p in self.paths)
+            if stat == self._stat:
+                return False
+            self._stat = stat
+            digest = tuple(_digest(p) for p in self.paths)
+            if digest == self._digest:
+                return False
+            self._digest = digest
+
+        if any(d is not None for d in digest):
+            try:
+                self.callback(self.path)
+            except Exception as e:
+                print(f"Erro ao recarregar {os.path.basename(self.path)}: {e}")
+        return True
+
+    def _run(self, fd) -> None:
+        names = {os.path.basename(p).encode() for p in self.paths}
+        try:
+            while not self._stop.is_set():
+                if fd is None:
+                    self._stop.wait(self.interval)
+                    self.check()
+                    continue
+                ready, _, _ = select.select([fd], [], [], self.interval)
+                if ready and names & _inotify_names(fd):
+                    # Agrupa a rajada de eventos de uma mesma gravação
+                    self._stop.wait(0.05)
+                    _inotify_names(fd)
+                    self.check()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+"""
+END FileWatcher
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN diff_devices
+ - @param old : Lista de dispositivos atual
+ - @param new : Lista de dispositivos lida do arquivo
+ - @retparms diff : Dicionário com added (IDs), removed (IDs) e changed (id -> campos)
+"""
+def diff_devices(old: list, new: list) -> dict:
+    """Diferença por ID entre duas listas de dispositivos (O(n + m))"""
+    old_by_id = {d.get('id'): d for d in old if d.get('id')}
+    diff = {'added': [], 'removed': [], 'changed': {}}
+    seen = set()
+    for device in new:
+        device_id = device.get('id')
+        if not device_id:
+            continue
+        seen.add(device_id)
+        current = old_by_id.get(device_id)
+        if current is None:
+            diff['added'].append(device_id)
+            continue
+        fields = [f for f in device.keys() | current.keys() if current.get(f) != device.get(f)]
+        if fields:
+            diff['changed'][device_id] = sorted(fields)
+    diff['removed'] = [i for i in old_by_id if i not in seen]
+    return diff
+
+"""
+END diff_devices
+"""
+
+"""
+BEGIN _stat_key
+ - @param path : Caminho do arquivo
+ - @retparms key : Tupla (mtime_ns, tamanho, inode) ou None se o arquivo não existe
+"""
+def _stat_key(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+"""
+END _stat_key
+"""
+
+"""
+BEGIN _digest
+ - @param path : Caminho do arquivo
+ - @retparms digest : SHA-256 do conteúdo ou None se o arquivo não existe
+"""
+def _digest(path: str):
+    try:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha.digest()
+    except OSError:
+        return None
+
+"""
+END _digest
+"""
+
+"""
+BEGIN _inotify_open
+ - @param directory : Diretório observado
+ - @retparms fd : Descritor do inotify ou None (não é Linux ou a libc não tem inotify)
+"""
+def _inotify_open(directory: str):
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        # O diretório, não o arquivo: substituições atômicas trocam o inode
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(fd, os.fsencode(directory or '.'), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+"""
+END _inotify_open
+"""
+
+"""
+BEGIN _inotify_names
+ - @param fd : Descritor do inotify
+ - @retparms names : Conjunto com os nomes de arquivo dos eventos pendentes
+"""
+def _inotify_names(fd: int) -> set:
+    names = set()
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return names
+        if not data:
+            return names
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            names.add(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+"""
+END _inotify_names
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""
@@ -0,0 +1,229 @@
+"""
+Módulo do wizard em processo
+
+Este módulo executa no próprio processo o que `python -m tinytuya wizard`
+faz via subprocess: consulta a Cloud API da Tuya, baixa os mapeamentos de
+DPs e localiza os IPs na rede local, sem interação com o usuário e sem
+ler ou escrever arquivos. O resultado fica em memória para quem chamou.
+"""
+
+import time
+from datetime import datetime
+import tinytuya
+
+from .scanner import NetworkScanner, local_subnets, subnets_from_devices
+
+
+# Campos de credenciais do tinytuya.json
+CREDENTIAL_FIELDS = ('apiKey', 'apiSecret', 'apiRegion', 'apiDeviceID')
+
+
+"""
+===================
+BEGIN Declaração de classes
+===================
+"""
+
+"""
+BEGIN WizardError
+ - @retparms : Exceção levantada quando a Cloud API recusa a operação
+"""
+class WizardError(Exception):
+    """Erro retornado pela Cloud API durante o wizard"""
+
+"""
+END WizardError
+"""
+
+"""
+BEGIN InProcessWizard
+ - @param credentials : Dicionário com apiKey, apiSecret, apiRegion e apiDeviceID
+ - @param old_devices : Dispositivos já cadastrados (preserva IP/versão e ajuda a achar um Device ID)
+ - @param scan : Se True, localiza os IPs na rede local (padrão: True)
+ - @param include_map : Se True, baixa os mapeamentos de DPs (padrão: True)
+ - @param subnets : Sub-redes varridas na localização dos IPs (padrão: conhecidas + local)
+ - @var/obj credentials : Credenciais já limpas (sem espaços)
+ - @method run : Executa o wizard e retorna o resultado em memória
+ - @method _resolve_device_id : Obtém um Device ID válido quando apiDeviceID é 'scan'
+ - @method _locate : Preenche IP/versão dos dispositivos a partir da rede e do cadastro
+ - @method _scan : Varredura da rede com erros convertidos em WizardError
+ - @retparms : Instância da classe InProcessWizard
+"""
+class InProcessWizard:
+    """Wizard do tinytuya sem subprocess e sem E/S de arquivos"""
+
+    def __init__(self, credentials: dict, old_devices: list = None, scan: bool = True,
+                 include_map: bool = True, subnets: list = None):
+        """
+        Inicializa o wizard
+
+        Args:
+            credentials: Credenciais da Cloud API (formato do tinytuya.json)
+            old_devices: Dispositivos já cadastrados
+            scan: Se True, localiza os IPs na rede local
+            include_map: Se True, baixa os mapeamentos de DPs
+            subnets: Sub-redes a varrer
+        """
+        self.credentials = clean_credentials(credentials)
+        self.old_devices = old_devices or []
+        self.scan = scan
+        self.include_map = include_map
+        self.subnets = subnets
+
+    def run(self) -> dict:
+        """
+        Executa o wizard
+
+        Returns:
+            Dicionário com 'credentials', 'devices' (formato devices.json),
+            'raw' (formato tuya-raw.json), 'located' (nº de IPs encontrados)
+            e 'elapsed' (segundos)
+
+        Raises:
+            WizardError: Se a Cloud API retornar erro
+        """
+        start = time.monotonic()
+        missing = [k for k in CREDENTIAL_FIELDS[:3] if not self.credentials.get(k)]
+        if missing:
+            raise WizardError(f"Credenciais ausentes: {', '.join(missing)}")
+
+        config = dict(self.credentials)
+        config['apiDeviceID'] = self._resolve_device_id()
+
+        cloud = tinytuya.Cloud(**config)
+        if cloud.error:
+            raise WizardError(_cloud_error(cloud.error))
+
+        devices = cloud.getdevices(False, oldlist=self.old_devices, include_map=self.include_map)
+        if not isinstance(devices, list):
+            raise WizardError(_cloud_error(devices))
+
+        raw = dict(cloud.getdevices_raw or {})
+        raw['file'] = {
+            'name': 'tuya-raw.json',
+            'description': 'Full raw list of Tuya devices.',
+            'account': cloud.apiKey,
+            'date': datetime.now().isoformat(),
+            'tinytuya': tinytuya.version,
+        }
+
+        located = self._locate(devices)
+        return {
+            'credentials': config,
+            'devices': devices,
+            'raw': raw,
+            'located': located,
+            'elapsed': time.monotonic() - start,
+        }
+
+    def _resolve_device_id(self) -> str:
+        """Usa o apiDeviceID configurado, um ID já cadastrado ou o primeiro broadcast"""
+        device_id = self.credentials.get('apiDeviceID', '')
+        if device_id and device_id.lower() != 'scan':
+            return device_id
+
+        for device in self.old_devices:
+            if device.get('id'):
+                return device['id']
+
+        for found in self._scan(self.subnets or local_subnets()):
+            if found['id']:
+                return found['id']
+        raise WizardError("Nenhum Device ID encontrado na rede; informe apiDeviceID")
+
+    def _locate(self, devices: list) -> int:
+        """
+        Preenche IP e versão (broadcasts da rede; senão o que já estava cadastrado)
+
+        Returns:
+            Número de dispositivos com IP encontrado na rede
+        """
+        previous = {d['id']: d for d in self.old_devices if d.get('id')}
+        seen = {}
+        if self.scan and devices:
+            subnets = self.subnets or subnets_from_devices(self.old_devices) or local_subnets()
+            for found in self._scan(subnets):
+                if found['id']:
+                    seen[found['id']] = found
+
+        located = 0
+        for device in devices:
+            found = seen.get(device.get('id'))
+            old = previous.get(device.get('id'), {})
+            if found:
+                device['ip'] = found['ip']
+                device['version'] = found['version'] or old.get('version', '')
+                located += 1
+            else:
+                device['ip'] = device.get('ip') or old.get('ip', '')
+                device['version'] = device.get('version') or old.get('version', '')
+        return located
+
+    def _scan(self, subnets: list) -> list:
+        try:
+            return NetworkScanner(subnets, listen_time=6).scan()
+        except (ValueError, OSError) as e:
+            raise WizardError(f"Erro na varredura da rede: {e}") from None
+
+"""
+END InProcessWizard
+"""
+
+"""
+===================
+END Declaração de classes
+===================
+"""
+
+
+"""
+===================
+BEGIN Declaração de funções
+===================
+"""
+
+"""
+BEGIN clean_credentials
+ - @param data : Dicionário no formato do tinytuya.json
+ - @retparms cleaned : Cópia com espaços removidos dos campos críticos
+"""
+def clean_credentials(data: dict) -> dict:
+    """Remove espaços de apiKey/apiSecret/apiDeviceID/apiRegion e de key/ip dos dispositivos"""
+    cleaned = dict(data or {})
+    for field in CREDENTIAL_FIELDS:
+        if isinstance(cleaned.get(field), str):
+            cleaned[field] = cleaned[field].strip()
+
+    for device_id, device_info in cleaned.items():
+        if isinstance(device_info, dict):
+            device_info = dict(device_info)
+            for field in ('key', 'ip'):
+                if isinstance(device_info.get(field), str):
+                    device_info[field] = device_info[field].strip()
+            cleaned[device_id] = device_info
+    return cleaned
+
+"""
+END clean_credentials
+"""
+
+"""
+BEGIN _cloud_error
+ - @param response : Resposta de erro da Cloud API
+ - @retparms message : Mensagem de erro legível
+"""
+def _cloud_error(response) -> str:
+    message = response.get('Payload', 'Erro desconhecido') if isinstance(response, dict) else str(response)
+    if 'permission' in str(message).lower() or '1010' in str(message):
+        message += " (a assinatura IoT Core pode ter expirado)"
+    return str(message)
+
+"""
+END _cloud_error
+"""
+
+"""
+===================
+END Declaração de funções
+===================
+"""